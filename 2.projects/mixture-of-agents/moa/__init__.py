@@ -0,0 +1,24 @@
+"""Mixture-of-Agents on Amazon Bedrock, as used in the mixture-of-agents(MoA) notebook."""
+
+from moa.bedrock import BedrockRuntime
+from moa.cache import ResponseCache
+from moa.config import AGGREGATOR_MODEL, AGGREGATOR_SYSTEM_PROMPT, LAYERS, REFERENCE_MODELS
+from moa.core import MixtureOfAgents, Response
+from moa.prompts import get_final_system_prompt
+from moa.rate_limit import ModelLimiter, RateLimiter
+from moa.tracing import Tracer
+
+__all__ = [
+    "AGGREGATOR_MODEL",
+    "AGGREGATOR_SYSTEM_PROMPT",
+    "BedrockRuntime",
+    "LAYERS",
+    "MixtureOfAgents",
+    "ModelLimiter",
+    "RateLimiter",
+    "REFERENCE_MODELS",
+    "ResponseCache",
+    "Response",
+    "Tracer",
+    "get_final_system_prompt",
+]
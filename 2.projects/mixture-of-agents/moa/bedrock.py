@@ -0,0 +1,45 @@
+class BedrockRuntime:
+    """
+    One pooled async ``bedrock-runtime`` client, shared by every call instead of creating a boto3 client per request.
+
+    Use as an async context manager::
+
+        async with BedrockRuntime() as runtime:
+            moa = MixtureOfAgents(runtime)
+            ...
+
+    Anything exposing async ``converse(**kwargs)`` and ``converse_stream(**kwargs)`` with the same response shapes
+    can stand in for it, e.g. a stub in tests.
+    """
+
+    def __init__(self, region_name=None, max_pool_connections=64, max_attempts=1):
+        # Imported here so the rest of the package works with a stub runtime and without aiobotocore installed
+        from aiobotocore.config import AioConfig
+
+        self.region_name = region_name
+        # Retries are handled by MixtureOfAgents, so botocore's own retries are off by default
+        self.config = AioConfig(
+            max_pool_connections=max_pool_connections,
+            retries={"max_attempts": max_attempts, "mode": "standard"},
+        )
+        self._context = None
+        self._client = None
+
+    async def __aenter__(self):
+        from aiobotocore.session import get_session
+
+        self._context = get_session().create_client(
+            "bedrock-runtime", region_name=self.region_name, config=self.config
+        )
+        self._client = await self._context.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._context.__aexit__(*exc_info)
+        self._client = None
+
+    async def converse(self, **kwargs):
+        return await self._client.converse(**kwargs)
+
+    async def converse_stream(self, **kwargs):
+        return await self._client.converse_stream(**kwargs)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def request_key(request):
+    """
+    Hashes everything that determines a converse response: the model ID, inference params, system prompt and messages.
+    """
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def is_deterministic(request):
+    return request["inferenceConfig"]["temperature"] == 0
+
+
+class ResponseCache:
+    """
+    Persistent cache of converse responses in a SQLite file, keyed by ``request_key``.
+
+    Deterministic (temperature 0) requests are always cached. Sampled requests are cached only with
+    ``cache_sampled=True``, for experiments where reusing one sample per prompt is acceptable, e.g. trying aggregator
+    prompts against fixed proposer outputs. Several processes can share the file.
+
+    ``get`` and ``put`` block on SQLite, for up to ``timeout`` seconds while another process holds the write lock, so
+    async callers run them with ``asyncio.to_thread``.
+
+    Args:
+        path (str): The SQLite file, created if missing.
+        cache_sampled (bool, optional): Also cache requests with a non-zero temperature. Defaults to False.
+        timeout (float, optional): Seconds to wait for another process's write lock. Defaults to 30.
+    """
+
+    def __init__(self, path, cache_sampled=False, timeout=30):
+        self.path = path
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        # WAL lets shards in other processes read while one of them writes
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self.db.commit()
+
+    def enabled_for(self, request):
+        return self.cache_sampled or is_deterministic(request)
+
+    def get(self, key):
+        """
+        Returns ``(text, input_tokens, output_tokens)``, or None on a miss.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT text, input_tokens, output_tokens FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row
+
+    def put(self, key, model_id, text, input_tokens, output_tokens):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_id, text, input_tokens, output_tokens, time.time()),
+            )
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,50 @@
+# Three Amazon Bedrock FMs as proposers
+REFERENCE_MODELS = [
+    {
+        "modelId": "anthropic.claude-3-haiku-20240307-v1:0",
+        "inference_params": {"temperature": 0.5, "topP": 1.0, "top_k": 250},
+        "maxTokens": 512,
+    },
+    {
+        "modelId": "mistral.mixtral-8x7b-instruct-v0:1",
+        "inference_params": {"temperature": 0.7, "topP": 1.0},
+        "maxTokens": 512,
+    },
+    {
+        "modelId": "us.meta.llama3-2-3b-instruct-v1:0",
+        "inference_params": {"temperature": 0.5, "topP": 0.9},
+        "maxTokens": 512,
+    },
+]
+
+# Single Amazon Bedrock FM as aggregator
+AGGREGATOR_MODEL = {
+    "modelId": "anthropic.claude-3-haiku-20240307-v1:0",
+    "inference_params": {"temperature": 0.0, "topP": 1.0, "top_k": 250},
+    "maxTokens": 512,
+}
+
+# Aggregator prompt
+AGGREGATOR_SYSTEM_PROMPT = """You have been provided with a set of responses from various open-source models to the latest user query. Your task is to synthesize these responses into a single, high-quality response. It is crucial to critically evaluate the information provided in these responses, recognizing that some of it may be biased or incorrect. Your response should not simply replicate the given answers but should offer a refined, accurate, and comprehensive reply to the instruction. Ensure your response is well-structured, coherent, and adheres to the highest standards of accuracy and reliability. Do not write in response that this was synthesised from previous responses
+
+Responses from models:"""
+
+# 2 Layer MoA Architecture: one layer of proposers, then the aggregator
+LAYERS = 2
+
+# Concurrent in-flight calls allowed per model, unless overridden per model
+DEFAULT_MODEL_CONCURRENCY = 8
+
+# Models whose chat template has to be applied by hand in the user message
+MISTRAL_MODELS = (
+    "mistral.mistral-7b-instruct-v0:2",
+    "mistral.mixtral-8x7b-instruct-v0:1",
+)
+
+# On-demand price in USD per 1,000 input and output tokens
+PRICING = {
+    "anthropic.claude-3-haiku-20240307-v1:0": {"input": 0.00025, "output": 0.00125},
+    "mistral.mixtral-8x7b-instruct-v0:1": {"input": 0.00045, "output": 0.0007},
+    "us.meta.llama3-2-3b-instruct-v1:0": {"input": 0.00015, "output": 0.00015},
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": {"input": 0.003, "output": 0.015},
+}
@@ -0,0 +1,324 @@
+import asyncio
+import random
+import time
+from typing import NamedTuple
+
+from botocore.exceptions import ClientError
+
+from moa.cache import request_key
+from moa.config import (
+    AGGREGATOR_MODEL,
+    AGGREGATOR_SYSTEM_PROMPT,
+    LAYERS,
+    MISTRAL_MODELS,
+    REFERENCE_MODELS,
+)
+from moa.prompts import build_converse_request, get_final_system_prompt
+from moa.rate_limit import RateLimiter, estimate_tokens
+from moa.tracing import Call
+
+MAX_RETRIES = 5  # Maximum number of retries
+INITIAL_DELAY = 1  # Initial delay in seconds
+MAX_DELAY = 60  # Maximum delay in seconds
+
+
+class Response(NamedTuple):
+    text: str
+    input_tokens: int
+    output_tokens: int
+    model_id: str = ""
+    cached: bool = False
+
+
+EMPTY_RESPONSE = Response("", 0, 0)
+
+
+def is_throttled(exception_obj):
+    return (
+        isinstance(exception_obj, ClientError)
+        and exception_obj.response["Error"]["Code"] == "ThrottlingException"
+    )
+
+
+class MixtureOfAgents:
+    """
+    Runs the MoA layers against one shared Bedrock runtime.
+
+    Proposers of a layer run concurrently, each model admitted through its own RPM, TPM and adaptive concurrency
+    limits, and the aggregator is invoked (or streamed) as soon as the last proposer of the final layer returns.
+
+    Args:
+        runtime: A BedrockRuntime, or any object with async ``converse`` and ``converse_stream`` methods.
+        reference_models (list, optional): Proposer model configs. Defaults to REFERENCE_MODELS.
+        aggregator_model (dict, optional): Aggregator model config. Defaults to AGGREGATOR_MODEL.
+        layers (int, optional): Number of MoA layers, the aggregator being the last one. Defaults to LAYERS.
+        system_prompt (str, optional): Prompt the previous layer's responses are appended to.
+        concurrency (dict, optional): Maximum in-flight calls per modelId; other models get DEFAULT_MODEL_CONCURRENCY.
+            Ignored when ``rate_limiter`` is given.
+        rate_limiter (RateLimiter, optional): Limiter to share with other MixtureOfAgents instances.
+        cache (ResponseCache, optional): Persistent cache consulted before non-streamed calls.
+        tracer (Tracer, optional): Records the timing and tokens of every call.
+        debug (bool, optional): Whether to print debug messages. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        runtime,
+        reference_models=REFERENCE_MODELS,
+        aggregator_model=AGGREGATOR_MODEL,
+        layers=LAYERS,
+        system_prompt=AGGREGATOR_SYSTEM_PROMPT,
+        concurrency=None,
+        rate_limiter=None,
+        cache=None,
+        tracer=None,
+        debug=False,
+    ):
+        self.runtime = runtime
+        self.reference_models = reference_models
+        self.aggregator_model = aggregator_model
+        self.layers = layers
+        self.system_prompt = system_prompt
+        self.rate_limiter = rate_limiter or RateLimiter(
+            {
+                model_id: {"max_concurrency": max_concurrency}
+                for model_id, max_concurrency in (concurrency or {}).items()
+            }
+        )
+        self.cache = cache
+        self.tracer = tracer
+        self.debug = debug
+
+    def request(self, model, messages, prev_response=None):
+        """
+        Builds the converse request for ``model``, or returns None if a previous response is empty.
+        """
+        system_prompt = None
+        if prev_response:
+            system_prompt = get_final_system_prompt(self.system_prompt, prev_response)
+            if system_prompt is None:
+                return None
+        return build_converse_request(model, messages, system_prompt, MISTRAL_MODELS)
+
+    def start_call(self, model, layer, run_id, request):
+        role = "aggregator" if layer == self.layers else "proposer"
+        call = Call(run_id, layer, model["modelId"], role)
+        if request is not None:
+            call.prompt_chars = sum(
+                len(block["text"])
+                for block in [*request.get("system", []), *request["messages"][0]["content"]]
+            )
+        return call
+
+    def finish_call(self, call, response):
+        call.finish(response)
+        if self.tracer is not None:
+            self.tracer.record(call)
+        return response
+
+    async def with_backoff(self, request, send, call):
+        """
+        Awaits ``send(request)`` once the rate limiter admits it, retrying ThrottlingExceptions with exponential backoff.
+
+        The slot is released while sleeping so other requests for the model are not held up by the retry, and the
+        retry rejoins the front of the model's queue. Returns None once MAX_RETRIES is reached.
+        Queue wait, backoff and attempts are recorded on ``call``.
+        """
+        model_id = request["modelId"]
+        tokens = estimate_tokens(request)
+        delay = INITIAL_DELAY
+        for retry in range(MAX_RETRIES):
+            queued = time.perf_counter()
+            async with self.rate_limiter.slot(model_id, tokens, retry=retry > 0) as slot:
+                call.sent = time.perf_counter()
+                call.queue_wait += call.sent - queued
+                call.attempts += 1
+                try:
+                    response = await send(**request)
+                except ClientError as exception_obj:
+                    if not is_throttled(exception_obj):
+                        raise
+                    slot.throttled = True
+                else:
+                    # Streams report usage at the end, so their reservation is kept as is
+                    if "usage" in response:
+                        slot.used = response["usage"]["inputTokens"] + response["usage"]["outputTokens"]
+                    return response
+            if self.debug:
+                print(f"{model_id}: retry {retry + 1}/{MAX_RETRIES}")
+            sleep = delay + random.uniform(0, 1)  # Add a random jitter
+            call.backoff += sleep
+            await asyncio.sleep(sleep)
+            delay = min(delay * 2, MAX_DELAY)
+        print(f"{model_id}: max retries reached!")
+        return None
+
+    async def invoke(self, model, messages, prev_response=None, layer=1, run_id=None):
+        """
+        Invoke a model for inference.
+
+        Args:
+            model (dict): The model config with ``modelId``, ``inference_params`` and ``maxTokens``.
+            messages (list): A list of messages to pass to the model.
+            prev_response (list, optional): The previous layer's responses, if any.
+            layer (int, optional): The MoA layer of the call, for tracing. Defaults to 1.
+            run_id (int, optional): The run the call belongs to, for tracing.
+
+        Returns:
+            Response: The model's text and its input and output token counts.
+        """
+        request = self.request(model, messages, prev_response)
+        call = self.start_call(model, layer, run_id, request)
+        if request is None:
+            return self.finish_call(call, EMPTY_RESPONSE)
+
+        key = None
+        if self.cache is not None and self.cache.enabled_for(request):
+            key = request_key(request)
+            # SQLite can block on another shard's write lock, so it runs off the event loop
+            row = await asyncio.to_thread(self.cache.get, key)
+            if row is not None:
+                return self.finish_call(call, Response(*row, model["modelId"], cached=True))
+
+        if self.debug:
+            print(f"Invoking {model['modelId']}")
+
+        response = await self.with_backoff(request, self.runtime.converse, call)
+        if response is None:
+            return self.finish_call(call, EMPTY_RESPONSE)
+        result = Response(
+            response["output"]["message"]["content"][0]["text"],
+            response["usage"]["inputTokens"],
+            response["usage"]["outputTokens"],
+            model["modelId"],
+        )
+        # An empty text would make the next layer skip its call, so it is worth retrying rather than caching
+        if key is not None and result.text:
+            await asyncio.to_thread(
+                self.cache.put, key, model["modelId"], result.text, result.input_tokens, result.output_tokens
+            )
+        return self.finish_call(call, result)
+
+    async def propose(self, messages, run_id=None):
+        """
+        Runs every proposer layer and returns the responses of the last one.
+        """
+        results = None
+        proposals = []
+        for layer in range(1, max(self.layers - 1, 1) + 1):
+            results = await asyncio.gather(
+                *[
+                    self.invoke(model, messages, prev_response=results, layer=layer, run_id=run_id)
+                    for model in self.reference_models
+                ]
+            )
+            proposals.extend(results)
+        return results, proposals
+
+    async def aggregate(self, messages, results, run_id=None):
+        return await self.invoke(
+            self.aggregator_model, messages, prev_response=results, layer=self.layers, run_id=run_id
+        )
+
+    async def stream_aggregate(self, messages, results, run_id=None):
+        """
+        Streams the aggregator's answer to the proposer ``results``.
+
+        Yields:
+            str: Text deltas, followed by a final Response with the full text and token counts.
+        """
+        request = self.request(self.aggregator_model, messages, prev_response=results)
+        call = self.start_call(self.aggregator_model, self.layers, run_id, request)
+        if request is None:
+            yield self.finish_call(call, EMPTY_RESPONSE)
+            return
+
+        response = await self.with_backoff(request, self.runtime.converse_stream, call)
+        if response is None:
+            yield self.finish_call(call, EMPTY_RESPONSE)
+            return
+
+        chunks = []
+        usage = {"inputTokens": 0, "outputTokens": 0}
+        async for event in response["stream"]:
+            if "contentBlockDelta" in event:
+                text = event["contentBlockDelta"]["delta"].get("text", "")
+                if text:
+                    call.mark_first_byte()
+                    chunks.append(text)
+                    yield text
+            elif "metadata" in event:
+                usage = event["metadata"].get("usage", usage)
+        yield self.finish_call(
+            call,
+            Response(
+                "".join(chunks),
+                usage["inputTokens"],
+                usage["outputTokens"],
+                self.aggregator_model["modelId"],
+            ),
+        )
+
+    async def run(self, prompt):
+        """
+        Answers ``prompt`` with the full MoA.
+
+        Returns:
+            dict: The ``output`` text, ``input_token_usage``, ``output_token_usage``, ``total_time`` and the
+            ``model_usage`` of each model. The totals include cached calls; ``model_usage`` only counts billed tokens.
+        """
+        start_time = time.perf_counter()
+        run_id = self.tracer.new_run() if self.tracer is not None else None
+        messages = user_messages(prompt)
+        results, proposals = await self.propose(messages, run_id)
+        response = await self.aggregate(messages, results, run_id)
+        return summarize(response, proposals, start_time)
+
+    async def stream(self, prompt):
+        """
+        Answers ``prompt`` with the full MoA, streaming the aggregator as soon as the proposers are done.
+
+        Yields:
+            str: Text deltas of the final answer, followed by the same dict ``run`` returns.
+        """
+        start_time = time.perf_counter()
+        run_id = self.tracer.new_run() if self.tracer is not None else None
+        messages = user_messages(prompt)
+        results, proposals = await self.propose(messages, run_id)
+        async for chunk in self.stream_aggregate(messages, results, run_id):
+            if isinstance(chunk, Response):
+                yield summarize(chunk, proposals, start_time)
+            else:
+                yield chunk
+
+
+def user_messages(prompt):
+    return [{"role": "user", "content": [{"text": f"User Query: {prompt}"}]}]
+
+
+def summarize(response, proposals, start_time):
+    model_usage = {}
+    for call in [*proposals, response]:
+        if not call.model_id:
+            continue
+        usage = model_usage.setdefault(
+            call.model_id,
+            {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0},
+        )
+        usage["calls"] += 1
+        # Per model usage is what was billed, so cache hits add no tokens
+        if call.cached:
+            usage["cached_calls"] += 1
+            continue
+        usage["input_tokens"] += call.input_tokens
+        usage["output_tokens"] += call.output_tokens
+
+    return {
+        "output": response.text,
+        "input_token_usage": response.input_tokens
+        + sum(proposal.input_tokens for proposal in proposals),
+        "output_token_usage": response.output_tokens
+        + sum(proposal.output_tokens for proposal in proposals),
+        "total_time": time.perf_counter() - start_time,
+        "model_usage": model_usage,
+    }
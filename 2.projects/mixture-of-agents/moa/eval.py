@@ -0,0 +1,314 @@
+"""
+Runs MoA over the AlpacaEval 2.0 set, resumably.
+
+Every finished item is appended to a JSONL checkpoint, so an interrupted run picks up where it stopped:
+
+    python -m moa.eval --round 12 --concurrency 16
+
+The set is split into ``--shards`` contiguous shards with one checkpoint file each. ``--shard-index`` runs a single
+shard, so shards can be spread over several processes or machines writing to the same output directory. Once every
+item is done, the notebook-style ``-moa-round-N.json`` and ``-moa-extended-eval-set-round-N.json`` files are written.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+
+from moa.bedrock import BedrockRuntime
+from moa.cache import ResponseCache
+from moa.config import AGGREGATOR_MODEL, LAYERS, PRICING, REFERENCE_MODELS
+from moa.core import MixtureOfAgents
+from moa.rate_limit import RateLimiter
+from moa.tracing import Tracer
+
+ITEM_FIELDS = ("instruction", "dataset")
+EXTENDED_FIELDS = ("input_token_usage", "output_token_usage", "total_time")
+
+
+def load_eval_set():
+    import datasets
+
+    eval_set = datasets.load_dataset(
+        "tatsu-lab/alpaca_eval", "alpaca_eval_gpt4_baseline", trust_remote_code=True
+    )["eval"]
+    eval_set = eval_set.remove_columns(["output", "generator"])
+    return eval_set.to_list()
+
+
+def output_prefix(aggregator_model):
+    # ':' is not allowed in file names on every platform
+    return f"{aggregator_model['modelId'].replace(':', '_')}-moa"
+
+
+def shard_bounds(num_items, num_shards):
+    """
+    Returns the ``(start, end)`` index range of each contiguous shard.
+    """
+    size, extra = divmod(num_items, num_shards)
+    bounds = []
+    start = 0
+    for shard in range(num_shards):
+        end = start + size + (1 if shard < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def read_checkpoints(checkpoint_dir):
+    """
+    Returns the records of every checkpoint file in ``checkpoint_dir``, keyed by item index.
+
+    A partially written last line, left by an interrupted run, is ignored and that item is run again. Records without
+    an output are skipped too, so those items are retried.
+    """
+    records = {}
+    for path in sorted(glob.glob(os.path.join(checkpoint_dir, "*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("output"):
+                    records[record["index"]] = record
+    return records
+
+
+def item_cost(model_id, usage):
+    price = PRICING.get(model_id)
+    if price is None:
+        return None
+    return (usage["input_tokens"] * price["input"] + usage["output_tokens"] * price["output"]) / 1000
+
+
+def usage_report(records):
+    """
+    Sums calls, tokens and cost per model over ``records``.
+
+    Returns:
+        dict: modelId -> ``calls``, ``cached_calls``, billed ``input_tokens`` and ``output_tokens``, and ``cost``
+        (None when the price is unknown).
+    """
+    report = {}
+    for record in records:
+        for model_id, usage in record.get("model_usage", {}).items():
+            totals = report.setdefault(
+                model_id, {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0}
+            )
+            for key in totals:
+                totals[key] += usage.get(key, 0)
+    for model_id, totals in report.items():
+        totals["cost"] = item_cost(model_id, totals)
+    return report
+
+
+def print_report(report, num_items, elapsed=None):
+    print(f"{'Model':<45} {'Calls':>7} {'Cached':>7} {'Input tokens':>13} {'Output tokens':>14} {'Cost ($)':>10}")
+    total_cost = 0.0
+    for model_id, totals in sorted(report.items()):
+        cost = totals["cost"]
+        total_cost += cost or 0.0
+        print(
+            f"{model_id:<45} {totals['calls']:>7} {totals['cached_calls']:>7} "
+            f"{totals['input_tokens']:>13} {totals['output_tokens']:>14} "
+            f"{'N/A' if cost is None else f'{cost:.4f}':>10}"
+        )
+    print(f"Total cost for {num_items} items: ${total_cost:.4f}")
+    if elapsed is not None:
+        print(f"Total time: {elapsed:.1f} seconds")
+
+
+def truncate_partial_line(path):
+    """
+    Cuts a partially written last line off ``path``, so the next appended record starts on a line of its own.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def export(records, output_dir, prefix, experimentation_round):
+    """
+    Writes the completed run in the notebook's output format, ordered as in the eval set.
+
+    Raises:
+        ValueError: If a record has an empty output, which would be scored as an empty answer.
+    """
+    records = [records[index] for index in sorted(records)]
+    empty = [record["index"] for record in records if not record.get("output")]
+    if empty:
+        raise ValueError(f"Refusing to export items with an empty output: {empty}")
+    new_eval_set = [
+        {**{key: record[key] for key in ITEM_FIELDS}, "output": record["output"], "generator": record["generator"]}
+        for record in records
+    ]
+    extended_eval_set = [
+        {**item, **{key: record[key] for key in EXTENDED_FIELDS}}
+        for item, record in zip(new_eval_set, records)
+    ]
+
+    with open(os.path.join(output_dir, f"{prefix}-extended-eval-set-round-{experimentation_round}.json"), "w") as f:
+        json.dump(extended_eval_set, f, indent=2)
+    with open(os.path.join(output_dir, f"{prefix}-round-{experimentation_round}.json"), "w") as f:
+        json.dump(new_eval_set, f, indent=2)
+
+
+async def run_items(moa, eval_set, pending, checkpoint_dir, num_shards, bounds, generator, concurrency):
+    """
+    Runs the ``pending`` item indices with at most ``concurrency`` in flight, appending each result to its shard's
+    checkpoint as soon as it finishes.
+
+    Returns:
+        tuple: The new records and the number of items that failed.
+    """
+    queue = asyncio.Queue()
+    for index in pending:
+        queue.put_nowait(index)
+
+    files = {}
+    records = []
+    failures = 0
+
+    def checkpoint_file(index):
+        shard = next(shard for shard, (start, end) in enumerate(bounds) if start <= index < end)
+        if shard not in files:
+            path = os.path.join(checkpoint_dir, f"shard-{shard:03d}-of-{num_shards:03d}.jsonl")
+            truncate_partial_line(path)
+            files[shard] = open(path, "a")
+        return files[shard]
+
+    async def worker():
+        nonlocal failures
+        while not queue.empty():
+            index = queue.get_nowait()
+            item = eval_set[index]
+            try:
+                result = await moa.run(item["instruction"])
+            except Exception as exception_obj:
+                # Left out of the checkpoint, so the next run retries it
+                failures += 1
+                print(f"Item {index} failed: {exception_obj!r}")
+                continue
+            if not result["output"]:
+                # A proposer or the aggregator ran out of retries; an empty answer is not a result
+                failures += 1
+                print(f"Item {index} failed: empty output")
+                continue
+
+            record = {"index": index, **item, "generator": generator, **result}
+            f = checkpoint_file(index)
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            records.append(record)
+            if len(records) % 10 == 0:
+                print(f"Completed {len(records)}/{len(pending)}")
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, len(pending)) or 1)])
+    finally:
+        for f in files.values():
+            f.close()
+    return records, failures
+
+
+async def main(args):
+    eval_set = load_eval_set()
+    if args.limit:
+        eval_set = eval_set[: args.limit]
+
+    prefix = output_prefix(AGGREGATOR_MODEL)
+    checkpoint_dir = os.path.join(args.output_dir, "checkpoints", f"{prefix}-round-{args.round}")
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    bounds = shard_bounds(len(eval_set), args.shards)
+    shards = range(args.shards) if args.shard_index is None else [args.shard_index]
+    completed = read_checkpoints(checkpoint_dir)
+    pending = [
+        index
+        for shard in shards
+        for index in range(*bounds[shard])
+        if index not in completed
+    ]
+    print(f"{len(completed)} items already checkpointed, {len(pending)} to run")
+
+    limits = {}
+    if args.limits:
+        with open(args.limits) as f:
+            limits = json.load(f)
+    rate_limiter = RateLimiter(limits, default={"max_concurrency": args.model_concurrency})
+
+    tracer = Tracer() if args.trace else None
+    cache = None if args.no_cache else ResponseCache(args.cache, cache_sampled=args.cache_sampled)
+
+    generator = AGGREGATOR_MODEL["modelId"] + str(LAYERS) + str(args.round) + "-moa"
+    start_time = time.perf_counter()
+    async with BedrockRuntime(region_name=args.region, max_pool_connections=args.concurrency * 4) as runtime:
+        moa = MixtureOfAgents(
+            runtime,
+            reference_models=REFERENCE_MODELS,
+            aggregator_model=AGGREGATOR_MODEL,
+            layers=LAYERS,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            tracer=tracer,
+        )
+        records, failures = await run_items(
+            moa, eval_set, pending, checkpoint_dir, args.shards, bounds, generator, args.concurrency
+        )
+    elapsed = time.perf_counter() - start_time
+
+    print("\nThis run:")
+    print_report(usage_report(records), len(records), elapsed)
+    print(f"Rate limiter: {json.dumps(rate_limiter.snapshot())}")
+    if cache is not None:
+        print(f"Response cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+    if tracer is not None and tracer.calls:
+        tracer.export_chrome(args.trace)
+        with open(os.path.splitext(args.trace)[0] + ".summary.json", "w") as f:
+            json.dump(tracer.layer_summary(), f, indent=2)
+        print(f"\nWrote the trace of this run to {args.trace}; open it in ui.perfetto.dev or chrome://tracing")
+        tracer.print_summary()
+
+    completed = read_checkpoints(checkpoint_dir)
+    print(f"\nAll checkpointed items ({len(completed)}/{len(eval_set)}):")
+    print_report(usage_report(completed.values()), len(completed))
+
+    if len(completed) == len(eval_set):
+        export(completed, args.output_dir, prefix, args.round)
+        print(f"Wrote {prefix}-round-{args.round}.json and {prefix}-extended-eval-set-round-{args.round}.json")
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--round", type=int, required=True, help="Experimentation round, used in file names and the generator.")
+    parser.add_argument("--output-dir", default="outputs", help="Directory for checkpoints and final outputs.")
+    parser.add_argument("--shards", type=int, default=8, help="Number of contiguous shards, one checkpoint file each.")
+    parser.add_argument("--shard-index", type=int, default=None, help="Run only this shard; all shards by default.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Eval items in flight at once.")
+    parser.add_argument("--model-concurrency", type=int, default=8, help="Starting concurrency limit of models not in --limits.")
+    parser.add_argument("--limits", default=None, help="JSON file of modelId -> {rpm, tpm, max_concurrency}.")
+    parser.add_argument("--region", default=None, help="AWS region of the Bedrock runtime.")
+    parser.add_argument("--cache", default="outputs/cache/responses.sqlite3", help="SQLite response cache file.")
+    parser.add_argument("--cache-sampled", action="store_true", help="Also cache and reuse calls with a non-zero temperature.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the response cache.")
+    parser.add_argument("--trace", default=None, help="Write a Chrome/Perfetto trace of every call to this JSON file.")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N items, e.g. for a smoke test.")
+    args = parser.parse_args(argv)
+
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.shards:
+        parser.error("--shard-index must be between 0 and --shards - 1")
+    return args
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main(parse_args())))
@@ -0,0 +1,70 @@
+import copy
+
+
+def get_final_system_prompt(system_prompt, results):
+    """
+    Constructs a system prompt for layers 2+ that includes the previous responses to synthesize.
+
+    Args:
+        system_prompt (str): The initial system prompt.
+        results (list): A list of tuples, where each tuple contains a response and its associated metadata.
+
+    Returns:
+        str: The final system prompt with the previous responses appended, or None if any of the responses are empty.
+    """
+    for element in results:
+        if len(element[0]) == 0:
+            return None
+    return (
+        system_prompt
+        + "\n"
+        + "\n".join(
+            [
+                f"<Response_{i+1}> {str(element[0])} </Response_{i+1}> \n\n"
+                for i, element in enumerate(results)
+            ]
+        )
+    )
+
+
+def build_converse_request(model, messages, system_prompt=None, mistral_models=()):
+    """
+    Builds the keyword arguments of a Bedrock ``converse``/``converse_stream`` call.
+
+    Args:
+        model (dict): The model config with ``modelId``, ``inference_params`` and ``maxTokens``.
+        messages (list): The conversation, left unmodified.
+        system_prompt (str, optional): System prompt carrying the previous layer's responses.
+        mistral_models (tuple, optional): Model IDs that need the [INST] template in the user message.
+
+    Returns:
+        dict: The request arguments.
+    """
+    inference_params = model["inference_params"]
+    request = {
+        "modelId": model["modelId"],
+        "messages": messages,
+        "inferenceConfig": {
+            "maxTokens": model["maxTokens"],
+            "temperature": inference_params["temperature"],
+            "topP": inference_params["topP"],
+        },
+        "additionalModelRequestFields": {
+            key: value
+            for key, value in inference_params.items()
+            if key not in ("temperature", "topP")
+        },
+    }
+
+    if model["modelId"] in mistral_models:
+        # Copy, since the same messages are shared by every proposer in the layer
+        messages = copy.deepcopy(messages)
+        text = messages[0]["content"][0]["text"]
+        if system_prompt:
+            text = f"{system_prompt} \n\n {text}"
+        messages[0]["content"][0]["text"] = f"<s>[INST] {text} [/INST]"
+        request["messages"] = messages
+    else:
+        request["system"] = [{"text": system_prompt}] if system_prompt else []
+
+    return request
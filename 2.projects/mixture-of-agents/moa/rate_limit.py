@@ -0,0 +1,198 @@
+import asyncio
+import collections
+import json
+import time
+from contextlib import asynccontextmanager
+
+from moa.config import DEFAULT_MODEL_CONCURRENCY
+
+# Rough characters per token, used to reserve input tokens before Bedrock reports the real count
+CHARS_PER_TOKEN = 4
+# Concurrent throttles within this window count as one congestion event, so the limit is halved once
+DECREASE_INTERVAL = 1.0
+
+
+def estimate_tokens(request):
+    """
+    Estimates the tokens a converse request can consume: its prompt plus the maximum it may generate.
+    """
+    prompt = json.dumps([request.get("system", []), request["messages"]])
+    return len(prompt) // CHARS_PER_TOKEN + request["inferenceConfig"]["maxTokens"]
+
+
+class TokenBucket:
+    """
+    Refills continuously at ``rate_per_minute`` up to one minute's worth, matching Bedrock's per-minute quotas.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        self.refill()
+        # A request larger than the bucket only waits for a full bucket, then overdraws it
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.refill()
+        self.level -= amount
+
+    def give(self, amount):
+        self.refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ModelLimiter:
+    """
+    Admits calls to one model in FIFO order while they fit its RPM and TPM budgets and its concurrency limit.
+
+    The concurrency limit adapts AIMD-style: it grows by about one per limit's worth of successful calls and
+    halves on throttling, staying between ``min_concurrency`` and ``max_concurrency``.
+
+    Args:
+        rpm (int, optional): Requests per minute; unlimited if None.
+        tpm (int, optional): Input plus output tokens per minute; unlimited if None.
+        max_concurrency (int, optional): Upper bound, and starting value, of the concurrency limit.
+        min_concurrency (int, optional): Lower bound of the concurrency limit. Defaults to 1.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_concurrency=DEFAULT_MODEL_CONCURRENCY, min_concurrency=1):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        self.throttles = 0
+        self.decreased_at = 0.0
+        self.waiters = collections.deque()
+        self.condition = asyncio.Condition()
+
+    def bucket_wait(self, tokens):
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    async def acquire(self, tokens, retry=False):
+        """
+        Waits for this call's turn, then reserves one request, ``tokens`` tokens and a concurrency slot.
+
+        Retries of throttled calls go to the front of the queue, so they are not starved by newer calls.
+        """
+        entry = object()
+        async with self.condition:
+            if retry:
+                self.waiters.appendleft(entry)
+            else:
+                self.waiters.append(entry)
+            try:
+                while True:
+                    if self.waiters[0] is entry and self.in_flight < max(int(self.concurrency), 1):
+                        wait = self.bucket_wait(tokens)
+                        if wait <= 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self.condition.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self.condition.wait()
+            finally:
+                self.waiters.remove(entry)
+                self.condition.notify_all()
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+
+    async def release(self, reserved, used=None, throttled=False):
+        """
+        Frees the slot, returns unused reserved tokens and adjusts the concurrency limit.
+
+        A throttled call was never processed, so its whole reservation is returned; otherwise every retry of a
+        throttling burst would drain the TPM bucket again for tokens Bedrock never counted.
+
+        Args:
+            reserved (int): Tokens reserved by ``acquire``.
+            used (int, optional): Tokens the call actually consumed, if known.
+            throttled (bool, optional): Whether Bedrock throttled the call.
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                used = 0
+                self.throttles += 1
+                now = time.monotonic()
+                if now - self.decreased_at >= DECREASE_INTERVAL:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self.decreased_at = now
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            if self.tokens and used is not None:
+                self.tokens.give(reserved - used)
+            self.condition.notify_all()
+
+
+class Slot:
+    def __init__(self):
+        self.used = None
+        self.throttled = False
+
+
+class RateLimiter:
+    """
+    Per-model limiters shared by every MoA call, so concurrent evaluations draw on one quota per model.
+
+    Args:
+        limits (dict, optional): modelId -> ModelLimiter keyword arguments, e.g.
+            ``{"mistral.mixtral-8x7b-instruct-v0:1": {"rpm": 400, "tpm": 300000, "max_concurrency": 16}}``.
+        default (dict, optional): Keyword arguments for models not in ``limits``.
+    """
+
+    def __init__(self, limits=None, default=None):
+        self.limits = limits or {}
+        self.default = default or {}
+        self.models = {}
+
+    def model(self, model_id):
+        if model_id not in self.models:
+            self.models[model_id] = ModelLimiter(**self.limits.get(model_id, self.default))
+        return self.models[model_id]
+
+    @asynccontextmanager
+    async def slot(self, model_id, tokens, retry=False):
+        """
+        Holds a slot for one call. Set ``slot.used`` to the tokens consumed, or ``slot.throttled`` on throttling.
+        """
+        limiter = self.model(model_id)
+        await limiter.acquire(tokens, retry=retry)
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            await limiter.release(tokens, used=slot.used, throttled=slot.throttled)
+
+    def snapshot(self):
+        return {
+            model_id: {
+                "concurrency": round(limiter.concurrency, 2),
+                "in_flight": limiter.in_flight,
+                "queued": len(limiter.waiters),
+                "throttles": limiter.throttles,
+            }
+            for model_id, limiter in self.models.items()
+        }
@@ -0,0 +1,219 @@
+import itertools
+import json
+import statistics
+import time
+
+
+class Call:
+    """
+    Timing and token accounting of one model call, in ``time.perf_counter()`` seconds.
+
+    ``queue_wait`` is the time spent waiting for the rate limiter and ``backoff`` the time spent sleeping between
+    throttled attempts. ``sent`` is when the final attempt went out, and ``first_byte`` when its first bytes came back:
+    the first streamed text for ConverseStream, the whole response for Converse.
+    """
+
+    def __init__(self, run_id, layer, model_id, role):
+        self.run_id = run_id
+        self.layer = layer
+        self.model_id = model_id
+        self.role = role
+        self.start = time.perf_counter()
+        self.queue_wait = 0.0
+        self.backoff = 0.0
+        self.attempts = 0
+        self.sent = None
+        self.first_byte = None
+        self.end = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.prompt_chars = 0
+        self.cached = False
+
+    def mark_first_byte(self):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+    def finish(self, response):
+        self.end = time.perf_counter()
+        self.mark_first_byte()
+        self.input_tokens = response.input_tokens
+        self.output_tokens = response.output_tokens
+        self.cached = response.cached
+
+    @property
+    def total(self):
+        return self.end - self.start
+
+    @property
+    def ttfb(self):
+        return self.first_byte - (self.sent or self.start)
+
+    def as_dict(self):
+        return {
+            "run_id": self.run_id,
+            "layer": self.layer,
+            "model_id": self.model_id,
+            "role": self.role,
+            "queue_wait": self.queue_wait,
+            "backoff": self.backoff,
+            "attempts": self.attempts,
+            "ttfb": self.ttfb,
+            "total": self.total,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "prompt_chars": self.prompt_chars,
+            "cached": self.cached,
+        }
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Tracer:
+    """
+    Collects the Calls of every MoA run, for a Chrome/Perfetto timeline and per-layer critical-path summaries.
+
+    Pass one to ``MixtureOfAgents(tracer=...)``; each ``run`` or ``stream`` gets its own run ID.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.origin = time.perf_counter()
+        self._run_ids = itertools.count()
+
+    def new_run(self):
+        return next(self._run_ids)
+
+    def record(self, call):
+        self.calls.append(call)
+
+    def chrome_trace(self):
+        """
+        Returns the calls in the Chrome trace event format, which chrome://tracing and ui.perfetto.dev open.
+
+        Each run is a process and each layer/model pair a thread. A call is drawn as its rate limiter wait and
+        backoff, followed by the request itself, with an instant event at the first byte.
+        """
+        us = lambda seconds: round((seconds - self.origin) * 1e6)
+        events = []
+        threads = {}
+        for call in sorted(self.calls, key=lambda call: call.start):
+            lane = (call.run_id, call.layer, call.model_id)
+            if lane not in threads:
+                threads[lane] = len(threads) + 1
+                events.append(
+                    {
+                        "ph": "M", "name": "thread_name", "pid": call.run_id, "tid": threads[lane],
+                        "args": {"name": f"L{call.layer} {call.role} {call.model_id}"},
+                    }
+                )
+            tid = threads[lane]
+            sent = call.sent or call.start
+            if sent > call.start:
+                events.append(
+                    {
+                        "ph": "X", "name": "queue + backoff", "cat": "wait", "pid": call.run_id, "tid": tid,
+                        "ts": us(call.start), "dur": us(sent) - us(call.start),
+                        "args": {"queue_wait": call.queue_wait, "backoff": call.backoff, "attempts": call.attempts},
+                    }
+                )
+            events.append(
+                {
+                    "ph": "X", "name": call.model_id, "cat": "cached" if call.cached else call.role,
+                    "pid": call.run_id, "tid": tid, "ts": us(sent), "dur": us(call.end) - us(sent),
+                    "args": call.as_dict(),
+                }
+            )
+            events.append(
+                {
+                    "ph": "i", "s": "t", "name": "first byte", "pid": call.run_id, "tid": tid,
+                    "ts": us(call.first_byte),
+                }
+            )
+        for run_id in sorted({call.run_id for call in self.calls}):
+            events.append({"ph": "M", "name": "process_name", "pid": run_id, "args": {"name": f"run {run_id}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def layer_summary(self):
+        """
+        Summarizes each layer over all runs.
+
+        A layer ends when its slowest call does, so that call is on the critical path. For every layer this reports
+        the layer duration, which model was the straggler how often, how long the layer waited on the straggler alone
+        (``straggler_slack``), the mean queue wait, TTFB and total per model, and the mean tokens per call; the
+        aggregator layer's input tokens show what the growing ``get_final_system_prompt`` costs.
+
+        Returns:
+            list: One dict per layer, in layer order.
+        """
+        by_layer = {}
+        for call in self.calls:
+            by_layer.setdefault(call.layer, {}).setdefault(call.run_id, []).append(call)
+
+        summary = []
+        for layer in sorted(by_layer):
+            runs = by_layer[layer].values()
+            durations = []
+            slack = []
+            stragglers = {}
+            for calls in runs:
+                ends = sorted(call.end for call in calls)
+                durations.append(ends[-1] - min(call.start for call in calls))
+                slack.append(ends[-1] - ends[-2] if len(ends) > 1 else 0.0)
+                straggler = max(calls, key=lambda call: call.end)
+                stragglers[straggler.model_id] = stragglers.get(straggler.model_id, 0) + 1
+
+            models = {}
+            for calls in runs:
+                for call in calls:
+                    models.setdefault(call.model_id, []).append(call)
+
+            summary.append(
+                {
+                    "layer": layer,
+                    "role": next(iter(runs))[0].role,
+                    "runs": len(durations),
+                    "duration_mean": statistics.mean(durations),
+                    "duration_p50": percentile(durations, 0.5),
+                    "duration_p95": percentile(durations, 0.95),
+                    "straggler_slack_mean": statistics.mean(slack),
+                    "stragglers": stragglers,
+                    "models": {
+                        model_id: {
+                            "calls": len(calls),
+                            "cached": sum(call.cached for call in calls),
+                            "queue_wait_mean": statistics.mean(call.queue_wait for call in calls),
+                            "ttfb_mean": statistics.mean(call.ttfb for call in calls),
+                            "total_mean": statistics.mean(call.total for call in calls),
+                            "total_p95": percentile([call.total for call in calls], 0.95),
+                            "input_tokens_mean": statistics.mean(call.input_tokens for call in calls),
+                            "output_tokens_mean": statistics.mean(call.output_tokens for call in calls),
+                            "prompt_chars_mean": statistics.mean(call.prompt_chars for call in calls),
+                        }
+                        for model_id, calls in models.items()
+                    },
+                }
+            )
+        return summary
+
+    def print_summary(self):
+        for layer in self.layer_summary():
+            print(
+                f"Layer {layer['layer']} ({layer['role']}, {layer['runs']} runs): "
+                f"mean {layer['duration_mean']:.2f}s, p95 {layer['duration_p95']:.2f}s, "
+                f"waiting on the straggler alone {layer['straggler_slack_mean']:.2f}s"
+            )
+            for model_id, stats in sorted(layer["models"].items()):
+                print(
+                    f"  {model_id:<45} straggler {layer['stragglers'].get(model_id, 0):>5}x  "
+                    f"queue {stats['queue_wait_mean']:.2f}s  ttfb {stats['ttfb_mean']:.2f}s  "
+                    f"total {stats['total_mean']:.2f}s (p95 {stats['total_p95']:.2f}s)  "
+                    f"tokens {stats['input_tokens_mean']:.0f} in / {stats['output_tokens_mean']:.0f} out"
+                )
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Lets the tests import the moa package without installing it
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
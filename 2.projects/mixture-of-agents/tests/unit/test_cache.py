@@ -0,0 +1,154 @@
+"""
+Unit tests for the persistent response cache and its use by MixtureOfAgents.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import pytest
+
+pytest.importorskip("botocore")
+
+from moa.cache import ResponseCache, is_deterministic, request_key
+from moa.core import MixtureOfAgents
+
+MODEL = {"modelId": "test.model-v1:0", "inference_params": {"temperature": 0.0, "topP": 1.0}, "maxTokens": 64}
+MESSAGES = [{"role": "user", "content": [{"text": "User Query: hello"}]}]
+
+
+def make_request(temperature=0.0, text="hello"):
+    return {
+        "modelId": "test.model-v1:0",
+        "messages": [{"role": "user", "content": [{"text": text}]}],
+        "inferenceConfig": {"maxTokens": 64, "temperature": temperature, "topP": 1.0},
+    }
+
+
+class FakeRuntime:
+    """Answers every converse call with the same text and counts the calls."""
+
+    def __init__(self, text="hi there"):
+        self.text = text
+        self.calls = 0
+
+    async def converse(self, **request):
+        self.calls += 1
+        return {
+            "output": {"message": {"content": [{"text": self.text}]}},
+            "usage": {"inputTokens": 7, "outputTokens": 3},
+        }
+
+
+class TestRequestKey:
+    """Test cases for request_key and is_deterministic functions."""
+
+    def test_key_ignores_dict_order(self):
+        """Test that the key depends on the request's content, not its key order."""
+        request = make_request()
+        reordered = dict(reversed(list(request.items())))
+
+        assert request_key(request) == request_key(reordered)
+        assert request_key(request) != request_key(make_request(text="goodbye"))
+
+    def test_deterministic_only_at_zero_temperature(self):
+        """Test that only temperature 0 requests count as deterministic."""
+        assert is_deterministic(make_request(0.0))
+        assert not is_deterministic(make_request(0.7))
+
+
+class TestResponseCache:
+    """Test cases for ResponseCache class."""
+
+    def test_miss_then_hit(self):
+        """Test that a stored response is returned and hits and misses are counted."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResponseCache(os.path.join(cache_dir, "responses.sqlite3"))
+            try:
+                assert cache.get("key") is None
+                cache.put("key", "test.model-v1:0", "hi there", 7, 3)
+                assert cache.get("key") == ("hi there", 7, 3)
+                assert (cache.hits, cache.misses) == (1, 1)
+            finally:
+                cache.close()
+
+    def test_persisted_and_shared(self):
+        """Test that a second cache on the same file, as in another shard, sees the stored response."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, "nested", "responses.sqlite3")
+            writer = ResponseCache(path)
+            reader = ResponseCache(path)
+            try:
+                writer.put("key", "test.model-v1:0", "hi there", 7, 3)
+                assert reader.get("key") == ("hi there", 7, 3)
+            finally:
+                writer.close()
+                reader.close()
+
+    def test_wal_mode(self):
+        """Test that the database is in WAL mode so readers do not block on a writer."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = os.path.join(cache_dir, "responses.sqlite3")
+            ResponseCache(path).close()
+            db = sqlite3.connect(path)
+            try:
+                assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            finally:
+                db.close()
+
+    def test_sampled_requests_opt_in(self):
+        """Test that sampled requests are only cached with cache_sampled."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            default = ResponseCache(os.path.join(cache_dir, "a.sqlite3"))
+            sampled = ResponseCache(os.path.join(cache_dir, "b.sqlite3"), cache_sampled=True)
+            try:
+                assert default.enabled_for(make_request(0.0))
+                assert not default.enabled_for(make_request(0.7))
+                assert sampled.enabled_for(make_request(0.7))
+            finally:
+                default.close()
+                sampled.close()
+
+
+class TestInvokeWithCache:
+    """Test cases for MixtureOfAgents.invoke reading and writing the cache."""
+
+    def invoke_twice(self, runtime, model=MODEL):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ResponseCache(os.path.join(cache_dir, "responses.sqlite3"))
+            moa = MixtureOfAgents(runtime, reference_models=[model], aggregator_model=model, cache=cache)
+            try:
+                first = asyncio.run(moa.invoke(model, MESSAGES))
+                second = asyncio.run(moa.invoke(model, MESSAGES))
+            finally:
+                cache.close()
+        return first, second
+
+    def test_second_call_served_from_cache(self):
+        """Test that a repeated deterministic call is answered from the cache without calling Bedrock."""
+        runtime = FakeRuntime()
+
+        first, second = self.invoke_twice(runtime)
+
+        assert runtime.calls == 1
+        assert not first.cached
+        assert second.cached
+        assert (second.text, second.input_tokens, second.output_tokens) == ("hi there", 7, 3)
+        assert second.model_id == MODEL["modelId"]
+
+    def test_empty_text_not_cached(self):
+        """Test that an empty response is not cached, so the call is retried next time."""
+        runtime = FakeRuntime(text="")
+
+        _, second = self.invoke_twice(runtime)
+
+        assert runtime.calls == 2
+        assert not second.cached
+
+    def test_sampled_model_bypasses_cache(self):
+        """Test that a model with a non-zero temperature is called every time by default."""
+        runtime = FakeRuntime()
+        sampled = dict(MODEL, inference_params={"temperature": 0.7, "topP": 1.0})
+
+        self.invoke_twice(runtime, sampled)
+
+        assert runtime.calls == 2
@@ -0,0 +1,173 @@
+"""
+Unit tests for the sharded, resumable AlpacaEval runner.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import pytest
+
+pytest.importorskip("botocore")
+
+from moa.eval import export, parse_args, read_checkpoints, run_items, shard_bounds, truncate_partial_line
+
+
+class FakeMoA:
+    """Answers each instruction with its upper-cased text; some instructions fail or come back empty."""
+
+    def __init__(self, failing=(), empty=()):
+        self.failing = set(failing)
+        self.empty = set(empty)
+        self.prompts = []
+
+    async def run(self, prompt):
+        self.prompts.append(prompt)
+        if prompt in self.failing:
+            raise RuntimeError("max retries reached")
+        return {
+            "output": "" if prompt in self.empty else prompt.upper(),
+            "input_token_usage": 10,
+            "output_token_usage": 5,
+            "total_time": 0.1,
+            "model_usage": {},
+        }
+
+
+def make_eval_set(count):
+    return [{"instruction": f"question {index}", "dataset": "test"} for index in range(count)]
+
+
+def write_lines(path, lines):
+    with open(path, "w") as f:
+        f.write("".join(lines))
+
+
+class TestShardBounds:
+    """Test cases for shard_bounds function."""
+
+    def test_contiguous_and_balanced(self):
+        """Test that shards cover every item once, the first ones taking the remainder."""
+        assert shard_bounds(10, 3) == [(0, 4), (4, 7), (7, 10)]
+
+    def test_more_shards_than_items(self):
+        """Test that extra shards are empty rather than overlapping."""
+        assert shard_bounds(2, 4) == [(0, 1), (1, 2), (2, 2), (2, 2)]
+
+
+class TestCheckpoints:
+    """Test cases for reading and appending checkpoint files."""
+
+    def test_read_skips_partial_lines_and_empty_outputs(self):
+        """Test that a torn last line and records without an output are left to be retried."""
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            write_lines(os.path.join(checkpoint_dir, "shard-000-of-002.jsonl"), [
+                json.dumps({"index": 0, "output": "a"}) + "\n",
+                json.dumps({"index": 1, "output": ""}) + "\n",
+                '{"index": 2, "out',
+            ])
+            write_lines(os.path.join(checkpoint_dir, "shard-001-of-002.jsonl"), [
+                json.dumps({"index": 3, "output": "d"}) + "\n",
+            ])
+
+            records = read_checkpoints(checkpoint_dir)
+
+        assert sorted(records) == [0, 3]
+
+    def test_truncate_partial_line(self):
+        """Test that a torn last line is cut off so the next record starts on its own line."""
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            path = os.path.join(checkpoint_dir, "shard.jsonl")
+            write_lines(path, ['{"index": 0}\n', '{"index": 1, "out'])
+
+            truncate_partial_line(path)
+            truncate_partial_line(os.path.join(checkpoint_dir, "missing.jsonl"))
+
+            with open(path) as f:
+                assert f.read() == '{"index": 0}\n'
+
+
+class TestRunItems:
+    """Test cases for run_items and resuming from checkpoints."""
+
+    def run(self, moa, eval_set, pending, checkpoint_dir, num_shards=2):
+        bounds = shard_bounds(len(eval_set), num_shards)
+        return asyncio.run(run_items(moa, eval_set, pending, checkpoint_dir, num_shards, bounds, "gen", 2))
+
+    def test_failures_and_empty_outputs_not_checkpointed(self):
+        """Test that failed and empty items count as failures and are not written."""
+        eval_set = make_eval_set(4)
+        moa = FakeMoA(failing={"question 1"}, empty={"question 2"})
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            records, failures = self.run(moa, eval_set, range(4), checkpoint_dir)
+            checkpointed = read_checkpoints(checkpoint_dir)
+
+        assert failures == 2
+        assert sorted(record["index"] for record in records) == [0, 3]
+        assert sorted(checkpointed) == [0, 3]
+        assert checkpointed[3]["output"] == "QUESTION 3"
+        assert checkpointed[3]["generator"] == "gen"
+
+    def test_resume_runs_only_missing_items(self):
+        """Test that a second run only runs what the first left out, and appends after a torn line."""
+        eval_set = make_eval_set(4)
+
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            self.run(FakeMoA(failing={"question 1", "question 2"}), eval_set, range(4), checkpoint_dir)
+            # An interrupted write leaves a partial line at the end of shard 0
+            with open(os.path.join(checkpoint_dir, "shard-000-of-002.jsonl"), "a") as f:
+                f.write('{"index": 1, "out')
+
+            completed = read_checkpoints(checkpoint_dir)
+            pending = [index for index in range(4) if index not in completed]
+            moa = FakeMoA()
+            _, failures = self.run(moa, eval_set, pending, checkpoint_dir)
+            completed = read_checkpoints(checkpoint_dir)
+
+        assert sorted(moa.prompts) == ["question 1", "question 2"]
+        assert failures == 0
+        assert sorted(completed) == [0, 1, 2, 3]
+
+
+class TestExport:
+    """Test cases for export function."""
+
+    def test_writes_items_in_eval_set_order(self):
+        """Test that both output files list the items in index order."""
+        records = {
+            index: {"index": index, "instruction": f"q{index}", "dataset": "test", "output": f"a{index}",
+                    "generator": "gen", "input_token_usage": 1, "output_token_usage": 2, "total_time": 0.5}
+            for index in (1, 0)
+        }
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            export(records, output_dir, "prefix", 3)
+            with open(os.path.join(output_dir, "prefix-round-3.json")) as f:
+                new_eval_set = json.load(f)
+            with open(os.path.join(output_dir, "prefix-extended-eval-set-round-3.json")) as f:
+                extended_eval_set = json.load(f)
+
+        assert [item["instruction"] for item in new_eval_set] == ["q0", "q1"]
+        assert set(new_eval_set[0]) == {"instruction", "dataset", "output", "generator"}
+        assert extended_eval_set[1]["total_time"] == 0.5
+
+    def test_refuses_empty_output(self):
+        """Test that an empty output is not exported as an answer."""
+        records = {0: {"index": 0, "instruction": "q0", "dataset": "test", "output": "", "generator": "gen"}}
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            with pytest.raises(ValueError, match="empty output"):
+                export(records, output_dir, "prefix", 3)
+            assert os.listdir(output_dir) == []
+
+
+class TestParseArgs:
+    """Test cases for parse_args function."""
+
+    def test_shard_index_out_of_range(self):
+        """Test that --shard-index must name one of the --shards shards."""
+        assert parse_args(["--round", "1", "--shards", "4", "--shard-index", "3"]).shard_index == 3
+        with pytest.raises(SystemExit):
+            parse_args(["--round", "1", "--shards", "4", "--shard-index", "4"])
+        with pytest.raises(SystemExit):
+            parse_args(["--round", "1", "--shards", "0"])
@@ -0,0 +1,185 @@
+"""
+Unit tests for the per-model RPM/TPM and adaptive concurrency limiter.
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("botocore")
+
+from moa import rate_limit
+from moa.rate_limit import ModelLimiter, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    return clock
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket class."""
+
+    def test_starts_full(self, clock):
+        """Test that a new bucket admits a full minute's worth at once."""
+        bucket = TokenBucket(600)
+
+        assert bucket.wait_time(600) == 0.0
+
+    def test_wait_for_refill(self, clock):
+        """Test that the wait is the time the missing amount takes to refill."""
+        bucket = TokenBucket(600)  # 10 per second
+        bucket.take(600)
+
+        assert bucket.wait_time(50) == pytest.approx(5.0)
+        clock.now += 5.0
+        assert bucket.wait_time(50) == pytest.approx(0.0)
+
+    def test_oversized_request_waits_for_full_bucket(self, clock):
+        """Test that a request larger than the bucket only waits until it is full."""
+        bucket = TokenBucket(60)  # 1 per second
+        bucket.take(30)
+
+        assert bucket.wait_time(1000) == pytest.approx(30.0)
+
+    def test_give_capped_at_capacity(self, clock):
+        """Test that returned tokens never overfill the bucket."""
+        bucket = TokenBucket(60)
+        bucket.take(10)
+        bucket.give(100)
+
+        assert bucket.level == 60
+
+
+class TestModelLimiter:
+    """Test cases for ModelLimiter class."""
+
+    def test_throttle_halves_concurrency_once_per_interval(self, clock):
+        """Test that a burst of throttles within DECREASE_INTERVAL halves the limit only once."""
+        async def scenario():
+            limiter = ModelLimiter(max_concurrency=16)
+            for _ in range(3):
+                await limiter.acquire(0)
+            for _ in range(3):
+                await limiter.release(0, throttled=True)
+            halved = limiter.concurrency
+
+            clock.now += rate_limit.DECREASE_INTERVAL
+            await limiter.acquire(0)
+            await limiter.release(0, throttled=True)
+            return halved, limiter.concurrency, limiter.throttles
+
+        assert asyncio.run(scenario()) == (8, 4, 4)
+
+    def test_additive_increase_up_to_max(self, clock):
+        """Test that successes grow the limit by about one per limit's worth of calls, up to max_concurrency."""
+        async def scenario():
+            limiter = ModelLimiter(max_concurrency=8)
+            limiter.concurrency = 4.0
+            for _ in range(4):
+                await limiter.acquire(0)
+                await limiter.release(0, used=0)
+            grown = limiter.concurrency
+            for _ in range(100):
+                await limiter.acquire(0)
+                await limiter.release(0, used=0)
+            return grown, limiter.concurrency
+
+        grown, final = asyncio.run(scenario())
+        assert 4.9 < grown < 5.0
+        assert final == 8
+
+    def test_concurrency_floor(self, clock):
+        """Test that throttling never takes the limit below min_concurrency."""
+        async def scenario():
+            limiter = ModelLimiter(max_concurrency=4, min_concurrency=2)
+            for _ in range(5):
+                await limiter.acquire(0)
+                await limiter.release(0, throttled=True)
+                clock.now += rate_limit.DECREASE_INTERVAL
+            return limiter.concurrency
+
+        assert asyncio.run(scenario()) == 2
+
+    def test_tokens_refunded(self, clock):
+        """Test that unused reserved tokens are returned, and a throttled call's whole reservation."""
+        async def scenario():
+            limiter = ModelLimiter(tpm=1000)
+            await limiter.acquire(300)
+            await limiter.release(300, used=100)
+            after_success = limiter.tokens.level
+            await limiter.acquire(300)
+            await limiter.release(300, used=None, throttled=True)
+            return after_success, limiter.tokens.level
+
+        assert asyncio.run(scenario()) == (900, 900)
+
+    def test_fifo_order_with_retries_first(self, clock):
+        """Test that waiting calls are admitted in arrival order, with retries ahead of new calls."""
+        async def scenario():
+            limiter = ModelLimiter(max_concurrency=1)
+            order = []
+
+            async def call(name, retry=False):
+                await limiter.acquire(0, retry=retry)
+                order.append(name)
+                await limiter.release(0, used=0)
+
+            await limiter.acquire(0)
+            tasks = [asyncio.create_task(call(name)) for name in ("a", "b", "c")]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(call("retry", retry=True)))
+            await asyncio.sleep(0)
+            queued = len(limiter.waiters)
+
+            await limiter.release(0, used=0)
+            await asyncio.gather(*tasks)
+            return queued, order
+
+        assert asyncio.run(scenario()) == (4, ["retry", "a", "b", "c"])
+
+    def test_concurrency_limit_holds_calls(self, clock):
+        """Test that no more than the concurrency limit of calls are in flight."""
+        async def scenario():
+            limiter = ModelLimiter(max_concurrency=2)
+            await limiter.acquire(0)
+            await limiter.acquire(0)
+            third = asyncio.create_task(limiter.acquire(0))
+            await asyncio.sleep(0)
+            blocked = not third.done()
+
+            await limiter.release(0, used=0)
+            await third
+            return blocked, limiter.in_flight
+
+        assert asyncio.run(scenario()) == (True, 2)
+
+
+class TestRateLimiter:
+    """Test cases for RateLimiter class."""
+
+    def test_slot_reports_usage_and_throttles(self, clock):
+        """Test that a slot releases with the usage or throttle set inside it, per model."""
+        async def scenario():
+            limiter = RateLimiter({"model-a": {"tpm": 1000, "max_concurrency": 4}}, default={"max_concurrency": 2})
+            async with limiter.slot("model-a", 200) as slot:
+                slot.used = 50
+            async with limiter.slot("model-b", 10) as slot:
+                slot.throttled = True
+            return limiter
+
+        limiter = asyncio.run(scenario())
+
+        assert limiter.models["model-a"].tokens.level == 950
+        assert limiter.snapshot() == {
+            "model-a": {"concurrency": 4, "in_flight": 0, "queued": 0, "throttles": 0},
+            "model-b": {"concurrency": 1, "in_flight": 0, "queued": 0, "throttles": 1},
+        }
@@ -13,18 +13,72 @@
 # limitations under the License.
 
 import argparse
+import hashlib
+import json
 import os
+import re
 import shutil
 import signal
+import socket
+import ssl
 import subprocess
 import sys
+import threading
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 ERROR_EXIT_DELAY = 15
 ERROR_CODE_FATAL = 255
+ERROR_CODE_RANK_FAILURE = 254
 ERROR_CODE_USAGE = 253
 EXIT_SUCCESS = 0
 DELAY_BETWEEN_QUERIES = 2
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+WATCH_TIMEOUT_SECONDS = 60
+# EKS labels nodes with their position in the EC2 network topology, from the spine (layer 1) down to the
+# switch the instance hangs off (layer 3). Nodes sharing deeper layers have fewer hops between them.
+NETWORK_LAYER_LABELS = [
+    "topology.k8s.aws/network-node-layer-1",
+    "topology.k8s.aws/network-node-layer-2",
+    "topology.k8s.aws/network-node-layer-3",
+]
+ZONE_LABEL = "topology.kubernetes.io/zone"
+EFA_RESOURCE = "vpc.amazonaws.com/efa"
+# Forwarded to every rank, since ranks on workers are started through kubectl exec and inherit nothing.
+FORWARDED_ENV_PREFIXES = ("NCCL_", "FI_")
+# Triton lifecycle messages marking when a rank starts and finishes loading the engine.
+RANK_LOG_EVENTS = [
+    ("engine_load_start", "loading: tensorrt_llm"),
+    ("engine_load_end", "successfully loaded 'tensorrt_llm'"),
+]
+# mpirun --tag-output prefixes every line with [jobid,rank]<stdout|stderr>:
+RANK_TAG_RE = re.compile(r"^\[\d+,(\d+)\]<std(?:out|err)>:")
+HEALTH_URL = "http://localhost:8000/v2/health/ready"
+METRICS_URL = "http://localhost:8002/metrics"
+NSYS_SESSION = "triton"
+# Absolute paths referenced from config.pbtxt parameters (engine_dir, tokenizer_dir, ...) are staged along with the repository.
+CONFIG_PATH_RE = re.compile(r'string_value:\s*"(/[^"]+)"')
+STAGE_MANIFEST = ".stage_manifest.json"
+# Written once staging completes; the worker readiness probe checks for it.
+STAGE_READY_MARKER = ".staged"
+STAGE_CHUNK_BYTES = 16 * 1024 * 1024
+# Process states that count as dead when a rank stays in them past the heartbeat timeout: stopped or zombie.
+# Uninterruptible sleep (D) is left out, since ranks routinely sit in it while reading engines from shared storage.
+DEAD_PROCESS_STATES = ("T", "Z")
+# A rank hung in a collective keeps spinning in R or S, so hangs are detected from rank 0's metrics instead:
+# requests are in flight but neither Triton nor the TensorRT-LLM executor makes progress.
+IN_FLIGHT_METRICS = (
+    ("nv_inference_pending_request_count", None),
+    ("nv_trt_llm_request_metrics", 'request_type="active"'),
+)
+PROGRESS_METRICS = (
+    ("nv_inference_exec_count", None),
+    ("nv_trt_llm_general_metrics", 'general_type="iteration_counter"'),
+)
+METRIC_LINE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)")
 
 def die(exit_code: int):
     if exit_code is None:
@@ -57,10 +111,26 @@ def parse_arguments():
     )
     parser.add_argument("--stateful_set_group_key",type=str,default=None,help="Value of leaderworkerset.sigs.k8s.io/group-key, Leader uses this to gang schedule and its only needed in leader mode")
     parser.add_argument("--enable_nsys", action="store_true", help="Enable Triton server profiling")
+    parser.add_argument("--nsys_delay", type=float, default=0, help="With --enable_nsys and --nsys_duration, seconds to wait after Triton first reports ready before capturing.")
+    parser.add_argument("--nsys_duration", type=float, default=0, help="With --enable_nsys, capture only this many seconds instead of the whole run.")
+    parser.add_argument("--timeline_file", type=str, default=None, help="Write the startup timeline as JSON to this path ('{pod}' is replaced with the pod name).")
+    parser.add_argument("--placement_group_label", type=str, default=None, help="Node label naming the EC2 placement group, used to keep pipeline stages close when network topology labels are missing.")
+    parser.add_argument("--cpu_binding", type=str, default="numa", choices=["numa", "none"], help="Bind each rank to the NUMA node of its GPU, or leave binding to the OS.")
+    parser.add_argument("--stage_dir", type=str, default=None, help="Local (NVMe) directory to stage the model repository and the engine/tokenizer paths it references into before starting Triton.")
+    parser.add_argument("--stage_workers", type=int, default=8, help="Files copied in parallel while staging.")
+    parser.add_argument("--stage_verify", action="store_true", help="Re-hash staged files reused from a previous run against their recorded checksums.")
+    parser.add_argument("--enable_rank_health", action="store_true", help="Exchange heartbeats between leader and workers and restart the group when a rank dies or hangs")
+    parser.add_argument("--heartbeat_port", type=int, default=29600, help="UDP port the leader listens on for worker heartbeats.")
+    parser.add_argument("--heartbeat_interval", type=float, default=1.0, help="Seconds between heartbeats.")
+    parser.add_argument("--heartbeat_timeout", type=float, default=10.0, help="Seconds without a heartbeat, or with a rank stopped or defunct, before the group is restarted.")
+    parser.add_argument("--hang_timeout", type=float, default=300.0, help="Seconds with requests in flight but no inference progress before the group is restarted.")
 
     return parser.parse_args()
 
 def run_command(cmd_args: [str], omit_args: [int] = None):
+    return start_command(cmd_args, omit_args).wait()
+
+def start_command(cmd_args: [str], omit_args: [int] = None, capture_output: bool = False):
     command = ""
 
     for i, arg in enumerate(cmd_args):
@@ -73,16 +143,133 @@ def run_command(cmd_args: [str], omit_args: [int] = None):
     write_output(f">{command}")
     write_output(" ")
 
-    return subprocess.call(cmd_args, stderr=sys.stderr, stdout=sys.stdout)
+    if capture_output:
+        return subprocess.Popen(cmd_args, stderr=subprocess.STDOUT, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+    return subprocess.Popen(cmd_args, stderr=sys.stderr, stdout=sys.stdout)
+
+def stop_command(process, grace_seconds: float = 5):
+    if process.poll() is not None:
+        return
+
+    process.terminate()
+    try:
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
 
 def signal_handler(sig, frame):
     write_output(f"Signal {sig} detected, quitting.")
     exit(EXIT_SUCCESS)
 
+def kube_api_request(path: str, timeout: float = None):
+    host = os.environ["KUBERNETES_SERVICE_HOST"]
+    port = os.environ.get("KUBERNETES_SERVICE_PORT", "443")
+
+    with open(f"{SERVICE_ACCOUNT_DIR}/token") as token_file:
+        token = token_file.read().strip()
+
+    context = ssl.create_default_context(cafile=f"{SERVICE_ACCOUNT_DIR}/ca.crt")
+    request = urllib.request.Request(
+        f"https://{host}:{port}{path}",
+        headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
+    )
+
+    return urllib.request.urlopen(request, context=context, timeout=timeout)
+
+def is_pod_ready(pod: dict) -> bool:
+    if pod["metadata"].get("deletionTimestamp") is not None:
+        return False
+
+    status = pod.get("status", {})
+    if status.get("phase") != "Running":
+        return False
+
+    # The leader's own readiness probe only passes once Triton is serving, which
+    # needs mpirun to have started, so Running is enough for the leader pod.
+    if pod["metadata"]["name"] == os.environ.get("HOSTNAME"):
+        return True
+
+    return any(
+        condition.get("type") == "Ready" and condition.get("status") == "True"
+        for condition in status.get("conditions", [])
+    )
+
 def wait_for_workers(num_total_pod: int, args):
     if num_total_pod is None or num_total_pod <= 0:
         raise RuntimeError("Argument `world_size` must be greater than zero.")
 
+    if "KUBERNETES_SERVICE_HOST" not in os.environ:
+        write_output("Kubernetes API is not reachable in-cluster, falling back to polling with kubectl.")
+        return poll_for_workers(num_total_pod, args)
+
+    write_output("Begin watching for worker pods.")
+
+    selector = urllib.parse.quote(f"leaderworkerset.sigs.k8s.io/group-key={args.stateful_set_group_key}")
+    path = f"/api/v1/namespaces/{args.namespace}/pods?labelSelector={selector}"
+
+    pods = {}
+    resource_version = None
+    ready = []
+
+    while len(ready) < num_total_pod:
+        try:
+            # (Re)list to get a consistent snapshot and the resourceVersion to watch from.
+            if resource_version is None:
+                with kube_api_request(path, timeout=WATCH_TIMEOUT_SECONDS) as response:
+                    listing = json.load(response)
+                pods = {pod["metadata"]["name"]: pod for pod in listing["items"]}
+                resource_version = listing["metadata"]["resourceVersion"]
+                ready = sorted(name for name, pod in pods.items() if is_pod_ready(pod))
+                write_output(f"Waiting for worker pods, {len(ready)} of {num_total_pod} ready.")
+                continue
+
+            watch_path = (
+                f"{path}&watch=true&allowWatchBookmarks=true"
+                f"&resourceVersion={resource_version}&timeoutSeconds={WATCH_TIMEOUT_SECONDS}"
+            )
+
+            with kube_api_request(watch_path, timeout=WATCH_TIMEOUT_SECONDS + 30) as stream:
+                for line in stream:
+                    event = json.loads(line)
+                    pod = event["object"]
+
+                    if event["type"] == "ERROR":
+                        # Typically 410 Gone: our resourceVersion is too old, relist.
+                        if args.verbose:
+                            write_output(f"Watch error: {pod.get('message')}")
+                        resource_version = None
+                        break
+
+                    resource_version = pod["metadata"]["resourceVersion"]
+
+                    if event["type"] == "BOOKMARK":
+                        continue
+
+                    if event["type"] == "DELETED":
+                        pods.pop(pod["metadata"]["name"], None)
+                    else:
+                        pods[pod["metadata"]["name"]] = pod
+
+                    now_ready = sorted(name for name, pod in pods.items() if is_pod_ready(pod))
+                    if now_ready != ready:
+                        ready = now_ready
+                        write_output(f"Waiting for worker pods, {len(ready)} of {num_total_pod} ready.")
+
+                    if len(ready) >= num_total_pod:
+                        break
+        except (urllib.error.URLError, OSError, ValueError) as exception:
+            write_error(f"Watching pods failed ({exception}), retrying.")
+            resource_version = None
+            time.sleep(DELAY_BETWEEN_QUERIES)
+
+    write_output(f"{len(ready)} of {num_total_pod} workers ready.")
+    write_output(" ")
+
+    return ready
+
+def poll_for_workers(num_total_pod: int, args):
     write_output("Begin waiting for worker pods.")
 
     cmd_args = [
@@ -131,6 +318,678 @@ def wait_for_workers(num_total_pod: int, args):
 
     return workers
 
+def restart_group(reason: str):
+    # LeaderWorkerSet runs with RecreateGroupOnPodRestart, so exiting here restarts every pod in the group.
+    # There is no exit delay: the sooner the group is recreated, the less GPU time is spent on a broken instance.
+    write_error(f"fatal: {reason}.")
+    write_error("       Exiting so the LeaderWorkerSet group is recreated.")
+
+    exit(ERROR_CODE_RANK_FAILURE)
+
+def find_rank_processes() -> dict:
+    ranks = {}
+
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as cmdline_file:
+                executable = cmdline_file.read().split(b"\0")[0]
+
+            if os.path.basename(executable) != b"tritonserver":
+                continue
+
+            with open(f"/proc/{entry}/stat") as stat_file:
+                # The state follows the parenthesised command name, which may itself contain spaces.
+                state = stat_file.read().rsplit(")", 1)[1].split()[0]
+        except (OSError, IndexError):
+            continue
+
+        ranks[int(entry)] = state
+
+    return ranks
+
+class LocalRankMonitor:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expected = 0
+        self.stuck_since = {}
+
+    def check(self):
+        ranks = find_rank_processes()
+        now = time.monotonic()
+
+        # Ranks are launched through kubessh, so the most ever seen at once is how many this pod should have.
+        self.expected = max(self.expected, len(ranks))
+        if len(ranks) < self.expected:
+            return f"{self.expected - len(ranks)} of {self.expected} local ranks exited"
+
+        for pid in list(self.stuck_since):
+            if pid not in ranks or ranks[pid] not in DEAD_PROCESS_STATES:
+                del self.stuck_since[pid]
+
+        for pid, state in ranks.items():
+            if state not in DEAD_PROCESS_STATES:
+                continue
+
+            since = self.stuck_since.setdefault(pid, now)
+            if now - since > self.timeout:
+                return f"rank process {pid} stuck in state {state} for {now - since:.1f}s"
+
+        return None
+
+def read_triton_metrics() -> dict:
+    with urllib.request.urlopen(METRICS_URL, timeout=1) as response:
+        text = response.read().decode("utf-8", "replace")
+
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE_RE.match(line)
+        if match is None:
+            continue
+
+        try:
+            value = float(match.group(3))
+        except ValueError:
+            continue
+
+        samples.setdefault(match.group(1), []).append((match.group(2) or "", value))
+
+    return samples
+
+def sum_metrics(samples: dict, metrics) -> float:
+    return sum(
+        value
+        for name, label in metrics
+        for labels, value in samples.get(name, [])
+        if label is None or label in labels
+    )
+
+class ProgressMonitor:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.progress = None
+        self.stalled_since = None
+
+    def check(self):
+        try:
+            samples = read_triton_metrics()
+        except (urllib.error.URLError, OSError):
+            # A missed scrape is neither progress nor a stall.
+            return None
+
+        now = time.monotonic()
+        in_flight = sum_metrics(samples, IN_FLIGHT_METRICS)
+        progress = sum_metrics(samples, PROGRESS_METRICS)
+
+        # Every rank takes part in each executor iteration, so a hang on any of them stops rank 0's counters too.
+        if in_flight == 0 or progress != self.progress:
+            self.progress = progress
+            self.stalled_since = None
+            return None
+
+        if self.stalled_since is None:
+            self.stalled_since = now
+        elif now - self.stalled_since > self.timeout:
+            return f"no inference progress for {now - self.stalled_since:.1f}s with {in_flight:.0f} requests in flight"
+
+        return None
+
+class HeartbeatMonitor:
+    def __init__(self, pods: [str], args):
+        self.timeout = args.heartbeat_timeout
+        self.verbose = args.verbose
+        self.failure = None
+        self.addresses = {}
+        self.lock = threading.Lock()
+
+        # Workers have been heartbeating since they started, so each gets one timeout from now to be heard.
+        now = time.monotonic()
+        self.last_seen = {pod: now for pod in pods}
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", args.heartbeat_port))
+
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            data, address = self.sock.recvfrom(4096)
+
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+
+            pod = message.get("pod")
+            if pod not in self.last_seen:
+                continue
+
+            with self.lock:
+                self.last_seen[pod] = time.monotonic()
+                self.addresses[pod] = address
+                if message.get("failure") and self.failure is None:
+                    self.failure = f"{pod} reported {message['failure']}"
+
+            if self.verbose:
+                write_output(f"Heartbeat {message.get('seq')} from {pod} ({message.get('ranks')} ranks).")
+
+            self.sock.sendto(b'{"type": "ack"}', address)
+
+    def check(self):
+        now = time.monotonic()
+
+        with self.lock:
+            if self.failure is not None:
+                return self.failure
+
+            for pod, last_seen in self.last_seen.items():
+                if now - last_seen > self.timeout:
+                    return f"no heartbeat from {pod} for {now - last_seen:.1f}s"
+
+        return None
+
+    def broadcast_restart(self):
+        with self.lock:
+            addresses = list(self.addresses.values())
+
+        for address in addresses:
+            try:
+                self.sock.sendto(b'{"type": "restart"}', address)
+            except OSError:
+                pass
+
+class StartupTimeline:
+    def __init__(self, args):
+        self.path = args.timeline_file.format(pod=socket.gethostname()) if args.timeline_file else None
+        self.started_at = time.time()
+        self.phases = {}
+        self.ranks = {}
+        self.lock = threading.Lock()
+
+    def offset(self) -> float:
+        return round(time.time() - self.started_at, 3)
+
+    def begin(self, phase: str):
+        with self.lock:
+            self.phases.setdefault(phase, {"start": self.offset()})
+
+    def end(self, phase: str):
+        with self.lock:
+            entry = self.phases.setdefault(phase, {"start": self.offset()})
+            if "end" not in entry:
+                entry["end"] = self.offset()
+                entry["seconds"] = round(entry["end"] - entry["start"], 3)
+                write_output(f"Startup phase {phase} took {entry['seconds']:.1f}s.")
+
+    def done(self, phase: str) -> bool:
+        with self.lock:
+            return "end" in self.phases.get(phase, {})
+
+    def rank_event(self, rank: int, event: str):
+        with self.lock:
+            self.ranks.setdefault(rank, {}).setdefault(event, self.offset())
+
+    def ranks_with(self, event: str) -> int:
+        with self.lock:
+            return sum(1 for events in self.ranks.values() if event in events)
+
+    def to_json(self) -> dict:
+        with self.lock:
+            ranks = {}
+            for rank, events in sorted(self.ranks.items()):
+                ranks[str(rank)] = dict(events)
+                if "engine_load_start" in events and "engine_load_end" in events:
+                    ranks[str(rank)]["engine_load_seconds"] = round(events["engine_load_end"] - events["engine_load_start"], 3)
+
+            return {
+                "pod": socket.gethostname(),
+                "started_at": self.started_at,
+                "phases": {phase: dict(entry) for phase, entry in self.phases.items()},
+                "ranks": ranks,
+            }
+
+    def write(self):
+        timeline = json.dumps(self.to_json())
+        write_output(f"Startup timeline: {timeline}")
+
+        if self.path is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as timeline_file:
+                timeline_file.write(timeline)
+        except OSError as exception:
+            write_error(f"Writing startup timeline to {self.path} failed: {exception}")
+
+def follow_rank_output(process, timeline: StartupTimeline, world_size: int):
+    for line in process.stdout:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+        match = RANK_TAG_RE.match(line)
+        if match is None:
+            continue
+
+        rank = int(match.group(1))
+        timeline.rank_event(rank, "first_output")
+
+        for event, marker in RANK_LOG_EVENTS:
+            if marker in line:
+                timeline.rank_event(rank, event)
+
+        if not timeline.done("mpirun_launch") and timeline.ranks_with("first_output") >= world_size:
+            timeline.end("mpirun_launch")
+
+        if timeline.ranks_with("engine_load_start") == 1:
+            timeline.begin("engine_load")
+
+        if not timeline.done("engine_load") and timeline.ranks_with("engine_load_end") >= world_size:
+            timeline.end("engine_load")
+
+def is_triton_ready() -> bool:
+    try:
+        with urllib.request.urlopen(HEALTH_URL, timeout=1) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+class NsysWindow:
+    def __init__(self, args):
+        self.delay = args.nsys_delay
+        self.duration = args.nsys_duration
+        self.start_at = None
+        self.stop_at = None
+
+    def schedule(self):
+        self.start_at = time.monotonic() + self.delay
+        write_output(f"nsys capture scheduled in {self.delay:.0f}s for {self.duration:.0f}s.")
+
+    def tick(self):
+        now = time.monotonic()
+
+        if self.start_at is not None and now >= self.start_at:
+            self.start_at = None
+            self.stop_at = now + self.duration
+            run_command(["nsys", "start", f"--session={NSYS_SESSION}", "--force-overwrite", "true", "-o", "/var/run/models/nsys_report"])
+
+        if self.stop_at is not None and now >= self.stop_at:
+            self.stop_at = None
+            run_command(["nsys", "stop", f"--session={NSYS_SESSION}"])
+
+def supervise_leader(process, workers: [str], world_size: int, args, timeline: StartupTimeline):
+    heartbeats = None
+    local_ranks = None
+    progress = None
+    nsys_window = NsysWindow(args) if args.enable_nsys and args.nsys_duration > 0 else None
+
+    if args.enable_rank_health:
+        peers = [worker for worker in workers if worker != socket.gethostname()]
+        heartbeats = HeartbeatMonitor(peers, args)
+        local_ranks = LocalRankMonitor(args.heartbeat_timeout)
+        progress = ProgressMonitor(args.hang_timeout)
+        write_output(f"Rank health enabled, expecting heartbeats from {len(peers)} workers on UDP port {args.heartbeat_port}.")
+
+    if process.stdout is not None:
+        threading.Thread(target=follow_rank_output, args=(process, timeline, world_size), daemon=True).start()
+
+    while process.poll() is None:
+        time.sleep(args.heartbeat_interval)
+
+        if heartbeats is not None:
+            reason = heartbeats.check() or local_ranks.check()
+            # Engines are still loading until Triton first reports ready, so there is no progress to expect before then.
+            if reason is None and timeline.done("first_health"):
+                reason = progress.check()
+            if reason is not None:
+                heartbeats.broadcast_restart()
+                stop_command(process)
+                timeline.write()
+                restart_group(reason)
+
+        if not timeline.done("first_health") and is_triton_ready():
+            timeline.end("first_health")
+            timeline.write()
+            if nsys_window is not None:
+                nsys_window.schedule()
+
+        if nsys_window is not None:
+            nsys_window.tick()
+
+    if not timeline.done("first_health"):
+        timeline.write()
+
+    if process.returncode != 0:
+        if heartbeats is not None:
+            heartbeats.broadcast_restart()
+            restart_group(f"mpirun exited with code {process.returncode}")
+        die(process.returncode)
+
+    return process.returncode
+
+def run_worker_heartbeat(args):
+    leader = os.environ.get("LWS_LEADER_ADDRESS")
+    if leader is None:
+        write_error("fatal: LWS_LEADER_ADDRESS is not set, rank health requires running under a LeaderWorkerSet.")
+        die(ERROR_CODE_USAGE)
+
+    pod = socket.gethostname()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    local_ranks = LocalRankMonitor(args.heartbeat_timeout)
+    last_ack = None
+    seq = 0
+
+    write_output(f"Worker sending heartbeats to {leader}:{args.heartbeat_port}.")
+
+    while True:
+        failure = local_ranks.check()
+        message = {"pod": pod, "seq": seq, "ranks": local_ranks.expected, "failure": failure}
+        seq += 1
+
+        try:
+            sock.sendto(json.dumps(message).encode("utf-8"), (leader, args.heartbeat_port))
+        except OSError as exception:
+            # The leader's DNS record only appears once its pod is scheduled.
+            if args.verbose:
+                write_output(f"Heartbeat to {leader} failed: {exception}")
+
+        if failure is not None:
+            restart_group(failure)
+
+        deadline = time.monotonic() + args.heartbeat_interval
+        while (remaining := deadline - time.monotonic()) > 0:
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(4096)
+            except (socket.timeout, OSError):
+                break
+
+            try:
+                reply = json.loads(data)
+            except ValueError:
+                continue
+
+            if reply.get("type") == "restart":
+                restart_group("leader requested a group restart")
+
+            last_ack = time.monotonic()
+
+        # Only enforced once the leader has answered, since it starts listening after all workers are ready.
+        if last_ack is not None and time.monotonic() - last_ack > args.heartbeat_timeout:
+            restart_group(f"no heartbeat from leader {leader} for {time.monotonic() - last_ack:.1f}s")
+
+def get_pod_topology(pod_name: str, args) -> dict:
+    with kube_api_request(f"/api/v1/namespaces/{args.namespace}/pods/{pod_name}", timeout=WATCH_TIMEOUT_SECONDS) as response:
+        node_name = json.load(response)["spec"]["nodeName"]
+
+    with kube_api_request(f"/api/v1/nodes/{node_name}", timeout=WATCH_TIMEOUT_SECONDS) as response:
+        node = json.load(response)
+
+    labels = node["metadata"].get("labels", {})
+
+    return {
+        "node": node_name,
+        "network_layers": [labels.get(label) for label in NETWORK_LAYER_LABELS],
+        "placement_group": labels.get(args.placement_group_label) if args.placement_group_label else None,
+        "zone": labels.get(ZONE_LABEL),
+        "efa": int(node.get("status", {}).get("allocatable", {}).get(EFA_RESOURCE, 0)),
+    }
+
+def topology_distance(a: dict, b: dict) -> int:
+    if a["node"] == b["node"]:
+        return 0
+
+    # Deepest shared network layer first: sharing layer 3 means sharing the same switch.
+    for depth in range(len(NETWORK_LAYER_LABELS), 0, -1):
+        layer_a, layer_b = a["network_layers"][depth - 1], b["network_layers"][depth - 1]
+        if layer_a is not None and layer_a == layer_b:
+            return len(NETWORK_LAYER_LABELS) - depth + 1
+
+    if a["placement_group"] is not None and a["placement_group"] == b["placement_group"]:
+        return len(NETWORK_LAYER_LABELS) + 1
+
+    if a["zone"] is not None and a["zone"] == b["zone"]:
+        return len(NETWORK_LAYER_LABELS) + 2
+
+    return len(NETWORK_LAYER_LABELS) + 3
+
+def order_workers_by_topology(workers: [str], args):
+    # Rank 0 serves HTTP and metrics, so the leader pod always comes first.
+    leader = socket.gethostname()
+    ordered = [leader] + [worker for worker in workers if worker != leader] if leader in workers else list(workers)
+
+    if "KUBERNETES_SERVICE_HOST" not in os.environ:
+        return ordered, None
+
+    try:
+        topology = {worker: get_pod_topology(worker, args) for worker in ordered}
+    except (urllib.error.URLError, OSError, KeyError, ValueError) as exception:
+        write_error(f"Reading node topology failed ({exception}), keeping pods in name order.")
+        return ordered, None
+
+    # mpirun fills each host's slots before moving on and TensorRT-LLM numbers ranks tensor parallel first,
+    # so a TP group never leaves a node unless it is wider than one, and consecutive pipeline stages land on
+    # consecutive hosts. Greedily chain each host to its nearest remaining neighbour to keep those hops short.
+    chain = [ordered[0]]
+    remaining = ordered[1:]
+    while remaining:
+        nearest = min(remaining, key=lambda worker: (topology_distance(topology[chain[-1]], topology[worker]), remaining.index(worker)))
+        chain.append(nearest)
+        remaining.remove(nearest)
+
+    for position, worker in enumerate(chain):
+        write_output(f"Placement {position}: {worker} on {topology[worker]['node']} (layers: {topology[worker]['network_layers']}, efa: {topology[worker]['efa']})")
+
+    return chain, min(topology[worker]["efa"] for worker in chain)
+
+def count_local_efa_devices() -> int:
+    try:
+        return len(os.listdir("/sys/class/infiniband"))
+    except OSError:
+        return 0
+
+def build_rank_environment(efa_count):
+    env = {}
+
+    if efa_count is None:
+        efa_count = count_local_efa_devices()
+
+    write_output(f"Using {efa_count} EFA devices per node.")
+
+    if efa_count > 0:
+        env.update({
+            # Make NCCL (through aws-ofi-nccl) use EFA rather than falling back to TCP sockets.
+            "FI_PROVIDER": "efa",
+            "FI_EFA_FORK_SAFE": "1",
+            # Bootstrap traffic still goes over TCP; keep it off loopback and docker bridges.
+            "NCCL_SOCKET_IFNAME": "^lo,docker",
+        })
+
+    # Anything set on the leader (for example NCCL_DEBUG from the chart) overrides the defaults above.
+    env.update({key: value for key, value in os.environ.items() if key.startswith(FORWARDED_ENV_PREFIXES)})
+
+    cmd_args = []
+    for key, value in sorted(env.items()):
+        write_output(f"Rank environment: {key}={value}")
+        cmd_args += ["-x", f"{key}={value}"]
+
+    return cmd_args
+
+def count_numa_nodes() -> int:
+    try:
+        return len([entry for entry in os.listdir("/sys/devices/system/node") if entry.startswith("node") and entry[4:].isdigit()])
+    except OSError:
+        return 1
+
+def build_binding_args(args):
+    numa_nodes = count_numa_nodes()
+
+    # GPUs are split evenly across NUMA nodes on P4d/P5, in local rank order, so filling one NUMA node at a
+    # time binds each rank next to its GPU and NIC. Nodes are assumed to match the leader's layout.
+    if args.cpu_binding == "numa" and numa_nodes > 1 and args.gpu_per_node % numa_nodes == 0:
+        return ["--map-by", f"ppr:{args.gpu_per_node // numa_nodes}:numa", "--bind-to", "numa"]
+
+    return ["--map-by", "slot", "--bind-to", "none"]
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(STAGE_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_file(source: str, destination: str, previous: dict, verify: bool):
+    stat = os.stat(source)
+    record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    # Reuse what an earlier run of this pod staged, as long as the source has not changed since.
+    if (
+        previous is not None
+        and previous.get("size") == stat.st_size
+        and previous.get("mtime_ns") == stat.st_mtime_ns
+        and os.path.isfile(destination)
+        and os.path.getsize(destination) == stat.st_size
+    ):
+        if not verify or file_sha256(destination) == previous.get("sha256"):
+            return dict(record, sha256=previous.get("sha256")), "reused"
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    partial = destination + ".partial"
+
+    if os.stat(os.path.dirname(destination)).st_dev == stat.st_dev:
+        # Same filesystem: a hard link costs nothing and the file is already local.
+        if os.path.exists(partial):
+            os.remove(partial)
+        os.link(source, partial)
+        sha256 = file_sha256(partial)
+        action = "linked"
+    else:
+        digest = hashlib.sha256()
+        with open(source, "rb") as reader, open(partial, "wb") as writer:
+            while chunk := reader.read(STAGE_CHUNK_BYTES):
+                digest.update(chunk)
+                writer.write(chunk)
+        sha256 = digest.hexdigest()
+        action = "copied"
+
+    os.replace(partial, destination)
+
+    return dict(record, sha256=sha256), action
+
+def staged_path(stage_dir: str, path: str) -> str:
+    return os.path.join(stage_dir, "files", path.lstrip("/"))
+
+def staged_reference(stage_dir: str, sources: [str], path: str):
+    # A config may name a staged source, anything inside one (the model repository included), or either through a symlink.
+    for source in sources:
+        for candidate, root in ((os.path.normpath(path), source), (os.path.realpath(path), os.path.realpath(source))):
+            if candidate == root:
+                return staged_path(stage_dir, source)
+            if candidate.startswith(root + os.sep):
+                return staged_path(stage_dir, os.path.join(source, os.path.relpath(candidate, root)))
+
+    return None
+
+def find_referenced_paths(repo_dir: str) -> [str]:
+    repo_dir = os.path.realpath(repo_dir)
+    paths = set()
+
+    for root, _, files in os.walk(repo_dir):
+        if "config.pbtxt" not in files:
+            continue
+
+        with open(os.path.join(root, "config.pbtxt")) as config_file:
+            for path in CONFIG_PATH_RE.findall(config_file.read()):
+                if os.path.exists(path) and not os.path.realpath(path).startswith(repo_dir + os.sep):
+                    paths.add(path)
+
+    # Ordered by target so a directory comes before the files inside it, however each is referenced.
+    return sorted(paths, key=os.path.realpath)
+
+def stage_model_repository(args) -> str:
+    stage_dir = args.stage_dir
+    repo_dir = args.triton_model_repo_dir.rstrip("/")
+    marker = os.path.join(stage_dir, STAGE_READY_MARKER)
+    manifest_path = os.path.join(stage_dir, STAGE_MANIFEST)
+
+    os.makedirs(stage_dir, exist_ok=True)
+    if os.path.exists(marker):
+        os.remove(marker)
+
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    sources = [repo_dir]
+    for path in find_referenced_paths(repo_dir):
+        # A file inside an already referenced directory is staged with that directory.
+        if staged_reference(stage_dir, sources, path) is None:
+            sources.append(path)
+    files = []
+    for source in sources:
+        if os.path.isfile(source):
+            files.append(source)
+            continue
+        for root, _, names in os.walk(source):
+            files += [os.path.join(root, name) for name in names]
+
+    write_output(f"Staging {len(files)} files from {', '.join(sources)} into {stage_dir} with {args.stage_workers} workers.")
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.stage_workers) as executor:
+        futures = {
+            source: executor.submit(stage_file, source, staged_path(stage_dir, source), manifest.get(source), args.stage_verify)
+            for source in files
+        }
+        results = {source: future.result() for source, future in futures.items()}
+    elapsed = time.monotonic() - start
+
+    manifest = {source: record for source, (record, _) in results.items()}
+
+    # Point config.pbtxt parameters at the staged copies.
+    def rewrite(match):
+        staged = staged_reference(stage_dir, sources, match.group(1))
+        return match.group(0) if staged is None else f'string_value: "{staged}"'
+
+    staged_repo = staged_path(stage_dir, repo_dir)
+    for root, _, names in os.walk(staged_repo):
+        if "config.pbtxt" not in names:
+            continue
+        config_path = os.path.join(root, "config.pbtxt")
+        # Hard-linked configs share their inode with the source, so write a new file rather than editing in place.
+        with open(config_path) as config_file:
+            config = config_file.read()
+        rewritten = CONFIG_PATH_RE.sub(rewrite, config)
+        if rewritten != config:
+            os.remove(config_path)
+            with open(config_path, "w") as config_file:
+                config_file.write(rewritten)
+            manifest.pop(os.path.join(repo_dir, os.path.relpath(config_path, staged_repo)), None)
+
+    # Rewritten configs no longer match their source, so drop them from the manifest to restage them next time.
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+    total_bytes = sum(record["size"] for record, _ in results.values())
+    counts = {action: 0 for action in ("copied", "linked", "reused")}
+    for _, action in results.values():
+        counts[action] += 1
+    copied_bytes = sum(record["size"] for record, action in results.values() if action == "copied")
+    write_output(
+        f"Staged {total_bytes / 1e9:.2f} GB in {elapsed:.1f}s: copied {counts['copied']} files ({copied_bytes / 1e9:.2f} GB "
+        f"at {copied_bytes / 1e6 / max(elapsed, 1e-3):.0f} MB/s), hard-linked {counts['linked']}, "
+        f"reused {counts['reused']} from the previous run."
+    )
+
+    with open(marker, "w") as marker_file:
+        marker_file.write(staged_repo)
+
+    return staged_repo
+
 def write_output(message: str):
     print(message, file=sys.stdout, flush=True)
 
@@ -149,15 +1008,47 @@ def do_leader(args):
 
     write_output(f"Executing Leader (world size: {world_size})")
 
-    workers = wait_for_workers(world_size / args.gpu_per_node, args)
+    timeline = StartupTimeline(args)
+    timeline.begin("first_health")
 
-    if len(workers) != (world_size / args.gpu_per_node):
-        write_error(f"fatal: {len(workers)} found, expected {world_size / args.gpu_per_node}.")
+    num_pods = world_size // args.gpu_per_node
+
+    if args.stage_dir:
+        timeline.begin("staging")
+        args.triton_model_repo_dir = stage_model_repository(args)
+        timeline.end("staging")
+
+    timeline.begin("pod_wait")
+    workers = wait_for_workers(num_pods, args)
+    timeline.end("pod_wait")
+
+    if len(workers) != num_pods:
+        write_error(f"fatal: {len(workers)} found, expected {num_pods}.")
         die(ERROR_EXIT_DELAY)
     
+    if args.tp > args.gpu_per_node and args.tp % args.gpu_per_node != 0:
+        write_error(f"warning: --tp={args.tp} is not a multiple of --gpu_per_node={args.gpu_per_node}, tensor parallel groups will straddle nodes unevenly.")
+
+    timeline.begin("placement")
+    workers, efa_count = order_workers_by_topology(workers, args)
+    timeline.end("placement")
+
     workers_with_mpi_slots = [worker + f":{args.gpu_per_node}" for worker in workers]
 
-    if args.enable_nsys:
+    if args.enable_nsys and args.nsys_duration > 0:
+        # Attach nsys now but only collect once Triton is warm, see NsysWindow.
+        cmd_args = [
+            "nsys",
+            "launch",
+            f"--session-new={NSYS_SESSION}",
+            "-t",
+            "cuda,nvtx",
+            "--enable",
+            "efa_metrics",
+            "/opt/amazon/openmpi/bin/mpirun",
+            "--allow-run-as-root",
+        ]
+    elif args.enable_nsys:
         cmd_args = [
             "nsys",
             "profile",
@@ -181,6 +1072,12 @@ def do_leader(args):
     if args.verbose:
         cmd_args += ["--debug-devel"]
 
+    cmd_args += build_binding_args(args)
+    cmd_args += build_rank_environment(efa_count)
+
+    if args.timeline_file:
+        cmd_args += ["--tag-output"]
+
     cmd_args += [
         "--report-bindings",
         "-mca",
@@ -230,21 +1127,29 @@ def do_leader(args):
                 "--allow-metrics=false",
                 "--model-control-mode=explicit",
                 "--load-model=tensorrt_llm",
-                "--log-info=false",
+                # The timeline needs every rank's model load messages.
+                f"--log-info={'true' if args.timeline_file else 'false'}",
                 "--log-warning=false",
             ]
 
-    result = run_command(cmd_args)
+    if args.timeline_file:
+        timeline.begin("mpirun_launch")
 
-    if result != 0:
-        die(result)
+    process = start_command(cmd_args, capture_output=args.timeline_file is not None)
 
-    exit(result)
+    exit(supervise_leader(process, workers, world_size, args, timeline))
 
 def do_worker(args):
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
+    # The worker only reports ready once staging is done, so the leader starts mpirun after every pod has its copy.
+    if args.stage_dir:
+        stage_model_repository(args)
+
+    if args.enable_rank_health:
+        run_worker_heartbeat(args)
+
     write_output("Worker paused awaiting SIGINT or SIGTERM.")
     signal.pause()
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# server.py is copied into the container image on its own and only needs the standard library
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "multinode_helm_chart" / "containers"))
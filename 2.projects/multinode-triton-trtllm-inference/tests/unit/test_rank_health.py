@@ -0,0 +1,275 @@
+"""
+Unit tests for rank health: the local, progress and heartbeat monitors and the exits that restart the group.
+"""
+import argparse
+import io
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import server
+from server import ERROR_CODE_RANK_FAILURE, ERROR_CODE_USAGE, HeartbeatMonitor, LocalRankMonitor, ProgressMonitor
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    monkeypatch.setattr(server, "write_output", lambda message: None)
+    monkeypatch.setattr(server, "write_error", lambda message: None)
+    monkeypatch.setattr(server, "ERROR_EXIT_DELAY", 0)
+
+
+def health_args(**overrides):
+    args = dict(heartbeat_port=0, heartbeat_interval=0.01, heartbeat_timeout=5, hang_timeout=5, verbose=False)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def metrics(in_flight, iterations):
+    return {
+        "nv_inference_pending_request_count": [('model="ensemble",version="1"', 0.0)],
+        "nv_trt_llm_request_metrics": [('request_type="active"', in_flight), ('request_type="max"', 64.0)],
+        "nv_trt_llm_general_metrics": [('general_type="iteration_counter"', iterations)],
+    }
+
+
+class TestRestartGroup:
+    def test_exits_with_rank_failure(self):
+        """Test that restarting the group exits with the code reserved for rank failures."""
+        with pytest.raises(SystemExit) as exit_info:
+            server.restart_group("rank 3 exited")
+
+        assert exit_info.value.code == ERROR_CODE_RANK_FAILURE
+
+
+class TestLocalRankMonitor:
+    def test_rank_exit(self, clock, monkeypatch):
+        """Test that fewer ranks than were ever seen at once is reported straight away."""
+        ranks = {10: "R", 11: "S"}
+        monkeypatch.setattr(server, "find_rank_processes", lambda: dict(ranks))
+        monitor = LocalRankMonitor(timeout=5)
+
+        assert monitor.check() is None
+        del ranks[11]
+        assert monitor.check() == "1 of 2 local ranks exited"
+
+    def test_stuck_rank(self, clock, monkeypatch):
+        """Test that a rank stopped or defunct for longer than the timeout is reported, and a recovery resets it."""
+        ranks = {10: "R", 11: "T"}
+        monkeypatch.setattr(server, "find_rank_processes", lambda: dict(ranks))
+        monitor = LocalRankMonitor(timeout=5)
+
+        assert monitor.check() is None
+        clock.now += 4
+        ranks[11] = "S"
+        assert monitor.check() is None
+        ranks[11] = "Z"
+        clock.now += 4
+        assert monitor.check() is None
+        clock.now += 6
+        assert monitor.check() == "rank process 11 stuck in state Z for 6.0s"
+
+
+class TestProgressMonitor:
+    def test_reads_prometheus_text(self, monkeypatch):
+        """Test that metric samples are parsed with their labels, skipping comments and unparsable values."""
+        text = (
+            b"# HELP nv_inference_exec_count Number of model executions\n"
+            b'nv_inference_exec_count{model="ensemble",version="1"} 12\n'
+            b"nv_gpu_utilization 0.5\n"
+            b"nv_broken NaN?\n"
+        )
+        monkeypatch.setattr(server.urllib.request, "urlopen", lambda url, timeout: io.BytesIO(text))
+
+        assert server.read_triton_metrics() == {
+            "nv_inference_exec_count": [('model="ensemble",version="1"', 12.0)],
+            "nv_gpu_utilization": [("", 0.5)],
+        }
+
+    def test_sums_only_matching_labels(self):
+        """Test that metrics with a label filter only count the samples carrying that label."""
+        assert server.sum_metrics(metrics(3.0, 7.0), server.IN_FLIGHT_METRICS) == 3.0
+        assert server.sum_metrics(metrics(3.0, 7.0), server.PROGRESS_METRICS) == 7.0
+
+    def test_stall_with_requests_in_flight(self, clock, monkeypatch):
+        """Test that requests in flight without progress for longer than the timeout are reported."""
+        samples = metrics(2.0, 100.0)
+        monkeypatch.setattr(server, "read_triton_metrics", lambda: samples)
+        monitor = ProgressMonitor(timeout=5)
+
+        assert monitor.check() is None
+        clock.now += 1
+        assert monitor.check() is None
+        clock.now += 5
+        assert monitor.check() is None
+        clock.now += 1
+        assert monitor.check() == "no inference progress for 6.0s with 2 requests in flight"
+
+    def test_progress_or_idle_is_not_a_stall(self, clock, monkeypatch):
+        """Test that an advancing counter or an empty queue resets the stall, however long it lasts."""
+        samples = metrics(2.0, 100.0)
+        monkeypatch.setattr(server, "read_triton_metrics", lambda: samples)
+        monitor = ProgressMonitor(timeout=5)
+
+        for iterations in range(101, 110):
+            clock.now += 3
+            samples.update(metrics(2.0, float(iterations)))
+            assert monitor.check() is None
+
+        samples.update(metrics(0.0, 109.0))
+        for _ in range(10):
+            clock.now += 3
+            assert monitor.check() is None
+
+    def test_failed_scrape_is_ignored(self, clock, monkeypatch):
+        """Test that a metrics endpoint that cannot be reached is neither progress nor a stall."""
+        def unreachable():
+            raise server.urllib.error.URLError("connection refused")
+
+        monkeypatch.setattr(server, "read_triton_metrics", unreachable)
+
+        assert ProgressMonitor(timeout=5).check() is None
+
+
+class TestHeartbeatMonitor:
+    def send(self, monitor, message):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(5)
+            sock.sendto(json.dumps(message).encode("utf-8"), ("127.0.0.1", monitor.sock.getsockname()[1]))
+            return json.loads(sock.recv(4096))
+
+    def test_heartbeats_keep_workers_alive(self, clock):
+        """Test that each worker heartbeat is acknowledged, and a worker that goes quiet is reported."""
+        monitor = HeartbeatMonitor(["worker-1", "worker-2"], health_args())
+
+        clock.now += 4
+        assert self.send(monitor, {"pod": "worker-1", "seq": 0}) == {"type": "ack"}
+        assert self.send(monitor, {"pod": "worker-2", "seq": 0}) == {"type": "ack"}
+        clock.now += 4
+        assert monitor.check() is None
+        assert self.send(monitor, {"pod": "worker-1", "seq": 1}) == {"type": "ack"}
+        clock.now += 2
+        assert monitor.check() == "no heartbeat from worker-2 for 6.0s"
+
+    def test_worker_reported_failure(self, clock):
+        """Test that a failure a worker reports in its heartbeat is returned by the next check."""
+        monitor = HeartbeatMonitor(["worker-1"], health_args())
+
+        self.send(monitor, {"pod": "worker-1", "seq": 3, "failure": "1 of 8 local ranks exited"})
+
+        assert monitor.check() == "worker-1 reported 1 of 8 local ranks exited"
+
+
+class TestSuperviseLeader:
+    def timeline(self):
+        return server.StartupTimeline(argparse.Namespace(timeline_file=None))
+
+    def leader_args(self, **overrides):
+        args = health_args(enable_nsys=False, nsys_duration=0, enable_rank_health=True)
+        vars(args).update(overrides)
+        return args
+
+    def test_mpirun_failure_restarts_group(self, monkeypatch):
+        """Test that with rank health on, mpirun exiting with an error restarts the whole group."""
+        monkeypatch.setattr(server, "find_rank_processes", lambda: {})
+        monkeypatch.setattr(server, "is_triton_ready", lambda: False)
+        process = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+
+        with pytest.raises(SystemExit) as exit_info:
+            server.supervise_leader(process, [socket.gethostname()], 1, self.leader_args(), self.timeline())
+
+        assert exit_info.value.code == ERROR_CODE_RANK_FAILURE
+
+    def test_mpirun_failure_without_rank_health(self, monkeypatch):
+        """Test that without rank health, the leader exits with mpirun's own code."""
+        monkeypatch.setattr(server, "is_triton_ready", lambda: False)
+        process = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+
+        with pytest.raises(SystemExit) as exit_info:
+            server.supervise_leader(process, [], 1, self.leader_args(enable_rank_health=False), self.timeline())
+
+        assert exit_info.value.code == 3
+
+    def test_silent_worker_stops_mpirun(self, monkeypatch):
+        """Test that a worker missing its heartbeats stops mpirun and restarts the group."""
+        monkeypatch.setattr(server, "find_rank_processes", lambda: {})
+        monkeypatch.setattr(server, "is_triton_ready", lambda: False)
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+        try:
+            with pytest.raises(SystemExit) as exit_info:
+                server.supervise_leader(process, ["silent-worker"], 2, self.leader_args(heartbeat_timeout=0.05), self.timeline())
+        finally:
+            server.stop_command(process)
+
+        assert exit_info.value.code == ERROR_CODE_RANK_FAILURE
+        assert process.returncode is not None
+
+
+class TestWorkerHeartbeat:
+    def leader(self, monkeypatch, reply):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(5)
+        monkeypatch.setenv("LWS_LEADER_ADDRESS", "127.0.0.1")
+        received = []
+
+        def serve():
+            data, address = sock.recvfrom(4096)
+            received.append(json.loads(data))
+            sock.sendto(json.dumps(reply).encode("utf-8"), address)
+
+        threading.Thread(target=serve, daemon=True).start()
+        return sock, received
+
+    def test_requires_leader_address(self, monkeypatch):
+        """Test that a worker outside a LeaderWorkerSet exits with a usage error."""
+        monkeypatch.delenv("LWS_LEADER_ADDRESS", raising=False)
+
+        with pytest.raises(SystemExit) as exit_info:
+            server.run_worker_heartbeat(health_args())
+
+        assert exit_info.value.code == ERROR_CODE_USAGE
+
+    def test_leader_requested_restart(self, monkeypatch):
+        """Test that a restart sent by the leader restarts the group from the worker too."""
+        monkeypatch.setattr(server, "find_rank_processes", lambda: {10: "R"})
+        sock, received = self.leader(monkeypatch, {"type": "restart"})
+
+        with sock, pytest.raises(SystemExit) as exit_info:
+            server.run_worker_heartbeat(health_args(heartbeat_port=sock.getsockname()[1], heartbeat_interval=5))
+
+        assert exit_info.value.code == ERROR_CODE_RANK_FAILURE
+        assert received[0]["pod"] == socket.gethostname()
+        assert received[0]["ranks"] == 1
+        assert received[0]["failure"] is None
+
+    def test_local_failure_is_reported_then_restarts(self, monkeypatch):
+        """Test that a local rank failure is sent to the leader before the worker restarts the group."""
+        ranks = [{10: "R", 11: "R"}, {10: "R"}]
+        monkeypatch.setattr(server, "find_rank_processes", lambda: ranks.pop(0) if len(ranks) > 1 else ranks[0])
+        sock, received = self.leader(monkeypatch, {"type": "ack"})
+
+        with sock, pytest.raises(SystemExit) as exit_info:
+            server.run_worker_heartbeat(health_args(heartbeat_port=sock.getsockname()[1], heartbeat_interval=0.2))
+
+        assert exit_info.value.code == ERROR_CODE_RANK_FAILURE
+        assert received[0]["failure"] is None
@@ -0,0 +1,137 @@
+"""
+Unit tests for staging the model repository onto local storage, on temporary directories.
+"""
+import argparse
+import json
+import os
+
+import server
+from server import find_referenced_paths, stage_file, stage_model_repository, staged_path, staged_reference
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestStagedReference:
+    def test_source_itself(self):
+        """Test that a staged source maps to its staged copy, with or without a trailing slash."""
+        assert staged_reference("/stage", ["/models/repo"], "/models/repo") == "/stage/files/models/repo"
+        assert staged_reference("/stage", ["/models/repo"], "/models/repo/") == "/stage/files/models/repo"
+
+    def test_path_inside_a_source(self):
+        """Test that a path inside any staged source maps to the same place inside its copy."""
+        sources = ["/models/repo", "/engines/llama"]
+
+        assert staged_reference("/stage", sources, "/engines/llama/rank0.engine") == "/stage/files/engines/llama/rank0.engine"
+        assert staged_reference("/stage", sources, "/models/repo/./tokenizer/../ensemble") == "/stage/files/models/repo/ensemble"
+
+    def test_unrelated_path(self):
+        """Test that a path sharing only a name prefix with a source is not staged."""
+        assert staged_reference("/stage", ["/models/repo"], "/models/repo2/config.json") is None
+        assert staged_reference("/stage", ["/models/repo"], "/models") is None
+
+    def test_through_a_symlink(self, tmp_path):
+        """Test that a path reaching a source through a symlink maps into the copy of that source."""
+        (tmp_path / "engines").mkdir()
+        (tmp_path / "latest").symlink_to(tmp_path / "engines")
+        source = str(tmp_path / "engines")
+
+        assert staged_reference("/stage", [source], str(tmp_path / "latest" / "rank0.engine")) == staged_path("/stage", os.path.join(source, "rank0.engine"))
+
+
+class TestStageFile:
+    def test_reuses_unchanged_file(self, tmp_path):
+        """Test that a file staged by an earlier run is reused while its source is unchanged."""
+        source, destination = str(tmp_path / "weights.bin"), str(tmp_path / "stage" / "weights.bin")
+        write(source, "weights")
+
+        record, action = stage_file(source, destination, None, verify=True)
+        assert action == "linked"
+        assert read(destination) == "weights"
+        assert not os.path.exists(destination + ".partial")
+
+        assert stage_file(source, destination, record, verify=True) == (record, "reused")
+
+    def test_restages_changed_file(self, tmp_path):
+        """Test that a file whose source changed since the last run is staged again."""
+        source, destination = str(tmp_path / "weights.bin"), str(tmp_path / "stage" / "weights.bin")
+        write(source, "weights")
+        record, _ = stage_file(source, destination, None, verify=False)
+
+        os.remove(source)
+        write(source, "new weights")
+
+        assert stage_file(source, destination, record, verify=False)[1] == "linked"
+        assert read(destination) == "new weights"
+
+    def test_verify_restages_corrupt_copy(self, tmp_path):
+        """Test that with verify, a copy whose checksum no longer matches the manifest is staged again."""
+        source, destination = str(tmp_path / "weights.bin"), str(tmp_path / "stage" / "weights.bin")
+        write(source, "weights")
+        record, _ = stage_file(source, destination, None, verify=True)
+
+        assert stage_file(source, destination, dict(record, sha256="0" * 64), verify=False)[1] == "reused"
+        assert stage_file(source, destination, dict(record, sha256="0" * 64), verify=True)[1] == "linked"
+
+
+class TestStageModelRepository:
+    def make_repo(self, tmp_path):
+        repo, engines = tmp_path / "models" / "repo", tmp_path / "engines"
+        write(str(engines / "rank0.engine"), "engine")
+        write(str(engines / "config.json"), "{}")
+        write(str(repo / "tensorrt_llm" / "config.pbtxt"), (
+            f'parameters: {{ key: "gpt_model_path" value: {{ string_value: "{engines}" }} }}\n'
+            f'parameters: {{ key: "engine_config" value: {{ string_value: "{engines}/config.json" }} }}\n'
+            f'parameters: {{ key: "tokenizer_dir" value: {{ string_value: "{repo}/tokenizer" }} }}\n'
+        ))
+        write(str(repo / "tokenizer" / "tokenizer.json"), "{}")
+        return repo, engines
+
+    def test_referenced_paths_outside_the_repository(self, tmp_path):
+        """Test that only existing paths outside the repository are found, directories before their files."""
+        repo, engines = self.make_repo(tmp_path)
+
+        assert find_referenced_paths(str(repo)) == [str(engines), str(engines / "config.json")]
+
+    def test_configs_point_at_staged_copies(self, tmp_path, monkeypatch):
+        """Test that the repository and the engines it references are staged, and configs rewritten to the copies."""
+        monkeypatch.setattr(server, "write_output", lambda message: None)
+        repo, engines = self.make_repo(tmp_path)
+        stage_dir = str(tmp_path / "stage")
+        args = argparse.Namespace(stage_dir=stage_dir, triton_model_repo_dir=f"{repo}/", stage_workers=2, stage_verify=False)
+
+        staged_repo = stage_model_repository(args)
+
+        assert staged_repo == staged_path(stage_dir, str(repo))
+        assert read(os.path.join(staged_repo, "tensorrt_llm", "config.pbtxt")) == (
+            f'parameters: {{ key: "gpt_model_path" value: {{ string_value: "{staged_path(stage_dir, str(engines))}" }} }}\n'
+            f'parameters: {{ key: "engine_config" value: {{ string_value: "{staged_path(stage_dir, str(engines / "config.json"))}" }} }}\n'
+            f'parameters: {{ key: "tokenizer_dir" value: {{ string_value: "{staged_repo}/tokenizer" }} }}\n'
+        )
+        assert read(staged_path(stage_dir, str(engines / "rank0.engine"))) == "engine"
+        # The source config is untouched even though the staged one started as a hard link to it
+        assert str(engines) in read(str(repo / "tensorrt_llm" / "config.pbtxt"))
+        assert read(os.path.join(stage_dir, server.STAGE_READY_MARKER)) == staged_repo
+
+    def test_second_run_reuses_files(self, tmp_path, monkeypatch):
+        """Test that a second run reuses everything but the rewritten configs, which are left out of the manifest."""
+        messages = []
+        monkeypatch.setattr(server, "write_output", messages.append)
+        repo, _ = self.make_repo(tmp_path)
+        stage_dir = str(tmp_path / "stage")
+        args = argparse.Namespace(stage_dir=stage_dir, triton_model_repo_dir=str(repo), stage_workers=2, stage_verify=True)
+
+        stage_model_repository(args)
+        with open(os.path.join(stage_dir, server.STAGE_MANIFEST)) as f:
+            assert str(repo / "tensorrt_llm" / "config.pbtxt") not in json.load(f)
+        stage_model_repository(args)
+
+        assert "hard-linked 1, reused 3 from the previous run." in messages[-1]
@@ -0,0 +1,84 @@
+"""
+Unit tests for placing ranks by node network topology.
+"""
+import argparse
+
+import server
+from server import order_workers_by_topology, topology_distance
+
+
+def node(name, layers=(None, None, None), placement_group=None, zone=None, efa=0):
+    return {
+        "node": name,
+        "network_layers": list(layers),
+        "placement_group": placement_group,
+        "zone": zone,
+        "efa": efa,
+    }
+
+
+class TestTopologyDistance:
+    def test_same_node(self):
+        """Test that two pods on one node are at distance 0, whatever else they share."""
+        assert topology_distance(node("a"), node("a")) == 0
+
+    def test_deepest_shared_layer_wins(self):
+        """Test that sharing a deeper network layer is closer than sharing only the spine."""
+        a = node("a", ("spine1", "agg1", "sw1"))
+
+        assert topology_distance(a, node("b", ("spine1", "agg1", "sw1"))) == 1
+        assert topology_distance(a, node("b", ("spine1", "agg1", "sw2"))) == 2
+        assert topology_distance(a, node("b", ("spine1", "agg2", "sw2"))) == 3
+
+    def test_unlabelled_layers_are_not_shared(self):
+        """Test that layers missing on both nodes do not count as the same switch."""
+        assert topology_distance(node("a", zone="z1"), node("b", zone="z1")) == 5
+
+    def test_falls_back_to_placement_group_then_zone(self):
+        """Test that without a shared layer the placement group, then the zone, decides the distance."""
+        a = node("a", ("spine1", None, None), placement_group="pg1", zone="z1")
+
+        assert topology_distance(a, node("b", ("spine2", None, None), placement_group="pg1", zone="z1")) == 4
+        assert topology_distance(a, node("b", ("spine2", None, None), placement_group="pg2", zone="z1")) == 5
+        assert topology_distance(a, node("b", ("spine2", None, None), placement_group="pg2", zone="z2")) == 6
+
+    def test_is_symmetric(self):
+        """Test that the distance does not depend on the order of the nodes."""
+        a = node("a", ("spine1", "agg1", "sw1"), zone="z1")
+        b = node("b", ("spine1", "agg2", "sw3"), zone="z1")
+
+        assert topology_distance(a, b) == topology_distance(b, a)
+
+
+class TestOrderWorkers:
+    def test_name_order_outside_kubernetes(self, monkeypatch):
+        """Test that the leader comes first and the rest keep their order when the API is not reachable."""
+        monkeypatch.delenv("KUBERNETES_SERVICE_HOST", raising=False)
+        monkeypatch.setattr(server.socket, "gethostname", lambda: "pod-1")
+
+        assert order_workers_by_topology(["pod-0", "pod-1", "pod-2"], argparse.Namespace()) == (["pod-1", "pod-0", "pod-2"], None)
+
+    def test_chains_nearest_neighbours(self, monkeypatch):
+        """Test that each pod is followed by the nearest remaining one, and the EFA count is the group minimum."""
+        topology = {
+            "pod-0": node("n0", ("s1", "a1", "sw1"), efa=32),
+            "pod-1": node("n1", ("s1", "a2", "sw3"), efa=32),
+            "pod-2": node("n2", ("s1", "a2", "sw3"), efa=16),
+            "pod-3": node("n3", ("s1", "a1", "sw1"), efa=32),
+        }
+        monkeypatch.setenv("KUBERNETES_SERVICE_HOST", "10.0.0.1")
+        monkeypatch.setattr(server.socket, "gethostname", lambda: "pod-0")
+        monkeypatch.setattr(server, "get_pod_topology", lambda pod, args: topology[pod])
+
+        assert order_workers_by_topology(list(topology), argparse.Namespace()) == (["pod-0", "pod-3", "pod-1", "pod-2"], 16)
+
+    def test_name_order_when_topology_unreadable(self, monkeypatch):
+        """Test that a failed API call keeps the pods in name order instead of failing the launch."""
+        def unreachable(pod, args):
+            raise OSError("connection refused")
+
+        monkeypatch.setenv("KUBERNETES_SERVICE_HOST", "10.0.0.1")
+        monkeypatch.setattr(server.socket, "gethostname", lambda: "pod-0")
+        monkeypatch.setattr(server, "get_pod_topology", unreachable)
+
+        assert order_workers_by_topology(["pod-0", "pod-1"], argparse.Namespace()) == (["pod-0", "pod-1"], None)
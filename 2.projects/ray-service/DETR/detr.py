@@ -1,50 +1,135 @@
-#from transformers import DetrImageProcessor, DetrForObjectDetection
+import asyncio
+import itertools
+import json
+import os
+from io import BytesIO
+from typing import Iterator, List, Tuple
 import torch
 from PIL import Image
-import requests
-import tempfile
+from starlette.responses import JSONResponse, StreamingResponse
 
 from ray import serve
 # Load model directly
 from transformers import AutoImageProcessor, AutoModelForObjectDetection
 
 
+# Concurrent requests are run through the model together, up to this many images
+MAX_BATCH_SIZE = int(os.environ.get("DETR_MAX_BATCH_SIZE", "8"))
+# How long the first request of a batch waits for others to join it
+BATCH_WAIT_TIMEOUT_S = float(os.environ.get("DETR_BATCH_WAIT_TIMEOUT_S", "0.05"))
+# Detections scoring below this are dropped
+THRESHOLD = float(os.environ.get("DETR_THRESHOLD", "0.9"))
+# Images per model call on the /batch endpoint; size it to what fits on the GPU
+MICRO_BATCH_SIZE = int(os.environ.get("DETR_MICRO_BATCH_SIZE", "16"))
+# Frames per second sampled from uploaded videos when the request does not set fps
+DEFAULT_VIDEO_FPS = float(os.environ.get("DETR_VIDEO_FPS", "1"))
+
+
+def decode_image(data: bytes) -> Image.Image:
+    return Image.open(BytesIO(data)).convert("RGB")
+
+
+def decode_uploads(uploads: List[Tuple[str, bytes]]) -> Iterator[Tuple[dict, Image.Image]]:
+    for index, (filename, data) in enumerate(uploads):
+        yield {"index": index, "filename": filename}, decode_image(data)
+
+
+def sample_video_frames(data: bytes, fps: float) -> Iterator[Tuple[dict, Image.Image]]:
+    import av
+
+    with av.open(BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        next_time = 0.0
+        for index, frame in enumerate(container.decode(stream)):
+            if frame.time is None or frame.time < next_time:
+                continue
+            while next_time <= frame.time:
+                next_time += 1.0 / fps
+            yield {"frame": index, "time": round(frame.time, 3)}, frame.to_image().convert("RGB")
+
 
 @serve.deployment()
 class ObjectDetection:
     def __init__(self):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.processor = AutoImageProcessor.from_pretrained("facebook/detr-resnet-50")
-        self.model = AutoModelForObjectDetection.from_pretrained("facebook/detr-resnet-50")
+        self.model = AutoModelForObjectDetection.from_pretrained("facebook/detr-resnet-50").to(self.device).eval()
 
 
     # Users can send HTTP requests with an image. The detection will return a list of detected objects and their location
-    # 
-    # Sample output: ["Detected umbrella with confidence 0.997 at location [1098.83, 379.95, 1541.51, 573.64]","Detected person with confidence 1.0 at location [1184.87, 528.97, 1448.08, 1167.76]"]
-    
+    #
+    # Sample output: [{"label": "umbrella", "score": 0.997, "box": [1098.83, 379.95, 1541.51, 573.64]}, {"label": "person", "score": 1.0, "box": [1184.87, 528.97, 1448.08, 1167.76]}]
+    #
+    # POST /batch takes many "images" in one multipart upload, or a "video" sampled at "fps" frames per second, and
+    # streams one NDJSON line per image or frame as each micro-batch finishes:
+    # {"index": 0, "filename": "a.jpg", "detections": [...]} or {"frame": 30, "time": 1.0, "detections": [...]}
+
     async def __call__(self, http_request):
+        if http_request.url.path.rstrip("/").endswith("/batch"):
+            return await self.batch(http_request)
+
         request = await http_request.form()
         image_file = await request["image"].read()
 
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-            temp_file.write(image_file)
-            temp_file.close()
-            temp_file_path = temp_file.name
-            image = Image.open(temp_file_path)
-            #img = image.load_img(temp_file_path, target_size=(224, 224))
+        image = await asyncio.to_thread(decode_image, image_file)
+        return await self.detect(image)
+
+    async def batch(self, http_request):
+        request = await http_request.form()
+
+        if "video" in request:
+            try:
+                fps = float(request.get("fps", DEFAULT_VIDEO_FPS))
+            except ValueError:
+                fps = 0
+            if fps <= 0:
+                return JSONResponse({"error": "fps must be a positive number"}, status_code=400)
+            items = sample_video_frames(await request["video"].read(), fps)
+        else:
+            uploads = [(upload.filename, await upload.read()) for upload in request.getlist("images")]
+            if not uploads:
+                return JSONResponse({"error": "upload one or more 'images' or a 'video'"}, status_code=400)
+            items = decode_uploads(uploads)
+
+        return StreamingResponse(self.stream_detections(items), media_type="application/x-ndjson")
+
+    async def stream_detections(self, items: Iterator[Tuple[dict, Image.Image]]):
+        take = lambda: list(itertools.islice(items, MICRO_BATCH_SIZE))
+        while True:
+            # Decoding and the model both run off the event loop
+            batch = await asyncio.to_thread(take)
+            if not batch:
+                break
+            results = await asyncio.to_thread(self.run_model, [image for _, image in batch])
+            for (meta, _), detections in zip(batch, results):
+                yield json.dumps(dict(meta, detections=detections)) + "\n"
 
-        inputs = self.processor(images=image, return_tensors="pt")
-        outputs = self.model(**inputs)
+    @serve.batch(max_batch_size=MAX_BATCH_SIZE, batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_S)
+    async def detect(self, images: List[Image.Image]):
+        # Off the event loop, so the next batch can gather while this one runs
+        return await asyncio.to_thread(self.run_model, images)
 
-        target_sizes = torch.tensor([image.size[::-1]])
-        results = self.processor.post_process_object_detection(outputs, target_sizes=target_sizes, threshold=0.9)[0]
-        
-        result_list = []
+    def run_model(self, images: List[Image.Image]):
+        # The processor pads the batch to a common size and returns a pixel mask for the padding
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
 
-        for score, label, box in zip(results["scores"], results["labels"], results["boxes"]):
-            box = [round(i, 2) for i in box.tolist()]
-            result_list.append(f"Detected {self.model.config.id2label[label.item()]} with confidence {round(score.item(), 3)} at location {box}")
+        target_sizes = torch.tensor([image.size[::-1] for image in images])
+        results = self.processor.post_process_object_detection(outputs, target_sizes=target_sizes, threshold=THRESHOLD)
 
-        return result_list
+        return [
+            [
+                {
+                    "label": self.model.config.id2label[label.item()],
+                    "score": round(score.item(), 3),
+                    "box": [round(i, 2) for i in box.tolist()],
+                }
+                for score, label, box in zip(result["scores"], result["labels"], result["boxes"])
+            ]
+            for result in results
+        ]
 
 
 app = ObjectDetection.bind()
@@ -1,9 +1,34 @@
+import json
 import requests
 
 # TODO: Change this to your image path
 image_path = "/your/image/path"
 
+# To annotate many files in one request, list image paths here, or set a video path and the frames per second to sample
+batch_image_paths = []
+video_path = None
+video_fps = 1
+
 url = "http://127.0.0.1:8000"
-files = {"image": open(image_path, "rb")}
-response = requests.post(url, files=files)
-print(response.text)
\ No newline at end of file
+
+if video_path is not None:
+    with open(video_path, "rb") as video:
+        response = requests.post(f"{url}/batch", files={"video": video}, data={"fps": video_fps}, stream=True)
+elif batch_image_paths:
+    files = [("images", open(path, "rb")) for path in batch_image_paths]
+    response = requests.post(f"{url}/batch", files=files, stream=True)
+else:
+    files = {"image": open(image_path, "rb")}
+    response = requests.post(url, files=files)
+    response.raise_for_status()
+    for detection in response.json():
+        print(f"Detected {detection['label']} with confidence {detection['score']} at location {detection['box']}")
+    raise SystemExit
+
+# The batch endpoint streams one JSON line per image or frame as each micro-batch finishes
+response.raise_for_status()
+for line in response.iter_lines():
+    if line:
+        result = json.loads(line)
+        source = result.get("filename", f"frame {result.get('frame')} at {result.get('time')}s")
+        print(f"{source}: {', '.join(d['label'] for d in result['detections']) or 'nothing detected'}")
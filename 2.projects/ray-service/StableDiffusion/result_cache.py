@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ray.util.metrics import Counter
+
+logger = logging.getLogger("ray.serve")
+
+# Entries kept in memory by each ingress replica
+CACHE_MAX_ITEMS = int(os.environ.get("SD_CACHE_MAX_ITEMS", "256"))
+# Directory for the disk tier; point it at a shared volume to share results across ingress replicas and restarts
+CACHE_DIR = os.environ.get("SD_CACHE_DIR", "")
+CACHE_MAX_FILES = int(os.environ.get("SD_CACHE_MAX_FILES", "10000"))
+# The disk tier is pruned back to CACHE_MAX_FILES once every this many writes
+PRUNE_EVERY = 100
+
+
+class ResultCache:
+    """Content-addressed cache of encoded images, in an in-memory LRU backed by
+    an optional directory of files named after the key."""
+
+    def __init__(self, max_items: int = CACHE_MAX_ITEMS, directory: str = CACHE_DIR, max_files: int = CACHE_MAX_FILES):
+        self.max_items = max_items
+        self.directory = directory
+        self.max_files = max_files
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.hits = Counter("stable_diffusion_cache_hits", description="Cached image results served.", tag_keys=("tier",))
+        self.misses = Counter("stable_diffusion_cache_misses", description="Image requests that had to be generated.")
+
+    @staticmethod
+    def key(**fields) -> str:
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Return ``(data, tier)``, or ``(None, None)`` on a miss."""
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+        if data is not None:
+            self.hits.inc(tags={"tier": "memory"})
+            return data, "memory"
+
+        if self.directory:
+            try:
+                with open(self.path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                self.remember(key, data)
+                self.hits.inc(tags={"tier": "disk"})
+                return data, "disk"
+
+        self.misses.inc()
+        return None, None
+
+    def put(self, key: str, data: bytes):
+        self.remember(key, data)
+        if not self.directory:
+            return
+
+        try:
+            self.write(key, data)
+        except OSError as e:
+            # A full or unreachable volume only costs the disk tier, the caller still has its image
+            logger.warning(f"Could not write result {key} to the cache directory: {e}")
+
+    def write(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so other replicas never read a partial file
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, path)
+        except OSError:
+            try:
+                os.remove(partial)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def remember(self, key: str, data: bytes):
+        with self.lock:
+            self.items[key] = data
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def prune(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    files.append((os.stat(path).st_atime, path))
+                except FileNotFoundError:
+                    continue
+        files.sort()
+        for _, path in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
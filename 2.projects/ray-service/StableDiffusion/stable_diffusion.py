@@ -1,11 +1,60 @@
-
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import time
+from contextlib import contextmanager
 from io import BytesIO
-from fastapi import FastAPI
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import Response
+from PIL import Image
 import torch
 
 from ray import serve
 from ray.serve.handle import DeploymentHandle
+from ray.util.metrics import Gauge
+
+from result_cache import ResultCache
+
+logger = logging.getLogger("ray.serve")
+
+
+# Concurrent requests are grouped into one pipeline call of up to this many prompts
+MAX_BATCH_SIZE = int(os.environ.get("SD_MAX_BATCH_SIZE", "4"))
+# How long the first request of a batch waits for others to join it
+BATCH_WAIT_TIMEOUT_S = float(os.environ.get("SD_BATCH_WAIT_TIMEOUT_S", "0.1"))
+# Set to 1 to run without a GPU or model download, e.g. to exercise batching locally
+USE_FAKE_PIPELINE = os.environ.get("SD_FAKE_PIPELINE", "0") == "1"
+
+MODEL_ID = "stabilityai/stable-diffusion-2"
+SCHEDULER = "EulerDiscreteScheduler"
+# Weights are downloaded here once and loaded from disk afterwards; use a shared volume so every node reuses them
+WEIGHTS_DIR = os.environ.get("SD_WEIGHTS_DIR", "/home/ray/sd-weights")
+# Only the fp16 safetensors are fetched, which load memory mapped instead of unpickled
+WEIGHT_PATTERNS = ["*.json", "*.txt", "*.fp16.safetensors"]
+# Run one small generation at startup so CUDA kernels are ready before the first request
+WARMUP = os.environ.get("SD_WARMUP", "1") == "1"
+
+# format query parameter -> (PIL format, media type)
+IMAGE_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+# Used when the request has no quality: zlib level for PNG, quality for JPEG and WebP
+DEFAULT_QUALITY = {"PNG": 6, "JPEG": 90, "WEBP": 90}
+
+
+def encode_image(image: Image.Image, image_format: str, quality: int = None) -> bytes:
+    pil_format, _ = IMAGE_FORMATS[image_format]
+    quality = DEFAULT_QUALITY[pil_format] if quality is None else quality
+    options = {"compress_level": quality} if pil_format == "PNG" else {"quality": quality}
+    file_stream = BytesIO()
+    image.save(file_stream, pil_format, **options)
+    return file_stream.getvalue()
 
 
 app = FastAPI()
@@ -16,45 +65,163 @@ app = FastAPI()
 class APIIngress:
     def __init__(self, diffusion_model_handle: DeploymentHandle) -> None:
         self.handle = diffusion_model_handle
+        self.cache = ResultCache()
 
     @app.get(
         "/imagine",
-        responses={200: {"content": {"image/png": {}}}},
+        responses={200: {"content": {media_type: {} for _, media_type in IMAGE_FORMATS.values()}}},
         response_class=Response,
     )
-    async def generate(self, prompt: str, img_size: int = 512):
+    async def generate(self, prompt: str, img_size: int = 512, format: str = "png", quality: int = None, seed: int = None):
         assert len(prompt), "prompt parameter cannot be empty"
-
-        image = await self.handle.generate.remote(prompt, img_size=img_size)
-        file_stream = BytesIO()
-        image.save(file_stream, "PNG")
-        return Response(content=file_stream.getvalue(), media_type="image/png")
+        if format not in IMAGE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(IMAGE_FORMATS)}")
+        if quality is not None and not (0 <= quality <= (9 if format == "png" else 100)):
+            raise HTTPException(status_code=400, detail="quality must be 0-9 for png and 0-100 for jpeg and webp")
+
+        # Only seeded requests are reproducible, so only those are cached
+        key = None
+        cache_status = "bypass"
+        if seed is not None:
+            key = ResultCache.key(
+                model=MODEL_ID, scheduler=SCHEDULER, prompt=prompt, img_size=img_size,
+                seed=seed, format=format, quality=quality,
+            )
+            image_bytes, tier = await asyncio.to_thread(self.cache.get, key)
+            cache_status = f"hit-{tier}" if image_bytes is not None else "miss"
+
+        if key is None or image_bytes is None:
+            # The replica encodes, so only the compressed bytes cross Ray instead of the pickled bitmap
+            image_bytes = await self.handle.generate.remote(
+                prompt, img_size=img_size, format=format, quality=quality, seed=seed
+            )
+            if key is not None:
+                await asyncio.to_thread(self.cache.put, key, image_bytes)
+
+        # The image is already in memory, so it goes out in one body rather than through a chunked generator
+        return Response(content=image_bytes, media_type=IMAGE_FORMATS[format][1], headers={"X-Cache": cache_status})
+
+
+class FakePipeline:
+    """CPU stand-in for StableDiffusionPipeline: returns one solid image per prompt,
+    colored by a hash of the prompt, with the same call signature."""
+
+    def __call__(self, prompt, height: int = 512, width: int = 512, generator=None):
+        prompts = [prompt] if isinstance(prompt, str) else prompt
+        images = [
+            Image.new("RGB", (width, height), tuple(hashlib.sha256(p.encode("utf-8")).digest()[:3]))
+            for p in prompts
+        ]
+        return SimpleNamespace(images=images)
+
+
+def stage_weights(model_id: str = MODEL_ID, directory: str = WEIGHTS_DIR) -> str:
+    """Snapshot ``model_id`` into ``directory`` unless an earlier replica already did."""
+    local_dir = os.path.join(directory, model_id.replace("/", "--"))
+    complete = os.path.join(local_dir, ".complete")
+    if os.path.exists(complete):
+        return local_dir
+
+    os.makedirs(local_dir, exist_ok=True)
+    # Replicas starting together on a shared volume download once; the others wait and reuse it
+    with open(os.path.join(local_dir, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(complete):
+            from huggingface_hub import snapshot_download
+
+            snapshot_download(model_id, local_dir=local_dir, allow_patterns=WEIGHT_PATTERNS)
+            open(complete, "w").close()
+    return local_dir
 
 
 @serve.deployment(
-    ray_actor_options={"num_gpus": 1},
+    ray_actor_options={"num_gpus": 0 if USE_FAKE_PIPELINE else 1},
     autoscaling_config={"min_replicas": 0, "max_replicas": 2},
 )
 class StableDiffusionV2:
-    def __init__(self):
-        from diffusers import EulerDiscreteScheduler, StableDiffusionPipeline
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, batch_wait_timeout_s: float = BATCH_WAIT_TIMEOUT_S):
+        self.generate_batch.set_max_batch_size(max_batch_size)
+        self.generate_batch.set_batch_wait_timeout_s(batch_wait_timeout_s)
+
+        self.cold_start = {}
+        self.cold_start_gauge = Gauge(
+            "stable_diffusion_cold_start_seconds",
+            description="Time spent in each phase of the last replica start.",
+            tag_keys=("phase",),
+        )
 
-        model_id = "stabilityai/stable-diffusion-2"
+        if USE_FAKE_PIPELINE:
+            self.pipe = FakePipeline()
+            return
 
-        scheduler = EulerDiscreteScheduler.from_pretrained(
-            model_id, subfolder="scheduler"
-        )
-        self.pipe = StableDiffusionPipeline.from_pretrained(
-            model_id, scheduler=scheduler, revision="fp16", torch_dtype=torch.float16
-        )
-        self.pipe = self.pipe.to("cuda")
+        with self.phase("stage_weights"):
+            weights_dir = stage_weights()
+
+        with self.phase("load"):
+            from diffusers import EulerDiscreteScheduler, StableDiffusionPipeline
+
+            scheduler = EulerDiscreteScheduler.from_pretrained(
+                weights_dir, subfolder="scheduler"
+            )
+            self.pipe = StableDiffusionPipeline.from_pretrained(
+                weights_dir, scheduler=scheduler, variant="fp16", use_safetensors=True, torch_dtype=torch.float16
+            )
+
+        with self.phase("to_device"):
+            self.pipe = self.pipe.to("cuda")
+
+        if WARMUP:
+            with self.phase("warmup"):
+                self.run_pipeline(["warmup"], 256, [0], num_inference_steps=1)
+
+        logger.info(f"StableDiffusionV2 cold start: {self.cold_start}")
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.cold_start[name] = round(time.perf_counter() - start, 3)
+        self.cold_start_gauge.set(self.cold_start[name], tags={"phase": name})
 
-    def generate(self, prompt: str, img_size: int = 512):
+    async def generate(self, prompt: str, img_size: int = 512, format: str = "png", quality: int = None, seed: int = None):
         assert len(prompt), "prompt parameter cannot be empty"
 
+        image = await self.generate_batch((prompt, img_size, seed))
+        return await asyncio.to_thread(encode_image, image, format, quality)
+
+    @serve.batch(max_batch_size=MAX_BATCH_SIZE, batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_S)
+    async def generate_batch(self, requests: List[Tuple[str, int, Optional[int]]]):
+        # One pipeline call per image size, since a batch must share its latent shape
+        indices_by_size = {}
+        for index, (_, img_size, _) in enumerate(requests):
+            indices_by_size.setdefault(img_size, []).append(index)
+
+        images = [None] * len(requests)
+        for img_size, indices in indices_by_size.items():
+            prompts = [requests[index][0] for index in indices]
+            seeds = [requests[index][2] for index in indices]
+            # Run off the event loop so the next batch can fill up while this one is on the GPU
+            results = await asyncio.to_thread(self.run_pipeline, prompts, img_size, seeds)
+            for index, image in zip(indices, results):
+                images[index] = image
+        return images
+
+    def run_pipeline(self, prompts: List[str], img_size: int, seeds: List[Optional[int]], **kwargs):
+        if USE_FAKE_PIPELINE:
+            return self.pipe(prompts, height=img_size, width=img_size).images
+
+        # One generator per prompt, so the starting noise of a seeded prompt does not depend on the rest of the batch
+        generators = []
+        for seed in seeds:
+            generator = torch.Generator("cuda")
+            if seed is None:
+                # Seeds only this generator from OS entropy; torch.seed() would reseed the replica's global RNG
+                generator.seed()
+            else:
+                generator.manual_seed(seed)
+            generators.append(generator)
         with torch.autocast("cuda"):
-            image = self.pipe(prompt, height=img_size, width=img_size).images[0]
-            return image
+            return self.pipe(prompts, height=img_size, width=img_size, generator=generators, **kwargs).images
 
 
 entrypoint = APIIngress.bind(StableDiffusionV2.bind())
@@ -2,9 +2,18 @@ import requests
 
 # TODO: Set your prompt here
 prompt = "baby dancing"
+# png, jpeg or webp
+image_format = "png"
+# Set a seed to get the same image back for the same prompt; seeded results are cached
+seed = None
 input = "%20".join(prompt.split(" "))
-resp = requests.get(f"http://127.0.0.1:8000/imagine?prompt={input}")
+url = f"http://127.0.0.1:8000/imagine?prompt={input}&format={image_format}"
+if seed is not None:
+    url += f"&seed={seed}"
+resp = requests.get(url, stream=True)
+print(f"Cache: {resp.headers.get('X-Cache')}")
 
-print("Write the response to `output.png`.")
-with open("output.png", "wb") as f:
-    f.write(resp.content)
+print(f"Write the response to `output.{image_format}`.")
+with open(f"output.{image_format}", "wb") as f:
+    for chunk in resp.iter_content(chunk_size=64 * 1024):
+        f.write(chunk)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Ray Serve imports the deployment from the root of its working_dir, so the tests do the same
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "StableDiffusion"))
@@ -0,0 +1,96 @@
+"""
+Unit tests for the two-tier result cache, on a temporary directory.
+"""
+import os
+import pytest
+
+pytest.importorskip("ray")
+
+import result_cache
+from result_cache import ResultCache
+
+
+def files_in(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+
+
+class TestMemoryTier:
+    def test_hit_after_put(self):
+        """Test that a result is served from memory once it has been put."""
+        cache = ResultCache(max_items=4, directory="")
+        key = ResultCache.key(prompt="a cat", seed=1)
+
+        assert cache.get(key) == (None, None)
+        cache.put(key, b"image")
+        assert cache.get(key) == (b"image", "memory")
+
+    def test_key_depends_on_every_field(self):
+        """Test that keys are stable across field order and differ when any field does."""
+        assert ResultCache.key(prompt="a cat", seed=1) == ResultCache.key(seed=1, prompt="a cat")
+        assert ResultCache.key(prompt="a cat", seed=1) != ResultCache.key(prompt="a cat", seed=2)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that a get refreshes an entry, so the entry evicted is the least recently used one."""
+        cache = ResultCache(max_items=2, directory="")
+        cache.put("a", b"a")
+        cache.put("b", b"b")
+        cache.get("a")
+        cache.put("c", b"c")
+
+        assert cache.get("b") == (None, None)
+        assert cache.get("a") == (b"a", "memory")
+        assert cache.get("c") == (b"c", "memory")
+
+
+class TestDiskTier:
+    def test_hit_from_another_replica(self, tmp_path):
+        """Test that a result written by one replica is read from disk by another, then kept in its memory."""
+        ResultCache(directory=str(tmp_path)).put("ab12", b"image")
+        cache = ResultCache(directory=str(tmp_path))
+
+        assert cache.get("ab12") == (b"image", "disk")
+        assert cache.get("ab12") == (b"image", "memory")
+
+    def test_write_leaves_only_the_final_file(self, tmp_path):
+        """Test that the result is written under its key, with no partial file left behind."""
+        cache = ResultCache(directory=str(tmp_path))
+        cache.put("ab12", b"image")
+
+        assert files_in(tmp_path) == [cache.path("ab12")]
+        with open(cache.path("ab12"), "rb") as f:
+            assert f.read() == b"image"
+
+    def test_failed_write_keeps_the_result(self, tmp_path, monkeypatch):
+        """Test that a failed write is not raised, removes its partial file and still caches in memory."""
+        cache = ResultCache(directory=str(tmp_path))
+
+        def full(src, dst):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(result_cache.os, "replace", full)
+        cache.put("ab12", b"image")
+
+        assert files_in(tmp_path) == []
+        assert cache.get("ab12") == (b"image", "memory")
+
+    def test_prune_keeps_most_recently_read(self, tmp_path):
+        """Test that prune removes the least recently accessed files down to max_files."""
+        cache = ResultCache(directory=str(tmp_path), max_files=3)
+        keys = [f"{i:02d}key" for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.put(key, key.encode())
+            os.utime(cache.path(key), (1000 + i, 1000 + i))
+
+        cache.prune()
+
+        assert files_in(tmp_path) == sorted(cache.path(key) for key in keys[2:])
+
+    def test_pruned_every_few_writes(self, tmp_path, monkeypatch):
+        """Test that puts prune the directory once every PRUNE_EVERY writes."""
+        monkeypatch.setattr(result_cache, "PRUNE_EVERY", 2)
+        cache = ResultCache(directory=str(tmp_path), max_files=1)
+
+        cache.put("a1", b"a")
+        assert len(files_in(tmp_path)) == 1
+        cache.put("b1", b"b")
+        assert len(files_in(tmp_path)) == 1
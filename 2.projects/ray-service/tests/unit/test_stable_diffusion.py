@@ -0,0 +1,88 @@
+"""
+Unit tests for Stable Diffusion request batching, run on the CPU FakePipeline.
+"""
+import asyncio
+import hashlib
+import pytest
+
+pytest.importorskip("ray.serve")
+pytest.importorskip("torch")
+pytest.importorskip("PIL")
+
+import stable_diffusion
+from stable_diffusion import FakePipeline, StableDiffusionV2
+
+
+def prompt_color(prompt):
+    return tuple(hashlib.sha256(prompt.encode("utf-8")).digest()[:3])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A replica on the FakePipeline whose pipeline calls are recorded, built without the GPU start-up in __init__."""
+    monkeypatch.setattr(stable_diffusion, "USE_FAKE_PIPELINE", True)
+    model = object.__new__(StableDiffusionV2.func_or_class)
+    model.pipe = FakePipeline()
+    model.calls = []
+    run_pipeline = model.run_pipeline
+
+    def record(prompts, img_size, seeds, **kwargs):
+        model.calls.append((prompts, img_size, seeds))
+        return run_pipeline(prompts, img_size, seeds, **kwargs)
+
+    model.run_pipeline = record
+    return model
+
+
+def generate_batch(model, requests):
+    # The undecorated method, called with one batch as @serve.batch would
+    return asyncio.run(StableDiffusionV2.func_or_class.generate_batch.__wrapped__(model, requests))
+
+
+class TestFakePipeline:
+    """Test cases for FakePipeline class."""
+
+    def test_one_image_per_prompt(self):
+        """Test that every prompt gets an image of the requested size, colored by the prompt."""
+        images = FakePipeline()(["a cat", "a dog"], height=256, width=128).images
+
+        assert [image.size for image in images] == [(128, 256), (128, 256)]
+        assert images[0].getpixel((0, 0)) == prompt_color("a cat")
+        assert images[1].getpixel((0, 0)) == prompt_color("a dog")
+
+    def test_single_prompt(self):
+        """Test that a single prompt string is accepted like the real pipeline."""
+        images = FakePipeline()("a cat").images
+
+        assert len(images) == 1
+        assert images[0].size == (512, 512)
+
+
+class TestGenerateBatch:
+    """Test cases for StableDiffusionV2.generate_batch."""
+
+    def test_grouped_by_img_size(self, model):
+        """Test that one pipeline call is made per image size, keeping each request's seed."""
+        requests = [("a", 512, 1), ("b", 256, None), ("c", 512, 2), ("d", 256, 3)]
+
+        generate_batch(model, requests)
+
+        assert sorted(model.calls, key=lambda call: call[1]) == [
+            (["b", "d"], 256, [None, 3]),
+            (["a", "c"], 512, [1, 2]),
+        ]
+
+    def test_results_in_request_order(self, model):
+        """Test that each request gets its own image back, whatever group it was generated in."""
+        requests = [("a", 512, 1), ("b", 256, None), ("c", 512, 2), ("d", 256, 3)]
+
+        images = generate_batch(model, requests)
+
+        assert [image.size for image in images] == [(512, 512), (256, 256), (512, 512), (256, 256)]
+        assert [image.getpixel((0, 0)) for image in images] == [prompt_color(p) for p, _, _ in requests]
+
+    def test_single_size_is_one_call(self, model):
+        """Test that a batch of one image size goes through the pipeline once."""
+        generate_batch(model, [("a", 512, None), ("b", 512, None)])
+
+        assert model.calls == [(["a", "b"], 512, [None, None])]
@@ -1,63 +1,195 @@
-from flask import Flask, render_template, request, session
+from flask import Flask, Response, jsonify, render_template, request, session, stream_with_context
 import requests
+from requests.adapters import HTTPAdapter
+import json
 import os
 import time
-import markdown2
+import uuid
+from history import create_history_store, render_markdown
+from endpoints import create_endpoint_pool
+from metrics import MetricsPoller
+from stats import RequestTimer, count_output_tokens, create_request_stats
 
-SECRET_KEY = os.urandom(24)
+# Without SECRET_KEY the key is random per process, so cookies do not survive a restart and
+# gunicorn_config.py falls back to a single worker; set it to run several
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(24)
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', '10'))
+
+TRITON_URL = os.environ.get('TRITON_URL', 'http://k8s-default-trtllmin-2449f615fc-1027553759.us-east-2.elb.amazonaws.com')
+TRITON_MODEL = os.environ.get('TRITON_MODEL', 'ensemble')
+TRITON_TIMEOUT = float(os.environ.get('TRITON_TIMEOUT', '300'))
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 
+# One pooled client per worker process so connections to Triton are kept alive
+# and reused across requests instead of being opened for every call.
+adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.environ.get('TRITON_POOL_SIZE', '100')))
+http = requests.Session()
+http.mount('http://', adapter)
+http.mount('https://', adapter)
+
+# Requests are balanced client side across every Triton replica in TRITON_ENDPOINTS,
+# or behind TRITON_SERVICE_DNS, falling back to the single TRITON_URL
+triton_pool = create_endpoint_pool(TRITON_URL)
+
+# Triton metrics are scraped in the background and served from the last snapshot
+metrics = MetricsPoller(triton_pool.urls, http)
+
+# Prompt/response history lives server side; the session cookie only carries an id
+history_store = create_history_store()
+
+# Rolling window of per-request timings measured from the streamed chunks, shared by
+# all workers when a database is configured
+request_stats = create_request_stats()
+
+def session_id():
+    if 'sid' not in session:
+        session['sid'] = uuid.uuid4().hex
+    return session['sid']
+
+def render_index(**context):
+    history, total = history_store.page(session_id(), 0, HISTORY_PAGE_SIZE)
+    return render_template('index.html', history=history, history_total=total, **context)
+
+def build_payload(form):
+    return {
+        "text_input": form['prompt'],
+        "max_tokens": int(form['max-tokens']),
+        "bad_words": ",".join(form.getlist('bad-words')),
+        "stop_words": ",".join(form.getlist('stop-words')),
+        # One log-prob per generated token, so token counts come from the server rather than from chunks
+        "return_log_probs": True
+    }
+
 @app.route('/', methods=['GET', 'POST'])
 
 def index():
     if request.method == 'POST':
         try:
-            prompt = request.form['prompt']    
-            max_tokens = int(request.form['max-tokens'])
-            bad_words = request.form.getlist('bad-words')
-            stop_words = request.form.getlist('stop-words')       
+            payload = build_payload(request.form)
+            prompt = payload['text_input']
 
             # Capture the start time
             start_time = time.time()
 
-            response = requests.post('http://k8s-default-trtllmin-2449f615fc-1027553759.us-east-2.elb.amazonaws.com/v2/models/ensemble/generate', 
-                                    json={
-                                        "text_input": prompt,
-                                        "max_tokens": max_tokens,
-                                        "bad_words": ",".join(bad_words),
-                                        "stop_words": ",".join(stop_words)     
-                                        }
-                                    )
-            response.raise_for_status()
-            result=markdown2.markdown(response.json()['text_output'])
-            total_tokens = len(response.json()['output_log_probs'])
+            with triton_pool.lease() as endpoint:
+                response = http.post(f'{endpoint.url}/v2/models/{TRITON_MODEL}/generate', json=payload, timeout=TRITON_TIMEOUT)
+                response.raise_for_status()
+                # Counted from the log-probs requested in the payload; N/A if the model does not return them
+                total_tokens = count_output_tokens(response.json()) or 'N/A'
+                if total_tokens != 'N/A':
+                    # Time per output token, so long answers do not make a replica look slow; it is only
+                    # compared with other replicas' per-token times, not with streamed time to first token
+                    triton_pool.observe_latency(endpoint, response.elapsed.total_seconds() / total_tokens, kind='per_token')
+            text_output = response.json()['text_output']
+            result = render_markdown(text_output)
 
             # Calculate the latency
             latency = time.time() - start_time
-            tokens_per_second = total_tokens / latency
+            tokens_per_second = f"{total_tokens / latency:.2f}" if total_tokens != 'N/A' else 'N/A'
+
+            # Token count comes from the cached /metrics snapshot
+            token_count = get_token_count()
 
-            # Fetch the token count from the /metrics endpoint
-            metrics_response = requests.get('http://k8s-default-trtllmin-2449f615fc-1027553759.us-east-2.elb.amazonaws.com/metrics')
-            metrics_response.raise_for_status()
-            token_count = parse_token_count(metrics_response.text)
+            history_store.append(session_id(), {'prompt': prompt, 'response': text_output, 'latency': f"{latency:.2f} seconds", "token_count": token_count, "total_tokens": total_tokens, "tokens_per_second": tokens_per_second})
 
-            # Storing prompt + result from session
-            if 'history' not in session:
-                session['history'] = []
-            session['history'].insert(0, {'prompt': prompt, 'result': result, 'latency': f"{latency:.2f} seconds", "token_count": token_count, "total_tokens": total_tokens, "tokens_per_second": f"{tokens_per_second:.2f}"})    
+            return render_index(prompt=prompt, result=result)
+        except (requests.exceptions.RequestException, LookupError) as e:
+            return render_index(error=str(e))
+    return render_index()
 
-            return render_template('index.html', prompt=prompt, result=result, history=session['history'])
-        except requests.exceptions.RequestException as e:
-            return render_template('index.html', error=str(e), history=session.get('history', []))
-    return render_template('index.html', history=session.get('history', []))
+@app.route('/history', methods=['GET'])
+def history_page():
+    offset = request.args.get('offset', 0, type=int)
+    items, total = history_store.page(session_id(), offset, HISTORY_PAGE_SIZE)
+    return jsonify({'items': items, 'total': total, 'next_offset': offset + len(items)})
 
-def parse_token_count(metrics_text):
-    for line in metrics_text.split('\n'):
-        if 'nv_trt_llm_kv_cache_block_metrics{kv_cache_block_type="tokens_per",model="tensorrt_llm",version="1"}' in line:
-            return int(line.split(' ')[-1])
-    return 'N/A'
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/generate_stream', methods=['POST'])
+def generate_stream():
+    payload = build_payload(request.form)
+    payload['stream'] = True
+    # Resolved before streaming starts so the session cookie goes out with the headers
+    sid = session_id()
+
+    def events():
+        timer = RequestTimer()
+        chunks = []
+        try:
+            with triton_pool.lease() as endpoint, \
+                    http.post(f'{endpoint.url}/v2/models/{TRITON_MODEL}/generate_stream', json=payload, stream=True, timeout=TRITON_TIMEOUT) as response:
+                response.raise_for_status()
+                # Triton answers with server-sent events, one "data: {...}" line per decoded chunk
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = json.loads(line[len('data:'):])
+                    if 'error' in data:
+                        yield sse('error', {'error': data['error']})
+                        return
+                    text = data.get('text_output', '')
+                    if text:
+                        tokens = count_output_tokens(data)
+                        # The first text chunk may carry several tokens, or none, so it is not found by count
+                        first = timer.first_token is None
+                        timer.on_token(1 if tokens is None else tokens)
+                        if first:
+                            # Time to first token is the replica health signal; total time depends on output length
+                            triton_pool.observe_latency(endpoint, timer.first_token - timer.start)
+                        chunks.append(text)
+                        yield sse('token', {'text': text})
+        except (requests.exceptions.RequestException, LookupError) as e:
+            yield sse('error', {'error': str(e)})
+            return
+
+        timing = timer.finish()
+        request_stats.record(timing)
+        entry = {
+            'prompt': payload['text_input'],
+            'response': ''.join(chunks),
+            'latency': f"{timing['e2e']:.2f} seconds",
+            'ttft': f"{timing['ttft'] * 1000:.0f} ms" if timing['ttft'] is not None else 'N/A',
+            'token_count': get_token_count(),
+            'total_tokens': timing['tokens'],
+            'tokens_per_second': f"{timing['decode_tokens_per_second']:.2f}" if timing['decode_tokens_per_second'] else 'N/A'
+        }
+        history_store.append(sid, entry)
+        yield sse('done', dict(entry, result=render_markdown(entry['response'])))
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(request_stats.summary())
+
+def get_token_count():
+    value = metrics.get('nv_trt_llm_kv_cache_block_metrics', kv_cache_block_type='tokens_per', model='tensorrt_llm', version='1')
+    return 'N/A' if value is None else int(value)
+
+@app.route('/live_stats', methods=['GET'])
+def live_stats():
+    kv_cache = {}
+    for labels, value in metrics.select('nv_trt_llm_kv_cache_block_metrics', model='tensorrt_llm').items():
+        block_type = dict(labels)['kv_cache_block_type']
+        # Block counts add up across replicas; tokens per block is the same on each
+        kv_cache[block_type] = int(value) if block_type == 'tokens_per' else kv_cache.get(block_type, 0) + int(value)
+    requests_in_flight = {}
+    for labels, value in metrics.select('nv_trt_llm_request_metrics', model='tensorrt_llm').items():
+        request_type = dict(labels)['request_type']
+        requests_in_flight[request_type] = requests_in_flight.get(request_type, 0) + int(value)
+    gpu_utilization = list(metrics.select('nv_gpu_utilization').values())
+    return jsonify({
+        'scraped_at': metrics.scraped_at,
+        'kv_cache_blocks': kv_cache,
+        'requests': requests_in_flight,
+        'inference_success': metrics.total('nv_inference_request_success', model=TRITON_MODEL, version='1'),
+        'gpu_utilization': sum(gpu_utilization) / len(gpu_utilization) if gpu_utilization else None,
+        'endpoints': triton_pool.snapshot()
+    })
 
 @app.route('/healthcheck', methods=['GET'])
 def healthcheck():
@@ -67,4 +199,3 @@ def healthcheck():
 
 if __name__ == '__main__':
     app.run(debug=True)
-
@@ -0,0 +1,147 @@
+import logging
+import os
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+import requests
+
+logger = logging.getLogger(__name__)
+
+TRITON_ENDPOINTS = os.environ.get('TRITON_ENDPOINTS', '')
+TRITON_SERVICE_DNS = os.environ.get('TRITON_SERVICE_DNS', '')
+TRITON_SERVICE_PORT = int(os.environ.get('TRITON_SERVICE_PORT', '8000'))
+DNS_REFRESH_INTERVAL = float(os.environ.get('DNS_REFRESH_INTERVAL', '30'))
+EJECT_AFTER_FAILURES = int(os.environ.get('EJECT_AFTER_FAILURES', '3'))
+EJECT_SLOW_FACTOR = float(os.environ.get('EJECT_SLOW_FACTOR', '3'))
+EJECT_SECONDS = float(os.environ.get('EJECT_SECONDS', '30'))
+LATENCY_EWMA_ALPHA = 0.2
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        # Latency EWMA per kind of measurement, e.g. time to first token or time per output token
+        self.latency = {}
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def available(self, now):
+        return now >= self.ejected_until
+
+    def snapshot(self, now):
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'latency_ms': {kind: round(latency * 1000, 1) for kind, latency in self.latency.items()},
+            'failures': self.failures,
+            'ejected_for_seconds': round(max(self.ejected_until - now, 0), 1)
+        }
+
+class EndpointPool:
+    """Client-side balancing across Triton replicas.
+
+    Requests go to the available replica with the fewest outstanding requests,
+    ties broken by the lowest time-to-first-token EWMA. A replica is ejected for
+    ``eject_seconds`` after ``eject_after_failures`` consecutive failures, or when
+    a latency EWMA exceeds ``slow_factor`` times the median of the others for the
+    same kind of measurement. Only connection errors, timeouts and 5xx responses
+    count as failures; a 4xx is the request's fault, not the replica's. If every
+    replica is ejected, all of them are used again.
+    """
+
+    def __init__(self, urls=(), dns_name='', port=TRITON_SERVICE_PORT, eject_after_failures=EJECT_AFTER_FAILURES,
+                 slow_factor=EJECT_SLOW_FACTOR, eject_seconds=EJECT_SECONDS):
+        self.dns_name = dns_name
+        self.port = port
+        self.eject_after_failures = eject_after_failures
+        self.slow_factor = slow_factor
+        self.eject_seconds = eject_seconds
+        self.endpoints = {url.rstrip('/'): Endpoint(url.rstrip('/')) for url in urls}
+        self.resolved_at = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        # Headless Services resolve to one A record per ready pod
+        if not self.dns_name or time.monotonic() - self.resolved_at < DNS_REFRESH_INTERVAL:
+            return
+        self.resolved_at = time.monotonic()
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(self.dns_name, self.port, proto=socket.IPPROTO_TCP)}
+        except socket.gaierror as e:
+            logger.warning(f"Failed to resolve {self.dns_name}: {e}")
+            return
+        urls = {f'http://{address}:{self.port}' for address in addresses}
+        with self.lock:
+            for url in urls - self.endpoints.keys():
+                self.endpoints[url] = Endpoint(url)
+            for url in self.endpoints.keys() - urls:
+                del self.endpoints[url]
+
+    def choose(self):
+        self.refresh()
+        now = time.monotonic()
+        with self.lock:
+            candidates = [e for e in self.endpoints.values() if e.available(now)] or list(self.endpoints.values())
+            if not candidates:
+                raise LookupError('No Triton endpoints configured')
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.latency.get('ttft', 0)))
+            endpoint.outstanding += 1
+        return endpoint
+
+    @contextmanager
+    def lease(self):
+        endpoint = self.choose()
+        try:
+            yield endpoint
+        except Exception as e:
+            if is_replica_failure(e):
+                self.record_failure(endpoint)
+            raise
+        else:
+            endpoint.failures = 0
+        finally:
+            with self.lock:
+                endpoint.outstanding -= 1
+
+    def record_failure(self, endpoint):
+        with self.lock:
+            endpoint.failures += 1
+            if endpoint.failures >= self.eject_after_failures:
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                logger.warning(f"Ejecting {endpoint.url} after {endpoint.failures} consecutive failures")
+
+    def observe_latency(self, endpoint, seconds, kind='ttft'):
+        with self.lock:
+            latency = endpoint.latency.get(kind)
+            latency = seconds if latency is None else latency + LATENCY_EWMA_ALPHA * (seconds - latency)
+            endpoint.latency[kind] = latency
+            others = [e.latency[kind] for e in self.endpoints.values() if e is not endpoint and kind in e.latency]
+            if others and latency > self.slow_factor * statistics.median(others):
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                # Start fresh when it comes back rather than staying marked slow
+                endpoint.latency[kind] = statistics.median(others)
+                logger.warning(f"Ejecting slow endpoint {endpoint.url}")
+
+    def urls(self):
+        self.refresh()
+        with self.lock:
+            return list(self.endpoints)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            return [endpoint.snapshot(now) for endpoint in self.endpoints.values()]
+
+def is_replica_failure(error):
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError, requests.exceptions.HTTPError))
+
+def create_endpoint_pool(default_url):
+    urls = [url.strip() for url in TRITON_ENDPOINTS.split(',') if url.strip()]
+    if not urls and not TRITON_SERVICE_DNS:
+        urls = [default_url]
+    return EndpointPool(urls, dns_name=TRITON_SERVICE_DNS)
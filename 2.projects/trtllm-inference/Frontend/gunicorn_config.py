@@ -1,4 +1,20 @@
+import os
+import sys
+import tempfile
+
 bind = "0.0.0.0:5000"
-workers = 4
-threads = 2
-loglevel = "info"
\ No newline at end of file
+# Session cookies are signed with SECRET_KEY, so every worker must share it; without one,
+# a single worker serves every request rather than rejecting the cookies of the others
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+if workers > 1 and not os.environ.get("SECRET_KEY"):
+    print("SECRET_KEY is not set, running a single gunicorn worker", file=sys.stderr)
+    workers = 1
+# The in-memory history store is per process, so several workers share a SQLite one instead
+if workers > 1:
+    os.environ.setdefault("HISTORY_DB", os.path.join(tempfile.gettempdir(), "trtllm-frontend-history.db"))
+# gevent workers multiplex many streaming requests per process instead of
+# pinning a worker thread for the whole generation
+worker_class = "gevent"
+worker_connections = 1000
+timeout = 300
+loglevel = "info"
@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+import markdown2
+
+HISTORY_MAX_SESSIONS = int(os.environ.get('HISTORY_MAX_SESSIONS', '1000'))
+HISTORY_MAX_ENTRIES = int(os.environ.get('HISTORY_MAX_ENTRIES', '100'))
+
+@lru_cache(maxsize=int(os.environ.get('MARKDOWN_CACHE_SIZE', '1024')))
+def render_markdown(text):
+    return markdown2.markdown(text)
+
+def with_rendered_result(entry):
+    return dict(entry, result=render_markdown(entry['response']))
+
+class InMemoryHistoryStore:
+    """Per-session prompt/response history, bounded in entries per session and
+    in sessions overall (least recently used sessions are evicted)."""
+
+    def __init__(self, max_sessions=HISTORY_MAX_SESSIONS, max_entries=HISTORY_MAX_ENTRIES):
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def append(self, session_id, entry):
+        with self.lock:
+            entries = self.sessions.get(session_id)
+            if entries is None:
+                entries = self.sessions[session_id] = deque(maxlen=self.max_entries)
+            self.sessions.move_to_end(session_id)
+            entries.append(entry)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def page(self, session_id, offset=0, limit=10):
+        """Return ``limit`` entries starting ``offset`` back from the newest, newest first."""
+        with self.lock:
+            entries = self.sessions.get(session_id)
+            if not entries:
+                return [], 0
+            self.sessions.move_to_end(session_id)
+            total = len(entries)
+            end = max(total - offset, 0)
+            selected = [entries[i] for i in range(end - 1, max(end - limit, 0) - 1, -1)]
+        return [with_rendered_result(entry) for entry in selected], total
+
+class SQLiteHistoryStore:
+    """History persisted in SQLite so it survives restarts and is shared by all
+    gunicorn workers on the host."""
+
+    def __init__(self, path, max_sessions=HISTORY_MAX_SESSIONS, max_entries=HISTORY_MAX_ENTRIES):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self.appends = 0
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS history ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, '
+                         'created_at REAL NOT NULL, entry TEXT NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS history_session ON history (session_id, id)')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, session_id, entry):
+        with self.connect() as conn:
+            conn.execute('INSERT INTO history (session_id, created_at, entry) VALUES (?, ?, ?)',
+                         (session_id, time.time(), json.dumps(entry)))
+            conn.execute('DELETE FROM history WHERE session_id = ? AND id NOT IN '
+                         '(SELECT id FROM history WHERE session_id = ? ORDER BY id DESC LIMIT ?)',
+                         (session_id, session_id, self.max_entries))
+            self.appends += 1
+            if self.appends % 100:
+                return
+            # Evicting whole sessions scans the table, so only do it periodically
+            conn.execute('DELETE FROM history WHERE session_id NOT IN '
+                         '(SELECT session_id FROM history GROUP BY session_id ORDER BY MAX(id) DESC LIMIT ?)',
+                         (self.max_sessions,))
+
+    def page(self, session_id, offset=0, limit=10):
+        with self.connect() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM history WHERE session_id = ?', (session_id,)).fetchone()[0]
+            rows = conn.execute('SELECT entry FROM history WHERE session_id = ? ORDER BY id DESC LIMIT ? OFFSET ?',
+                                (session_id, limit, offset)).fetchall()
+        return [with_rendered_result(json.loads(row[0])) for row in rows], total
+
+def create_history_store():
+    path = os.environ.get('HISTORY_DB')
+    if path:
+        return SQLiteHistoryStore(path)
+    return InMemoryHistoryStore()
@@ -0,0 +1,101 @@
+import os
+import re
+import threading
+import time
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+\d+)?$')
+LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+ESCAPE_RE = re.compile(r'\\(.)')
+
+def parse_metrics(metrics_text):
+    """Parse the Prometheus text exposition format.
+
+    Returns a dict keyed by ``(metric_name, ((label, value), ...))`` with labels
+    sorted by name, mapping to the sample value as a float.
+    """
+    samples = {}
+    for line in metrics_text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE_RE.match(line.strip())
+        if not match:
+            continue
+        name, label_text, value = match.groups()
+        labels = tuple(sorted(
+            (key, ESCAPE_RE.sub(lambda m: '\n' if m.group(1) == 'n' else m.group(1), raw))
+            for key, raw in LABEL_RE.findall(label_text or '')
+        ))
+        try:
+            samples[(name, labels)] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+class MetricsPoller:
+    """Scrapes Triton's /metrics once per interval in a background thread and
+    serves the last parsed snapshot to request handlers.
+
+    ``urls`` is a callable returning the base URL of every Triton replica; each
+    sample gets an extra ``endpoint`` label naming the replica it came from.
+    """
+
+    def __init__(self, urls, session, interval=float(os.environ.get('METRICS_INTERVAL', '5')), timeout=5):
+        self.urls = urls
+        self.session = session
+        self.interval = interval
+        self.timeout = timeout
+        self.samples = {}
+        self.scraped_at = None
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def ensure_started(self):
+        # Gunicorn forks workers after import, so each worker starts its own poller
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            self.scrape()
+            time.sleep(self.interval)
+
+    def scrape(self):
+        samples = {}
+        for url in self.urls():
+            try:
+                response = self.session.get(f'{url}/metrics', timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Failed to scrape {url}/metrics: {e}")
+                continue
+            for (name, labels), value in parse_metrics(response.text).items():
+                samples[(name, tuple(sorted(labels + (('endpoint', url),))))] = value
+        self.samples = samples
+        self.scraped_at = time.time()
+
+    def get(self, name, default=None, **labels):
+        """Return the value of the first sample of ``name`` whose labels include ``labels``."""
+        return next(iter(self.select(name, **labels).values()), default)
+
+    def total(self, name, **labels):
+        """Sum ``name`` over every sample matching ``labels``, e.g. across replicas."""
+        return sum(self.select(name, **labels).values())
+
+    def select(self, name, **labels):
+        """Return ``{labels: value}`` for every sample of ``name`` matching ``labels``."""
+        self.ensure_started()
+        wanted = set(labels.items())
+        return {
+            sample_labels: value
+            for (sample_name, sample_labels), value in self.samples.items()
+            if sample_name == name and wanted.issubset(sample_labels)
+        }
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+STATS_WINDOW = int(os.environ.get('STATS_WINDOW', '500'))
+STATS_MAX_GAPS = int(os.environ.get('STATS_MAX_GAPS', '50000'))
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values:
+        return {f'p{point}': None for point in points}
+    ordered = sorted(values)
+    return {f'p{point}': ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] for point in points}
+
+def count_output_tokens(data):
+    """Tokens in one Triton response, from its ``output_log_probs`` (one per
+    generated token, per beam), or None when the server did not return them."""
+    log_probs = data.get('output_log_probs')
+    if not isinstance(log_probs, list):
+        return None
+    if log_probs and isinstance(log_probs[0], list):
+        log_probs = log_probs[0]
+    return len(log_probs)
+
+class RequestTimer:
+    """Timestamps one streamed generation as seen by the frontend.
+
+    Tokens are counted from what Triton reports for each chunk; a chunk without
+    a count is taken as one token, which matches the TensorRT-LLM backend
+    emitting one chunk per decoding step.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_token = None
+        self.last_token = None
+        self.first_chunk_tokens = 0
+        self.tokens = 0
+        self.gaps = []
+
+    def on_token(self, count=1):
+        now = time.monotonic()
+        if self.first_token is None:
+            self.first_token = now
+            self.first_chunk_tokens = count
+        else:
+            self.gaps.append(now - self.last_token)
+        self.last_token = now
+        self.tokens += count
+
+    def finish(self):
+        end = time.monotonic()
+        decode_tokens = self.tokens - self.first_chunk_tokens
+        decode_time = (self.last_token - self.first_token) if decode_tokens > 0 else 0
+        return {
+            'ttft': (self.first_token - self.start) if self.first_token is not None else None,
+            'e2e': end - self.start,
+            'tokens': self.tokens,
+            'decode_tokens_per_second': decode_tokens / decode_time if decode_time > 0 else None,
+            'gaps': self.gaps
+        }
+
+def summarize(requests, gaps, window):
+    to_ms = lambda values: [value * 1000 for value in values if value is not None]
+    return {
+        'requests': len(requests),
+        'window': window,
+        'ttft_ms': percentiles(to_ms(r['ttft'] for r in requests)),
+        'inter_token_ms': percentiles(to_ms(gaps)),
+        'decode_tokens_per_second': percentiles([r['decode_tokens_per_second'] for r in requests
+                                                 if r['decode_tokens_per_second'] is not None]),
+        'e2e_ms': percentiles(to_ms(r['e2e'] for r in requests)),
+        'tokens': percentiles([r['tokens'] for r in requests])
+    }
+
+class RollingStats:
+    """Last ``window`` request timings of this worker, summarized as percentiles."""
+
+    def __init__(self, window=STATS_WINDOW, max_gaps=STATS_MAX_GAPS):
+        self.requests = deque(maxlen=window)
+        self.gaps = deque(maxlen=max_gaps)
+        self.lock = threading.Lock()
+
+    def record(self, timing):
+        with self.lock:
+            self.requests.append({key: value for key, value in timing.items() if key != 'gaps'})
+            self.gaps.extend(timing['gaps'])
+
+    def summary(self):
+        with self.lock:
+            requests = list(self.requests)
+            gaps = list(self.gaps)
+        return summarize(requests, gaps, self.requests.maxlen)
+
+class SQLiteRollingStats:
+    """Last ``window`` request timings of every gunicorn worker on the host,
+    kept in SQLite so /stats reports the same window whichever worker answers."""
+
+    def __init__(self, path, window=STATS_WINDOW, max_gaps=STATS_MAX_GAPS):
+        self.path = path
+        self.window = window
+        self.max_gaps = max_gaps
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS request_stats ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, timing TEXT NOT NULL, gaps TEXT NOT NULL)')
+
+    @contextmanager
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, timing):
+        with self.connect() as conn:
+            conn.execute('INSERT INTO request_stats (timing, gaps) VALUES (?, ?)',
+                         (json.dumps({key: value for key, value in timing.items() if key != 'gaps'}),
+                          json.dumps(timing['gaps'])))
+            conn.execute('DELETE FROM request_stats WHERE id <= (SELECT MAX(id) FROM request_stats) - ?',
+                         (self.window,))
+
+    def summary(self):
+        with self.connect() as conn:
+            rows = conn.execute('SELECT timing, gaps FROM request_stats ORDER BY id DESC LIMIT ?',
+                                (self.window,)).fetchall()
+        requests = [json.loads(timing) for timing, _ in reversed(rows)]
+        gaps = [gap for _, request_gaps in reversed(rows) for gap in json.loads(request_gaps)]
+        return summarize(requests, gaps[-self.max_gaps:], self.window)
+
+def create_request_stats():
+    # Shares the history database, which gunicorn_config.py sets whenever several workers run
+    path = os.environ.get('STATS_DB') or os.environ.get('HISTORY_DB')
+    if path:
+        return SQLiteRollingStats(path)
+    return RollingStats()
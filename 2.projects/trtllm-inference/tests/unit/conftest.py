@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The frontend modules import each other as top-level modules, as they do under gunicorn
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Frontend"))
@@ -0,0 +1,120 @@
+"""
+Unit tests for client-side balancing across Triton replicas.
+"""
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from endpoints import EndpointPool, is_replica_failure
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code} error", response=response)
+
+
+def fail(pool, error):
+    with pytest.raises(type(error)):
+        with pool.lease():
+            raise error
+
+
+class TestEndpointPool:
+    """Test cases for EndpointPool class."""
+
+    def test_least_outstanding_chosen(self):
+        """Test that leases go to the replica with the fewest outstanding requests."""
+        pool = EndpointPool(["http://a", "http://b/"])
+
+        with pool.lease() as first, pool.lease() as second:
+            assert {first.url, second.url} == {"http://a", "http://b"}
+            assert first.outstanding == second.outstanding == 1
+
+        assert [e["outstanding"] for e in pool.snapshot()] == [0, 0]
+
+    def test_ejected_after_consecutive_failures(self):
+        """Test that a replica is ejected after eject_after_failures connection errors in a row."""
+        pool = EndpointPool(["http://a", "http://b"], eject_after_failures=2, eject_seconds=60)
+        a = pool.endpoints["http://a"]
+
+        # Ties go to the first replica, so both leases land on http://a
+        for _ in range(2):
+            fail(pool, requests.exceptions.ConnectionError("refused"))
+
+        assert a.ejected_until > 0
+        assert pool.choose().url == "http://b"
+
+    def test_success_resets_failures(self):
+        """Test that a successful request resets the consecutive failure count."""
+        pool = EndpointPool(["http://a"], eject_after_failures=2)
+        endpoint = pool.endpoints["http://a"]
+
+        fail(pool, requests.exceptions.Timeout("timed out"))
+        with pool.lease():
+            pass
+        fail(pool, requests.exceptions.Timeout("timed out"))
+
+        assert endpoint.failures == 1
+        assert endpoint.ejected_until == 0.0
+
+    def test_client_errors_not_counted(self):
+        """Test that 4xx responses and other errors do not count against the replica."""
+        pool = EndpointPool(["http://a"], eject_after_failures=1)
+
+        fail(pool, http_error(400))
+        fail(pool, ValueError("bad payload"))
+
+        assert pool.endpoints["http://a"].failures == 0
+
+    def test_server_errors_counted(self):
+        """Test that 5xx responses count against the replica."""
+        pool = EndpointPool(["http://a"], eject_after_failures=1, eject_seconds=60)
+
+        fail(pool, http_error(503))
+
+        assert pool.snapshot()[0]["ejected_for_seconds"] > 0
+
+    def test_all_ejected_falls_back_to_every_replica(self):
+        """Test that when every replica is ejected they are all used again."""
+        pool = EndpointPool(["http://a"], eject_after_failures=1, eject_seconds=60)
+        fail(pool, http_error(500))
+
+        assert pool.choose().url == "http://a"
+
+    def test_slow_replica_ejected(self):
+        """Test that a replica much slower than the median of the others is ejected."""
+        pool = EndpointPool(["http://a", "http://b", "http://c"], slow_factor=3, eject_seconds=60)
+        a, b, c = (pool.endpoints[url] for url in ("http://a", "http://b", "http://c"))
+
+        pool.observe_latency(b, 0.1)
+        pool.observe_latency(c, 0.1)
+        pool.observe_latency(a, 1.0)
+
+        assert a.ejected_until > 0
+        assert b.ejected_until == c.ejected_until == 0.0
+        # It comes back at the median rather than still marked slow
+        assert a.latency["ttft"] == pytest.approx(0.1)
+
+    def test_latency_kinds_compared_separately(self):
+        """Test that per-token latencies are not compared with time to first token."""
+        pool = EndpointPool(["http://a", "http://b"], slow_factor=3)
+        a, b = pool.endpoints["http://a"], pool.endpoints["http://b"]
+
+        pool.observe_latency(b, 0.01)
+        pool.observe_latency(a, 0.05, kind="per_token")
+
+        assert a.ejected_until == 0.0
+
+
+class TestIsReplicaFailure:
+    """Test cases for is_replica_failure function."""
+
+    def test_classification(self):
+        """Test which errors point at the replica rather than the request."""
+        assert is_replica_failure(requests.exceptions.ConnectionError())
+        assert is_replica_failure(requests.exceptions.Timeout())
+        assert is_replica_failure(requests.exceptions.ChunkedEncodingError())
+        assert is_replica_failure(http_error(502))
+        assert not is_replica_failure(http_error(404))
+        assert not is_replica_failure(ValueError())
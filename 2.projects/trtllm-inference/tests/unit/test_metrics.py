@@ -0,0 +1,55 @@
+"""
+Unit tests for the Prometheus text parser used by the metrics poller.
+"""
+import pytest
+
+pytest.importorskip("requests")
+
+from metrics import parse_metrics
+
+
+class TestParseMetrics:
+    """Test cases for parse_metrics function."""
+
+    def test_samples_keyed_by_name_and_sorted_labels(self):
+        """Test that samples are keyed by name and labels sorted by label name."""
+        samples = parse_metrics(
+            'nv_trt_llm_kv_cache_block_metrics{model="tensorrt_llm",kv_cache_block_type="used",version="1"} 42\n'
+        )
+
+        key = ("nv_trt_llm_kv_cache_block_metrics",
+               (("kv_cache_block_type", "used"), ("model", "tensorrt_llm"), ("version", "1")))
+        assert samples == {key: 42.0}
+
+    def test_comments_and_blank_lines_skipped(self):
+        """Test that HELP/TYPE comments and blank lines produce no samples."""
+        samples = parse_metrics(
+            "# HELP nv_gpu_utilization GPU utilization rate\n"
+            "# TYPE nv_gpu_utilization gauge\n"
+            "\n"
+            'nv_gpu_utilization{gpu_uuid="GPU-1"} 0.5\n'
+        )
+
+        assert samples == {("nv_gpu_utilization", (("gpu_uuid", "GPU-1"),)): 0.5}
+
+    def test_sample_without_labels_and_with_timestamp(self):
+        """Test metrics without labels and samples carrying a timestamp."""
+        samples = parse_metrics("process_start_time_seconds 1.7e9\nup 1 1700000000000\n")
+
+        assert samples[("process_start_time_seconds", ())] == 1.7e9
+        assert samples[("up", ())] == 1.0
+
+    def test_escaped_label_values(self):
+        """Test that escaped quotes, backslashes and newlines in label values are unescaped."""
+        samples = parse_metrics('m{path="C:\\\\models",note="say \\"hi\\"\\nbye"} 1\n')
+
+        assert samples == {("m", (("note", 'say "hi"\nbye'), ("path", "C:\\models"))): 1.0}
+
+    def test_special_values_and_malformed_lines(self):
+        """Test NaN/Inf values are parsed and malformed lines are skipped."""
+        samples = parse_metrics('a NaN\nb +Inf\nc{model="x"} not-a-number\nthis is not a sample\n')
+
+        assert samples[("b", ())] == float("inf")
+        assert samples[("a", ())] != samples[("a", ())]
+        assert ("c", (("model", "x"),)) not in samples
+        assert len(samples) == 2
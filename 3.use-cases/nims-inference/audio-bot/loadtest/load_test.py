@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import audioop
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import wave
+from urllib.parse import urlsplit
+
+from websockets.asyncio.client import connect
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000
+MULAW_SILENCE = b'\xff' * FRAME_BYTES
+DEFAULT_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "recordings", "recording.wav")
+
+
+def load_utterance(path, max_seconds):
+    with wave.open(path, "rb") as wav:
+        pcm = wav.readframes(wav.getnframes())
+        width = wav.getsampwidth()
+        if wav.getnchannels() == 2:
+            pcm = audioop.tomono(pcm, width, 0.5, 0.5)
+        if width != 2:
+            pcm = audioop.lin2lin(pcm, width, 2)
+        if wav.getframerate() != SAMPLE_RATE:
+            pcm, _ = audioop.ratecv(pcm, 2, 1, wav.getframerate(), SAMPLE_RATE, None)
+    mulaw = audioop.lin2ulaw(pcm[:int(max_seconds * SAMPLE_RATE) * 2], 2)
+    return [mulaw[i:i + FRAME_BYTES] for i in range(0, len(mulaw), FRAME_BYTES)]
+
+
+def twilio_signature(auth_token, url):
+    digest = hmac.new(auth_token.encode("utf-8"), url.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def process_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class ResponseStats:
+    # Tracks one bot response: RFC 3550 interarrival jitter against the audio
+    # timeline, and under-runs of a playout buffer fed at arrival time.
+    def __init__(self, underrun_tolerance):
+        self.underrun_tolerance = underrun_tolerance
+        self.first_arrival = None
+        self.last_arrival = None
+        self.last_timestamp = 0.0
+        self.audio_seconds = 0.0
+        self.playout_end = None
+        self.jitter = 0.0
+        self.underruns = 0
+
+    def add_frame(self, arrival, duration):
+        if self.first_arrival is None:
+            self.first_arrival = arrival
+            self.playout_end = arrival
+        else:
+            transit_delta = (arrival - self.last_arrival) - (self.audio_seconds - self.last_timestamp)
+            self.jitter += (abs(transit_delta) - self.jitter) / 16
+            if arrival > self.playout_end + self.underrun_tolerance:
+                self.underruns += 1
+        self.playout_end = max(self.playout_end, arrival) + duration
+        self.last_arrival = arrival
+        self.last_timestamp = self.audio_seconds
+        self.audio_seconds += duration
+
+
+class FakeTwilioCall:
+    def __init__(self, index, args, utterance):
+        self.index = index
+        self.args = args
+        self.utterance = utterance
+        self.stream_sid = f"MZloadtest{index:05d}"
+        self.latencies = []
+        self.responses = []
+        self.current = None
+        self.end_of_utterance = None
+        self.bot_done = asyncio.Event()
+        self.error = None
+
+    def headers(self):
+        if not self.args.auth_token:
+            return {}
+        parts = urlsplit(self.args.url)
+        signed_url = f"wss://{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return {"X-Twilio-Signature": twilio_signature(self.args.auth_token, signed_url)}
+
+    def media(self, frame):
+        return json.dumps({
+            "event": "media",
+            "streamSid": self.stream_sid,
+            "media": {"payload": base64.b64encode(frame).decode("ascii")},
+        })
+
+    async def receive(self, ws):
+        async for message in ws:
+            data = json.loads(message)
+            event = data.get("event")
+            now = time.monotonic()
+            if event == "media":
+                if self.current is None:
+                    continue
+                if self.end_of_utterance is not None and self.current.first_arrival is None:
+                    self.latencies.append(now - self.end_of_utterance)
+                    self.end_of_utterance = None
+                self.current.add_frame(now, len(base64.b64decode(data["media"]["payload"])) / SAMPLE_RATE)
+            elif event == "mark":
+                name = data["mark"]["name"]
+                if name == "bot_speaking_start":
+                    self.current = ResponseStats(self.args.underrun_tolerance_ms / 1000)
+                    self.responses.append(self.current)
+                elif name == "bot_speaking_end":
+                    self.current = None
+                    self.bot_done.set()
+                # Twilio echoes marks back when playback reaches them; echo straight away here
+                await ws.send(json.dumps({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": name}}))
+
+    async def send_frames(self, ws, frames, clock):
+        for frame in frames:
+            clock["next"] += FRAME_MS / 1000
+            delay = clock["next"] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await ws.send(self.media(frame))
+
+    async def send_silence_until(self, ws, clock, event, timeout):
+        deadline = time.monotonic() + timeout
+        while not event.is_set() and time.monotonic() < deadline:
+            await self.send_frames(ws, [MULAW_SILENCE], clock)
+
+    async def run(self):
+        try:
+            async with connect(self.args.url, additional_headers=self.headers(), max_size=None) as ws:
+                receiver = asyncio.create_task(self.receive(ws))
+                await ws.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+                await ws.send(json.dumps({
+                    "event": "start",
+                    "streamSid": self.stream_sid,
+                    "start": {"streamSid": self.stream_sid, "callSid": f"CAloadtest{self.index:05d}",
+                              "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": SAMPLE_RATE, "channels": 1}},
+                }))
+
+                clock = {"next": time.monotonic()}
+                # Wait for the greeting before speaking, as a caller would
+                await self.send_silence_until(ws, clock, self.bot_done, self.args.turn_timeout)
+                for _ in range(self.args.turns):
+                    await self.send_frames(ws, self.utterance, clock)
+                    self.end_of_utterance = time.monotonic()
+                    self.bot_done.clear()
+                    await self.send_silence_until(ws, clock, self.bot_done, self.args.turn_timeout)
+
+                await ws.send(json.dumps({"event": "stop", "streamSid": self.stream_sid}))
+                receiver.cancel()
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Call {self.index} failed: {e}")
+
+    def summary(self):
+        # The first response is the greeting; only turn responses count for latency
+        turns = self.responses[1:]
+        return {
+            "call": self.index,
+            "error": self.error,
+            "turns_answered": len(self.latencies),
+            "latency_ms": [round(latency * 1000, 1) for latency in self.latencies],
+            "jitter_ms": [round(r.jitter * 1000, 2) for r in turns],
+            "underruns": sum(r.underruns for r in turns),
+        }
+
+
+async def main(args):
+    utterance = load_utterance(args.audio, args.utterance_seconds)
+    logger.info(f"Replaying {len(utterance) * FRAME_MS / 1000:.1f}s utterance over {args.calls} calls")
+
+    cpu_start = process_cpu_seconds(args.server_pid) if args.server_pid else None
+    wall_start = time.monotonic()
+
+    calls = [FakeTwilioCall(i, args, utterance) for i in range(args.calls)]
+    tasks = []
+    for call in calls:
+        tasks.append(asyncio.create_task(call.run()))
+        await asyncio.sleep(args.ramp_seconds / max(1, args.calls))
+    await asyncio.gather(*tasks)
+
+    wall = time.monotonic() - wall_start
+    per_call = [call.summary() for call in calls]
+    latencies = [latency for call in per_call for latency in call["latency_ms"]]
+    jitters = [jitter for call in per_call for jitter in call["jitter_ms"]]
+
+    report = {
+        "calls": args.calls,
+        "failed_calls": sum(1 for call in per_call if call["error"]),
+        "wall_seconds": round(wall, 2),
+        "latency_ms": {p: percentile(latencies, p) for p in (50, 95, 99)},
+        "jitter_ms": {p: percentile(jitters, p) for p in (50, 95, 99)},
+        "underruns": sum(call["underruns"] for call in per_call),
+        "per_call": per_call,
+    }
+    if cpu_start is not None:
+        cpu_seconds = process_cpu_seconds(args.server_pid) - cpu_start
+        report["server_cpu_seconds"] = round(cpu_seconds, 2)
+        report["server_cpu_seconds_per_call"] = round(cpu_seconds / args.calls, 3)
+        report["server_cpu_percent_per_call"] = round(100 * cpu_seconds / wall / args.calls, 2)
+
+    logger.info(f"End-of-utterance to first audio (ms): {report['latency_ms']}")
+    logger.info(f"Jitter (ms): {report['jitter_ms']}, under-runs: {report['underruns']}")
+    if cpu_start is not None:
+        logger.info(f"Server CPU per call: {report['server_cpu_percent_per_call']}%")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote report to {args.output}")
+    else:
+        print(json.dumps({k: v for k, v in report.items() if k != "per_call"}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent fake Twilio media streams against the voice bot /ws endpoint")
+    parser.add_argument("--url", default="ws://localhost:8080/ws")
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--audio", default=DEFAULT_AUDIO, help="WAV file replayed as the caller's utterance")
+    parser.add_argument("--utterance-seconds", type=float, default=3.0)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Spread call start times over this window")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--underrun-tolerance-ms", type=float, default=5.0)
+    parser.add_argument("--auth-token", default=os.environ.get("TWILIO_AUTH_TOKEN"), help="Signs the WebSocket upgrade")
+    parser.add_argument("--server-pid", type=int, help="Twilio server PID to sample CPU time from")
+    parser.add_argument("--output", help="Write the full JSON report here")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import audioop
+import logging
+import math
+import struct
+import time
+
+import grpc
+from aiohttp import web
+from riva.client.proto import riva_asr_pb2, riva_asr_pb2_grpc, riva_tts_pb2, riva_tts_pb2_grpc
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Local stand-ins for Riva ASR/TTS and the NIM chat endpoint so the Twilio server
+# can be load tested without GPUs. Latencies are configurable to model real services.
+
+class StubASR(riva_asr_pb2_grpc.RivaSpeechRecognitionServicer):
+    def __init__(self, args):
+        self.transcript = args.transcript
+        self.silence_ms = args.asr_silence_ms
+        self.energy_threshold = args.asr_energy_threshold
+        self.interim_interval = args.asr_interim_ms / 1000
+
+    @staticmethod
+    def result(transcript, is_final):
+        return riva_asr_pb2.StreamingRecognizeResponse(results=[
+            riva_asr_pb2.StreamingRecognitionResult(
+                alternatives=[riva_asr_pb2.SpeechRecognitionAlternative(transcript=transcript, confidence=0.9)],
+                is_final=is_final,
+            )
+        ])
+
+    async def StreamingRecognize(self, request_iterator, context):
+        sample_rate = 8000
+        in_speech = False
+        silence = 0.0
+        last_interim = 0.0
+        async for request in request_iterator:
+            if request.HasField("streaming_config"):
+                sample_rate = request.streaming_config.config.sample_rate_hertz or sample_rate
+                continue
+            audio = request.audio_content
+            if not audio:
+                continue
+            duration = len(audio) / 2 / sample_rate
+            if audioop.rms(audio, 2) >= self.energy_threshold:
+                in_speech = True
+                silence = 0.0
+                now = time.monotonic()
+                if now - last_interim >= self.interim_interval:
+                    last_interim = now
+                    yield self.result(self.transcript, False)
+            elif in_speech:
+                silence += duration
+                if silence * 1000 >= self.silence_ms:
+                    in_speech = False
+                    silence = 0.0
+                    yield self.result(self.transcript, True)
+
+
+class StubTTS(riva_tts_pb2_grpc.RivaSpeechSynthesisServicer):
+    def __init__(self, args):
+        self.first_chunk_delay = args.tts_delay_ms / 1000
+        self.seconds_per_word = args.tts_seconds_per_word
+        self.chunk_seconds = args.tts_chunk_ms / 1000
+
+    async def SynthesizeOnline(self, request, context):
+        sample_rate = request.sample_rate_hz or 8000
+        words = max(1, len(request.text.split()))
+        total_samples = int(words * self.seconds_per_word * sample_rate)
+        chunk_samples = int(self.chunk_seconds * sample_rate)
+
+        await asyncio.sleep(self.first_chunk_delay)
+        for offset in range(0, total_samples, chunk_samples):
+            count = min(chunk_samples, total_samples - offset)
+            samples = (int(8000 * math.sin(2 * math.pi * 440 * (offset + i) / sample_rate)) for i in range(count))
+            yield riva_tts_pb2.SynthesizeSpeechResponse(audio=struct.pack(f"<{count}h", *samples))
+
+
+def nim_app(args):
+    async def chat_completions(request):
+        body = await request.json()
+        await asyncio.sleep(args.llm_delay_ms / 1000)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+        return web.json_response({
+            "id": "stub",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": args.reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(args.reply.split())},
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+async def main(args):
+    server = grpc.aio.server()
+    riva_asr_pb2_grpc.add_RivaSpeechRecognitionServicer_to_server(StubASR(args), server)
+    riva_tts_pb2_grpc.add_RivaSpeechSynthesisServicer_to_server(StubTTS(args), server)
+    server.add_insecure_port(f"0.0.0.0:{args.riva_port}")
+    await server.start()
+    logger.info(f"Stub Riva ASR/TTS listening on port {args.riva_port}")
+
+    runner = web.AppRunner(nim_app(args))
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", args.nim_port).start()
+    logger.info(f"Stub NIM listening on port {args.nim_port}")
+
+    try:
+        await server.wait_for_termination()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Riva ASR/TTS and NIM services for load testing")
+    parser.add_argument("--riva-port", type=int, default=50051)
+    parser.add_argument("--nim-port", type=int, default=8001)
+    parser.add_argument("--transcript", default="I would like a large pepperoni pizza with thin crust")
+    parser.add_argument("--reply", default="Great choice! Would you like any extra toppings on that?")
+    parser.add_argument("--asr-silence-ms", type=int, default=500, help="Trailing silence that ends an utterance")
+    parser.add_argument("--asr-energy-threshold", type=int, default=500, help="RMS level treated as speech")
+    parser.add_argument("--asr-interim-ms", type=int, default=200, help="Interval between interim transcripts")
+    parser.add_argument("--llm-delay-ms", type=int, default=300)
+    parser.add_argument("--tts-delay-ms", type=int, default=50, help="Delay before the first TTS chunk")
+    parser.add_argument("--tts-chunk-ms", type=int, default=100)
+    parser.add_argument("--tts-seconds-per-word", type=float, default=0.3)
+    asyncio.run(main(parser.parse_args()))
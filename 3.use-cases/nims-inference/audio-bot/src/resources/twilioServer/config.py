@@ -3,12 +3,19 @@ import os
 
 RIVA_ASR_SERVICE_ADDRESS = os.environ.get('RIVA_ASR_SERVICE_ADDRESS', 'nim.nebulex.dev:50051')
 RIVA_TTS_SERVICE_ADDRESS = os.environ.get('RIVA_TTS_SERVICE_ADDRESS', 'nim.nebulex.dev:50051')
+RIVA_USE_SSL = os.environ.get("RIVA_USE_SSL", "true").lower() == "true"
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 
 CHUNK_SIZE = 8000  
 BYTES_PER_SAMPLE = 2 
 CHUNK_BYTES = CHUNK_SIZE * BYTES_PER_SAMPLE
 
+# Outbound TTS pacing: 20 ms frames of 8 kHz mu-law (1 byte per sample)
+TTS_SAMPLE_RATE = 8000
+TTS_FRAME_MS = 20
+TTS_FRAME_BYTES = TTS_SAMPLE_RATE * TTS_FRAME_MS // 1000
+TTS_LEAD_BUFFER_MS = int(os.environ.get("TTS_LEAD_BUFFER_MS", "200"))
+
 AVAILABLE_VOICES = {
     "en-US": [
         "English-US.Female-1",
@@ -28,9 +35,14 @@ AVAILABLE_VOICES = {
 
 # NIM and Pizza ordering configuration
 NIM_LLM_SERVICE_ADDRESS = os.environ.get("NIM_LLM_SERVICE_ADDRESS", "nim.nebulex.dev")
-NIM_URL = f"https://{NIM_LLM_SERVICE_ADDRESS}/v1/chat/completions"
+NIM_URL = os.environ.get("NIM_URL", f"https://{NIM_LLM_SERVICE_ADDRESS}/v1/chat/completions")
 NIM_MODEL = "meta/llama-3.1-8b-instruct"
 
+# Token budget for conversation history sent with each turn (excluding the system prompt)
+LLM_HISTORY_TOKEN_BUDGET = int(os.environ.get("LLM_HISTORY_TOKEN_BUDGET", "1500"))
+LLM_HISTORY_TRIM_RATIO = 0.5
+LLM_HISTORY_SUMMARY_MAX_CHARS = 600
+
 PIZZA_SIZES = ["small", "medium", "large"]
 PIZZA_TOPPINGS = ["cheese", "pepperoni", "mushrooms", "onions", "sausage", "olives", "bell peppers"]
 CRUST_TYPES = ["thin", "regular", "thick", "stuffed"]
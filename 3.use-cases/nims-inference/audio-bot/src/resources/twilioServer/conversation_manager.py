@@ -1,6 +1,7 @@
 import asyncio
 import time
-from llm_service import generate_llm_response
+from llm_service import generate_llm_response, role_prompt
+from history_manager import ConversationHistory
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,7 +10,7 @@ class ConversationManager:
     def __init__(self, websocket, tts_streamer):
         self.websocket = websocket
         self.tts_streamer = tts_streamer
-        self.conversation_history = []
+        self.conversation_history = ConversationHistory(role_prompt)
         self.transcript_count = 0
         self.SPEAKING_THRESHOLD = 3
         self.RESET_THRESHOLD_TIME = 0.5 
@@ -92,10 +93,10 @@ class ConversationManager:
    
 
         transcript = result["text"]
-        self.conversation_history.append({"role": "user", "content": transcript})
+        self.conversation_history.add_user(transcript)
         
         llm_response = await generate_llm_response(self.conversation_history)
-        self.conversation_history.append({"role": "assistant", "content": llm_response})
+        self.conversation_history.add_assistant(llm_response)
         
         logger.info(f"LLM Response: {llm_response}")
         return llm_response
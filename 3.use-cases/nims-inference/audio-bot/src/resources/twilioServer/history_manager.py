@@ -0,0 +1,84 @@
+import logging
+from config import LLM_HISTORY_TOKEN_BUDGET, LLM_HISTORY_TRIM_RATIO, LLM_HISTORY_SUMMARY_MAX_CHARS
+
+logger = logging.getLogger(__name__)
+
+class ConversationHistory:
+    """Bounded chat history sent to the NIM endpoint on every turn.
+
+    The system prompt is sent unchanged as the first message so the server-side
+    prefix cache keeps hitting.  When the history grows past the token budget the
+    oldest turns are dropped in one step down to ``trim_ratio`` of the budget, so
+    the retained prefix also stays stable for several turns between trims.
+    Dropped caller turns are folded into a short summary carried on the first
+    retained user message.
+    """
+
+    def __init__(self, system_prompt, token_budget=LLM_HISTORY_TOKEN_BUDGET,
+                 trim_ratio=LLM_HISTORY_TRIM_RATIO, summary_max_chars=LLM_HISTORY_SUMMARY_MAX_CHARS):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.token_budget = token_budget
+        self.trim_ratio = trim_ratio
+        self.summary_max_chars = summary_max_chars
+        self.turns = []
+        self.summary = ""
+        # Characters per token, refined from the usage the NIM endpoint reports
+        self.chars_per_token = 4.0
+        self.prompt_tokens = []
+
+    def add_user(self, content):
+        self.turns.append({"role": "user", "content": content})
+
+    def add_assistant(self, content):
+        self.turns.append({"role": "assistant", "content": content})
+
+    def estimate_tokens(self, messages):
+        return int(sum(len(m["content"]) for m in messages) / self.chars_per_token) + 4 * len(messages)
+
+    def history_tokens(self):
+        # The summary is sent along with the retained turns, so it counts against the same budget
+        return self.estimate_tokens(self.turns) + int(len(self.summary) / self.chars_per_token)
+
+    def summarize(self, content):
+        summary = f"{self.summary} {content}".strip()
+        if len(summary) > self.summary_max_chars:
+            # Keep the newest words, starting at a word boundary rather than partway through one
+            cut = len(summary) - self.summary_max_chars
+            summary = summary[cut:] if summary[cut - 1].isspace() else summary[cut:].partition(" ")[2]
+        self.summary = summary.strip()
+
+    def trim(self):
+        if self.history_tokens() <= self.token_budget:
+            return
+        target = self.token_budget * self.trim_ratio
+        dropped = 0
+        # Always keep the latest user turn; drop whole user/assistant pairs otherwise
+        while len(self.turns) > 1 and self.history_tokens() > target:
+            turn = self.turns.pop(0)
+            dropped += 1
+            if turn["role"] == "user":
+                self.summarize(turn["content"])
+        while self.turns and self.turns[0]["role"] != "user":
+            self.turns.pop(0)
+            dropped += 1
+        logger.info(f"Trimmed {dropped} messages from conversation history, {len(self.turns)} retained")
+
+    def messages(self):
+        self.trim()
+        turns = self.turns
+        if self.summary and turns:
+            first = dict(turns[0])
+            first["content"] = f"(Earlier in this call the caller said: {self.summary})\n{first['content']}"
+            turns = [first] + turns[1:]
+        return [self.system_message] + turns
+
+    def record_usage(self, messages, usage):
+        if not usage or "prompt_tokens" not in usage:
+            return
+        prompt_tokens = usage["prompt_tokens"]
+        self.prompt_tokens.append(prompt_tokens)
+        chars = sum(len(m["content"]) for m in messages)
+        if prompt_tokens > 0:
+            self.chars_per_token = 0.8 * self.chars_per_token + 0.2 * (chars / prompt_tokens)
+        logger.info(f"Turn {len(self.prompt_tokens)}: {prompt_tokens} prompt tokens, "
+                    f"{usage.get('completion_tokens', 0)} completion tokens, {len(messages) - 1} history messages")
@@ -82,7 +82,9 @@ Keep responses short and natural. If the user doesn't provide all necessary deta
 Your response will be used to generate audio responses to the user.  Non-standard characters should not be included.
 Don't mention the function or expose its usage to the user."""
 
-role_prompt = role_prompt.format(tool_json=json.dumps(tools[0]["function"], indent=2))
+# Compact JSON keeps the prompt short; it is formatted once so every request
+# carries a byte-identical system prompt and hits the NIM prefix cache.
+role_prompt = role_prompt.format(tool_json=json.dumps(tools[0]["function"]))
 logger.debug(f"Formatted role prompt: {role_prompt}")
 
 def process_pizza_order(size: str, toppings: List[str], crust: str) -> Dict[str, bool]:
@@ -145,7 +147,7 @@ async def generate_llm_response(conversation_history):
     start_time = time.time()
     logger.info(f"Starting LLM response generation")
     
-    messages = [{"role": "system", "content": role_prompt}] + conversation_history
+    messages = conversation_history.messages()
     logger.debug(f"Messages being sent to NIM: {json.dumps(messages, indent=2)}")
     
     response_data = await call_nim_endpoint(messages)
@@ -154,6 +156,8 @@ async def generate_llm_response(conversation_history):
         logger.warning("No data received from NIM endpoint")
         return "I'm sorry, I'm having trouble processing your request right now."
 
+    conversation_history.record_usage(messages, response_data.get('usage'))
+
     logger.debug(f"Raw LLM response: {json.dumps(response_data, indent=2)}")
 
     if 'choices' in response_data and len(response_data['choices']) > 0:
@@ -1,7 +1,7 @@
 from riva.client import ASRService, SpeechSynthesisService, Auth
-from config import RIVA_ASR_SERVICE_ADDRESS, RIVA_TTS_SERVICE_ADDRESS
+from config import RIVA_ASR_SERVICE_ADDRESS, RIVA_TTS_SERVICE_ADDRESS, RIVA_USE_SSL
 
-asr_auth = Auth(uri=f"{RIVA_ASR_SERVICE_ADDRESS}", use_ssl=True)
-tts_auth = Auth(uri=f"{RIVA_TTS_SERVICE_ADDRESS}", use_ssl=True)
+asr_auth = Auth(uri=f"{RIVA_ASR_SERVICE_ADDRESS}", use_ssl=RIVA_USE_SSL)
+tts_auth = Auth(uri=f"{RIVA_TTS_SERVICE_ADDRESS}", use_ssl=RIVA_USE_SSL)
 asr_service = ASRService(asr_auth)
 tts_service = SpeechSynthesisService(tts_auth)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import audioop
 from riva_services import tts_service
 from riva.client.proto.riva_audio_pb2 import AudioEncoding
-from config import AVAILABLE_VOICES
+from config import AVAILABLE_VOICES, TTS_SAMPLE_RATE
 import logging
 import asyncio
 
@@ -16,21 +16,22 @@ async def generate_tts_response(text, language_code="en-US", voice_name=None):
         logger.info(f"Using text: {text}")
         logger.info(f"Using language code: {language_code}")
 
-        sample_rate_hz = 8000 
-        
         responses = tts_service.synthesize_online(
             text,
             voice_name=voice_name,
-            encoding=AudioEncoding.LINEAR_PCM, 
+            encoding=AudioEncoding.LINEAR_PCM,
             language_code=language_code,
-            sample_rate_hz=sample_rate_hz,
+            sample_rate_hz=TTS_SAMPLE_RATE,
         )
-        
-        for response in responses:
-            mulaw_audio = audioop.lin2ulaw(response.audio, 2)
-            yield mulaw_audio
-            await asyncio.sleep(0.01)
+
+        # The Riva stream is a blocking gRPC iterator; pull each response off the
+        # event loop so pacing is driven by the TTSStreamer clock, not by sleeps here.
+        while True:
+            response = await asyncio.to_thread(next, responses, None)
+            if response is None:
+                break
+            yield audioop.lin2ulaw(response.audio, 2)
 
     except Exception as e:
         logger.exception(f"Error generating TTS response: {str(e)}")
-        yield b''  
\ No newline at end of file
+        yield b''
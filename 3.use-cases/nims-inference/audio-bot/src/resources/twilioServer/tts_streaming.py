@@ -1,11 +1,62 @@
 import asyncio
 import base64
+import json
 from tts_generator import generate_tts_response
+from config import TTS_FRAME_BYTES, TTS_FRAME_MS, TTS_LEAD_BUFFER_MS
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
+class FramePacer:
+    """Re-chunks mu-law audio into fixed frames and paces them against a monotonic clock.
+
+    Frames are released up to ``lead_time`` seconds ahead of their playout time, so
+    audio is sent faster than real time until the lead buffer on the Twilio side is
+    full and then at exactly real time.  If the producer falls behind (an under-run),
+    the clock is re-anchored so the lead buffer is rebuilt instead of bursting.
+    """
+
+    def __init__(self, frame_bytes=TTS_FRAME_BYTES, frame_duration=TTS_FRAME_MS / 1000,
+                 lead_time=TTS_LEAD_BUFFER_MS / 1000):
+        self.frame_bytes = frame_bytes
+        self.frame_duration = frame_duration
+        self.lead_time = lead_time
+        self.buffer = bytearray()
+        self.start_time = None
+        self.frames_sent = 0
+        self.underruns = 0
+
+    def frames(self, audio_chunk):
+        self.buffer.extend(audio_chunk)
+        while len(self.buffer) >= self.frame_bytes:
+            frame = bytes(self.buffer[:self.frame_bytes])
+            del self.buffer[:self.frame_bytes]
+            yield frame
+
+    def flush(self):
+        if not self.buffer:
+            return b''
+        frame = bytes(self.buffer)
+        self.buffer.clear()
+        return frame
+
+    async def wait_for_slot(self):
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+        playout_time = self.start_time + self.frames_sent * self.frame_duration
+        if now > playout_time:
+            if self.frames_sent:
+                self.underruns += 1
+            self.start_time = now - self.frames_sent * self.frame_duration
+            playout_time = now
+        delay = playout_time - self.lead_time - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.frames_sent += 1
+
+
 class TTSStreamer:
     def __init__(self, websocket):
         self.websocket = websocket
@@ -22,44 +73,60 @@ class TTSStreamer:
         })
         logger.info(f"Sent '{mark_name}' Mark message")
 
+    @staticmethod
+    def media_envelope(stream_sid):
+        # Serialize the fixed part of the media message once per response; base64
+        # payloads never need JSON escaping so frames are spliced in as-is.
+        prefix = '{"event": "media", "streamSid": %s, "media": {"payload": "' % json.dumps(stream_sid)
+        suffix = '"}}'
+        return prefix, suffix
+
+    async def send_frame(self, pacer, frame, prefix, suffix):
+        await pacer.wait_for_slot()
+        await self.websocket.send_text(prefix + base64.b64encode(frame).decode('ascii') + suffix)
+
     async def stream_tts(self, tts_stream, stream_sid):
         try:
             await self.send_mark(stream_sid, "bot_speaking_start")
             self.tts_start_time = time.time()
 
+            pacer = FramePacer()
+            prefix, suffix = self.media_envelope(stream_sid)
+            interrupted = False
+
             async for audio_chunk in tts_stream:
-                if not self.is_speaking:
+                for frame in pacer.frames(audio_chunk):
+                    if not self.is_speaking:
+                        interrupted = True
+                        break
+                    await self.send_frame(pacer, frame, prefix, suffix)
+                if interrupted:
                     logger.info("TTS audio stream interrupted")
                     break
-                base64_audio = base64.b64encode(audio_chunk).decode('utf-8')
-                await self.websocket.send_json({
-                    "event": "media",
-                    "streamSid": stream_sid,
-                    "media": {
-                        "payload": base64_audio
-                    }
-                })
-                await asyncio.sleep(0.01)  
 
+            if not interrupted:
+                frame = pacer.flush()
+                if frame:
+                    await self.send_frame(pacer, frame, prefix, suffix)
 
             await self.send_mark(stream_sid, "bot_speaking_end")
-            
-            logger.info("Finished streaming TTS audio")
+
+            logger.info(f"Finished streaming TTS audio: {pacer.frames_sent} frames, {pacer.underruns} under-runs")
         except Exception as e:
             logger.exception(f"Error in stream_tts: {str(e)}")
 
     async def send_tts_response(self, text, stream_sid):
         logger.info(f"Generating TTS for: {text}")
         tts_stream = generate_tts_response(text, language_code="en-US", voice_name="English-US.Female-1")
-        
+
         self.is_speaking = True
-        
+
         await self.stream_tts(tts_stream, stream_sid)
 
     async def handle_mark(self, mark_data):
         logger.info(f"Received mark message: {mark_data}")
         mark_name = mark_data.get('name')
-        
+
         if mark_name == 'bot_speaking_start':
             self.tts_start_time = time.time()
             logger.info("Bot started speaking")
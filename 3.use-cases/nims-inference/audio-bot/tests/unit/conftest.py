@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The Twilio Server modules import each other as top-level modules, as they do in its container
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src" / "resources" / "twilioServer"))
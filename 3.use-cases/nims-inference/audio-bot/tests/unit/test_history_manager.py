@@ -0,0 +1,84 @@
+"""
+Unit tests for the bounded conversation history.
+"""
+from history_manager import ConversationHistory
+
+
+def make_history(**kwargs):
+    options = {"token_budget": 100, "trim_ratio": 0.5, "summary_max_chars": 40}
+    options.update(kwargs)
+    return ConversationHistory("You take pizza orders.", **options)
+
+
+def add_turns(history, count):
+    for turn in range(count):
+        history.add_user(f"caller turn {turn} " + "x" * 40)
+        history.add_assistant("assistant reply " + "y" * 40)
+
+
+class TestConversationHistory:
+    """Test cases for ConversationHistory class."""
+
+    def test_no_trim_within_budget(self):
+        """Test that a short history is sent unchanged after the system prompt."""
+        history = make_history()
+        add_turns(history, 1)
+
+        messages = history.messages()
+
+        assert messages[0] == {"role": "system", "content": "You take pizza orders."}
+        assert [m["role"] for m in messages[1:]] == ["user", "assistant"]
+        assert history.summary == ""
+
+    def test_trim_down_to_ratio_of_budget(self):
+        """Test that trimming drops the oldest turns down to trim_ratio of the budget."""
+        history = make_history()
+        add_turns(history, 10)
+        history.add_user("latest question")
+
+        history.trim()
+
+        assert history.history_tokens() <= history.token_budget * history.trim_ratio
+        assert history.turns[0]["role"] == "user"
+        assert history.turns[-1]["content"] == "latest question"
+
+    def test_latest_user_turn_always_kept(self):
+        """Test that the latest user turn is kept even when it alone exceeds the budget."""
+        history = make_history()
+        history.add_user("z" * 1000)
+
+        history.trim()
+
+        assert history.turns == [{"role": "user", "content": "z" * 1000}]
+
+    def test_summary_counts_against_budget(self):
+        """Test that the running summary is included in the history's token estimate."""
+        history = make_history()
+        add_turns(history, 1)
+        without_summary = history.history_tokens()
+
+        history.summary = "s" * 40
+
+        assert history.history_tokens() == without_summary + 10
+
+    def test_summary_truncated_at_word_boundary(self):
+        """Test that a summary over summary_max_chars keeps only the newest whole words."""
+        history = make_history(summary_max_chars=20)
+
+        history.summarize("I would like a large pepperoni pizza")
+        history.summarize("with extra cheese please")
+
+        assert len(history.summary) <= 20
+        assert history.summary == "extra cheese please"
+
+    def test_summary_prefixed_to_first_retained_turn(self):
+        """Test that dropped caller turns are carried on the first retained user message."""
+        history = make_history()
+        add_turns(history, 10)
+        history.add_user("latest question")
+
+        messages = history.messages()
+
+        assert history.summary
+        assert messages[1]["role"] == "user"
+        assert messages[1]["content"].startswith(f"(Earlier in this call the caller said: {history.summary})")
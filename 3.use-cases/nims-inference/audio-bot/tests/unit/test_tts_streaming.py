@@ -0,0 +1,88 @@
+"""
+Unit tests for the outbound TTS frame pacer.
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("riva.client")
+
+import tts_streaming
+from tts_streaming import FramePacer
+
+
+class FakeClock:
+    """Monotonic clock that only moves when the pacer sleeps or the test advances it."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tts_streaming.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(tts_streaming.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+class TestFramePacer:
+    """Test cases for FramePacer class."""
+
+    def test_frames_rechunk_audio(self):
+        """Test that arbitrary chunks come out as fixed frames with the remainder buffered."""
+        pacer = FramePacer(frame_bytes=4, frame_duration=0.02, lead_time=0)
+
+        assert list(pacer.frames(b"abcdef")) == [b"abcd"]
+        assert list(pacer.frames(b"ghij")) == [b"efgh"]
+        assert pacer.flush() == b"ij"
+        assert pacer.flush() == b""
+
+    def test_frames_released_ahead_by_lead_time(self, clock):
+        """Test that frames go out immediately until the lead buffer is full, then at real time."""
+        pacer = FramePacer(frame_bytes=160, frame_duration=0.02, lead_time=0.1)
+
+        async def send(count):
+            for _ in range(count):
+                await pacer.wait_for_slot()
+
+        asyncio.run(send(6))
+
+        # Frames 0-5 play at 0, 20, ..., 100 ms, all within the 100 ms lead
+        assert clock.sleeps == []
+        assert clock.now == pytest.approx(100.0)
+        assert pacer.frames_sent == 6
+
+        asyncio.run(send(5))
+
+        # Past the lead buffer every frame waits one frame duration
+        assert clock.sleeps == pytest.approx([0.02] * 5)
+        assert clock.now == pytest.approx(100.1)
+        assert pacer.underruns == 0
+
+    def test_underrun_reanchors_clock(self, clock):
+        """Test that a stalled producer is counted and does not cause a burst afterwards."""
+        pacer = FramePacer(frame_bytes=160, frame_duration=0.02, lead_time=0)
+
+        async def send(count):
+            for _ in range(count):
+                await pacer.wait_for_slot()
+
+        asyncio.run(send(3))
+        assert clock.now == pytest.approx(100.04)
+
+        # The producer stalls well past the next frame's playout time
+        clock.now += 1.0
+        clock.sleeps.clear()
+        asyncio.run(send(3))
+
+        assert pacer.underruns == 1
+        # The first frame after the stall goes out at once, the rest at real time again
+        assert clock.sleeps == pytest.approx([0.02, 0.02])
@@ -0,0 +1,197 @@
+"""
+Unit tests for the Twilio signature middleware.
+"""
+import asyncio
+import hashlib
+import json
+from urllib.parse import urlencode
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("twilio")
+
+from starlette.datastructures import ImmutableMultiDict
+from twilio.request_validator import RequestValidator
+from twilio_validation import TwilioSignatureMiddleware
+
+AUTH_TOKEN = "test-auth-token"
+HOST = "bot.example.com"
+
+
+def sign(url, params=None):
+    return RequestValidator(AUTH_TOKEN).compute_signature(url, params or {})
+
+
+class Route:
+    """Stands in for the FastAPI app: records what reached it and answers 200."""
+
+    def __init__(self):
+        self.bodies = []
+        self.called = False
+
+    async def __call__(self, scope, receive, send):
+        self.called = True
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.accept"})
+            return
+        message = await receive()
+        self.bodies.append(message.get("body", b""))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def make_scope(scope_type, path, headers, query_string=b"", root_path=""):
+    return {
+        "type": scope_type,
+        "scheme": "ws" if scope_type == "websocket" else "http",
+        "path": path,
+        "root_path": root_path,
+        "query_string": query_string,
+        "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        "server": ("10.0.0.1", 80),
+    }
+
+
+def call(scope, body=b""):
+    """Runs the middleware on one request; returns the route and the messages sent back."""
+    route = Route()
+    middleware = TwilioSignatureMiddleware(route, AUTH_TOKEN)
+    sent = []
+    chunks = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return chunks.pop(0) if chunks else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return route, sent
+
+
+def status(sent):
+    return next(message["status"] for message in sent if message["type"] == "http.response.start")
+
+
+def form_post(params, signature, host=HOST, path="/answer"):
+    body = urlencode(params, doseq=True).encode("utf-8")
+    headers = {"host": host, "content-type": "application/x-www-form-urlencoded"}
+    if signature is not None:
+        headers["x-twilio-signature"] = signature
+    return call(make_scope("http", path, headers), body)
+
+
+class TestHttpValidation:
+    """Test cases for HTTP requests to signed routes."""
+
+    PARAMS = {"CallSid": "CA123", "From": "+15550100", "To": "+15550199"}
+
+    def test_valid_form_post(self):
+        """Test that a correctly signed form POST reaches the route with its body intact."""
+        signature = sign(f"https://{HOST}/answer", self.PARAMS)
+
+        route, sent = form_post(self.PARAMS, signature)
+
+        assert status(sent) == 200
+        assert route.bodies == [urlencode(self.PARAMS).encode("utf-8")]
+
+    def test_tampered_param(self):
+        """Test that changing a signed parameter is rejected with 403."""
+        signature = sign(f"https://{HOST}/answer", self.PARAMS)
+
+        route, sent = form_post(dict(self.PARAMS, To="+15550111"), signature)
+
+        assert status(sent) == 403
+        assert not route.called
+
+    def test_missing_signature(self):
+        """Test that a request without X-Twilio-Signature is rejected with 403."""
+        route, sent = form_post(self.PARAMS, None)
+
+        assert status(sent) == 403
+        assert not route.called
+
+    def test_non_ascii_signature(self):
+        """Test that a non-ASCII signature header is rejected with 403 rather than raising."""
+        route, sent = form_post(self.PARAMS, "sign\u00e9")
+
+        assert status(sent) == 403
+        assert not route.called
+
+    def test_repeated_form_key(self):
+        """Test that every value of a repeated form key is covered by the signature."""
+        params = [("StatusCallbackEvent", "initiated"), ("StatusCallbackEvent", "ringing")]
+        signature = sign(f"https://{HOST}/answer", ImmutableMultiDict(params))
+
+        _, sent = form_post(params, signature)
+        _, tampered = form_post([params[0], ("StatusCallbackEvent", "answered")], signature)
+
+        assert status(sent) == 200
+        assert status(tampered) == 403
+
+    def test_host_header_with_port(self):
+        """Test that a Host header carrying :443, as some proxies forward it, still validates."""
+        signature = sign(f"https://{HOST}/answer", self.PARAMS)
+
+        _, sent = form_post(self.PARAMS, signature, host=f"{HOST}:443")
+
+        assert status(sent) == 200
+
+    def test_json_body_with_body_sha256(self):
+        """Test that a JSON body is checked against the bodySHA256 query parameter of the signed URL."""
+        body = json.dumps({"CallSid": "CA123"}).encode("utf-8")
+        query = urlencode({"bodySHA256": hashlib.sha256(body).hexdigest()})
+        signature = sign(f"https://{HOST}/answer?{query}")
+
+        def post(payload):
+            headers = {"host": HOST, "content-type": "application/json", "x-twilio-signature": signature}
+            return call(make_scope("http", "/answer", headers, query.encode("latin-1")), payload)
+
+        route, sent = post(body)
+        _, tampered = post(body.replace(b"CA123", b"CA999"))
+
+        assert status(sent) == 200
+        assert route.bodies == [body]
+        assert status(tampered) == 403
+
+    def test_root_path_not_doubled(self):
+        """Test that a mount prefix already in scope["path"] appears once in the signed URL."""
+        signature = sign(f"https://{HOST}/bot/answer", self.PARAMS)
+        body = urlencode(self.PARAMS).encode("utf-8")
+        headers = {"host": HOST, "content-type": "application/x-www-form-urlencoded", "x-twilio-signature": signature}
+        scope = make_scope("http", "/bot/answer", headers, root_path="/bot")
+
+        middleware = TwilioSignatureMiddleware(Route(), AUTH_TOKEN, paths=["/bot/answer"])
+
+        assert middleware.public_url(scope) == f"https://{HOST}/bot/answer"
+        assert middleware.is_valid_http(middleware.public_url(scope), {"content-type": headers["content-type"]},
+                                        body, signature)
+
+    def test_other_routes_not_checked(self):
+        """Test that routes outside the signed paths pass through unvalidated."""
+        route, sent = call(make_scope("http", "/health", {"host": HOST}))
+
+        assert status(sent) == 200
+        assert route.called
+
+
+class TestWebSocketValidation:
+    """Test cases for WebSocket upgrades to signed routes."""
+
+    def test_handshake_accepted(self):
+        """Test that a correctly signed handshake is passed to the route."""
+        signature = sign(f"wss://{HOST}/ws")
+
+        route, sent = call(make_scope("websocket", "/ws", {"host": HOST, "x-twilio-signature": signature}))
+
+        assert route.called
+        assert sent == [{"type": "websocket.accept"}]
+
+    def test_handshake_rejected(self):
+        """Test that a handshake with a bad signature is closed with 1008 before reaching the route."""
+        signature = sign(f"wss://{HOST}/other")
+
+        route, sent = call(make_scope("websocket", "/ws", {"host": HOST, "x-twilio-signature": signature}))
+
+        assert not route.called
+        assert sent == [{"type": "websocket.close", "code": 1008}]